@@ -0,0 +1,86 @@
+"""
+大输出捕获基准：整段输出留在内存 vs --spool 流式落盘，比较 Python 堆峰值与墙钟耗时
+
+每台模拟主机对未知命令输出 --lines 行 (约 70 字节/行)；最后一台少输出几行，用来验证归类与差异。
+模拟主机跑在单独的子进程里，内存峰值 (tracemalloc，只含 Python 对象) 只统计本机这一侧。
+
+用法:
+    python benchmarks/bench_capture.py --hosts 20 --lines 200000
+    python benchmarks/bench_capture.py --engine async --protocol telnet
+"""
+import argparse
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+def _serve_fleet(specs, conn):
+    from benchmarks.fakehosts import FakeFleet
+    with FakeFleet(specs, seed=1) as fleet:
+        conn.send(fleet.hosts)
+        conn.recv()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--hosts', type=int, default=20)
+    parser.add_argument('--lines', type=int, default=100000)
+    parser.add_argument('--protocol', choices=['ssh', 'telnet'], default='ssh')
+    parser.add_argument('--engine', choices=['thread', 'async'], default='thread')
+    parser.add_argument('--workers', type=int, default=40)
+    parser.add_argument('--modes', default='memory,spool')
+    args = parser.parse_args()
+
+    from benchmarks.fakehosts import make_specs
+    from core.analyzer import OutputGrouper
+    from core.async_executor import AsyncRemoteExecutor
+    from core.capture import CaptureConfig
+    from core.compare import DEFAULT_NORMALIZERS, resolve_normalizers
+    from core.executor import RemoteExecutor
+
+    specs = make_specs(args.hosts, args.protocol, output_lines=args.lines)
+    specs[-1].output_lines = max(0, args.lines - 3)
+    normalizers = resolve_normalizers(DEFAULT_NORMALIZERS, [r'ZS_S6_SITE_\d+'])
+    spool_root = tempfile.mkdtemp(prefix='mt-bench-capture-')
+    approx_mb = args.hosts * args.lines * 70 / 1024 / 1024
+
+    print(f"主机: {args.hosts} ({args.protocol}, {args.engine})  每台 {args.lines} 行  合计约 {approx_mb:.0f} MB")
+    print(f"{'mode':<8}{'ok':>6}{'wall(s)':>10}{'peak(MB)':>10}{'groups':>8}{'diff':>6}")
+    parent, child = multiprocessing.Pipe()
+    server = multiprocessing.Process(target=_serve_fleet, args=(specs, child), daemon=True)
+    server.start()
+    try:
+        hosts = parent.recv()
+        for mode in [m.strip() for m in args.modes.split(',')]:
+            capture = CaptureConfig(tempfile.mkdtemp(dir=spool_root)) if mode == 'spool' else None
+            if args.engine == 'async':
+                executor = AsyncRemoteExecutor(max_workers=args.workers, capture=capture)
+            else:
+                executor = RemoteExecutor(max_workers=args.workers, capture=capture)
+            grouper = OutputGrouper(normalizers)
+            tracemalloc.start()
+            start = time.perf_counter()
+            with executor:
+                # 与 exec 命令一样只在结果流上增量归类，不另外保留结果列表
+                ok = 0
+                for r in executor.iter_batch(hosts, 'dmesg'):
+                    grouper.add(r)
+                    ok += r.status == 'SUCCESS'
+                diffs = grouper.diffs()
+            wall = time.perf_counter() - start
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            diff_lines = sum(len(lines) for lines in diffs.values())
+            print(f"{mode:<8}{ok:>6}{wall:>10.2f}{peak / 1024 / 1024:>10.1f}{len(grouper):>8}{diff_lines:>6}")
+    finally:
+        parent.send(None)
+        server.join(timeout=10)
+        shutil.rmtree(spool_root, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
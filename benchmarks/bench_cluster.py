@@ -0,0 +1,71 @@
+"""
+近似聚类基准：合成"每台都略有不同"的包列表，比较精确分组与 MinHash/LSH 聚类的结果数量与耗时
+
+每台主机的输出是同一份 --lines 行的包列表，随机改动 --noise 行的版本号；
+另外每 --outlier-every 台埋一台内容大不相同的主机，检查聚类能否把它们全部标为离群。
+不连接任何主机，只测本机的分组/聚类开销。
+
+用法:
+    python benchmarks/bench_cluster.py --sizes 1000,4000,10000
+    python benchmarks/bench_cluster.py --sizes 4000 --lines 2000 --noise 10
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+def make_results(n: int, lines: int, noise: int, outlier_every: int, seed: int = 1):
+    from core.executor import ExecutionResult
+    rng = random.Random(seed)
+    base = [f"pkg{i:05d}-{i % 7}.{i % 13}.{i % 5}-1.el8.x86_64" for i in range(lines)]
+    results, planted = [], set()
+    for h in range(n):
+        out = list(base)
+        for _ in range(noise):
+            j = rng.randrange(lines)
+            out[j] = out[j].replace('-1.el8', f'-{rng.randrange(2, 99)}.el8')
+        alias = f"host{h:05d}"
+        if outlier_every and h % outlier_every == outlier_every // 2:
+            # 装的是另一套软件：只有三成与基线相同
+            out = out[:lines * 3 // 10] + [f"vendor{i:05d}-9.9-1.x86_64" for i in range(lines * 7 // 10)]
+            planted.add(alias)
+        results.append(ExecutionResult(host=f"10.{h // 65536}.{h // 256 % 256}.{h % 256}", port=22, group='bench',
+                                       alias=alias, command='rpm -qa', status='SUCCESS', output="\n".join(out),
+                                       error='', start_time='', duration=0.0))
+    return results, planted
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='1000,4000')
+    parser.add_argument('--lines', type=int, default=800)
+    parser.add_argument('--noise', type=int, default=3, help='每台随机改动的行数')
+    parser.add_argument('--outlier-every', type=int, default=500)
+    parser.add_argument('--similarity', type=float, default=None)
+    args = parser.parse_args()
+
+    from core.analyzer import OutputGrouper
+    from core.cluster import DEFAULT_SIMILARITY
+    threshold = DEFAULT_SIMILARITY if args.similarity is None else args.similarity
+
+    print(f"每台 {args.lines} 行，随机改动 {args.noise} 行，每 {args.outlier_every} 台埋 1 台离群  (相似度 ≥ {threshold})")
+    print(f"{'hosts':>7}{'exact':>8}{'group(s)':>10}{'clusters':>10}{'cluster(s)':>12}{'outliers':>10}{'found':>8}")
+    for n in [int(s) for s in args.sizes.split(',')]:
+        results, planted = make_results(n, args.lines, args.noise, args.outlier_every)
+        grouper = OutputGrouper()
+        start = time.perf_counter()
+        for r in results:
+            grouper.add(r)
+        group_s = time.perf_counter() - start
+        start = time.perf_counter()
+        clusters = grouper.clusters(threshold)
+        cluster_s = time.perf_counter() - start
+        flagged = {a for c in clusters if c.outlier for a in c.aliases}
+        print(f"{n:>7}{len(grouper):>8}{group_s:>10.2f}{len(clusters):>10}{cluster_s:>12.2f}"
+              f"{len(flagged):>10}{len(flagged & planted):>5}/{len(planted)}")
+
+if __name__ == "__main__":
+    main()
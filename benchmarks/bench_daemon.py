@@ -0,0 +1,88 @@
+"""
+常驻进程基准：脚本式连续调用 manager.py exec，比较每次独立登录与经常驻进程复用会话的单次耗时
+
+模拟主机跑在单独的子进程里；在临时工作目录中生成清单，依次测:
+  cold     exec --no-daemon           每次导入 Netmiko、加载清单、逐台登录
+  daemon   exec (常驻进程已启动)       首次调用登录，之后只付远端命令本身的时间
+
+用法:
+    python benchmarks/bench_daemon.py --hosts 40 --runs 10
+    python benchmarks/bench_daemon.py --protocol telnet --login-delay 0.5
+"""
+import argparse
+import multiprocessing
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+MANAGER = os.path.join(ROOT, 'manager.py')
+
+def _serve_fleet(specs, conn):
+    from benchmarks.fakehosts import FakeFleet
+    with FakeFleet(specs, seed=1) as fleet:
+        conn.send(fleet.hosts)
+        conn.recv()
+
+def write_inventory(cwd: str, hosts, protocol: str):
+    import yaml
+    os.makedirs(os.path.join(cwd, 'inventory'))
+    inv = {'inventory': [{
+        'name': f'fake_{protocol}', 'protocol': protocol, 'username': 'root', 'password': 'admin123',
+        'hosts': [{'ip': h.hostname, 'port': h.port, 'alias': h.alias} for h in hosts],
+    }]}
+    with open(os.path.join(cwd, 'inventory', 'hosts.yaml'), 'w') as f:
+        yaml.safe_dump(inv, f)
+
+def time_runs(args, runs: int, cwd: str):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, MANAGER] + args, cwd=cwd,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--hosts', type=int, default=40)
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--protocol', choices=['ssh', 'telnet'], default='ssh')
+    parser.add_argument('--engine', choices=['thread', 'async'], default='thread')
+    parser.add_argument('--login-delay', type=float, default=0.2, help='模拟主机的登录耗时 (秒)')
+    parser.add_argument('--cmd', default='uname -r')
+    args = parser.parse_args()
+
+    from benchmarks.fakehosts import make_specs
+    specs = make_specs(args.hosts, args.protocol, login_delay=args.login_delay)
+    exec_args = ['exec', '--cmd', args.cmd, '--engine', args.engine]
+
+    parent, child = multiprocessing.Pipe()
+    server = multiprocessing.Process(target=_serve_fleet, args=(specs, child), daemon=True)
+    server.start()
+    try:
+        hosts = parent.recv()
+        with tempfile.TemporaryDirectory(prefix='mt-bench-daemon-') as cwd:
+            write_inventory(cwd, hosts, args.protocol)
+            print(f"主机: {args.hosts} ({args.protocol}, {args.engine})  登录耗时 {args.login_delay}s  命令: {args.cmd}")
+            print(f"{'mode':<8}{'runs':>6}{'first(s)':>10}{'p50(s)':>10}{'min(s)':>10}{'max(s)':>10}")
+            rows = [('cold', exec_args + ['--no-daemon'])]
+            subprocess.run([sys.executable, MANAGER, 'daemon', '--detach'], cwd=cwd,
+                           stdout=subprocess.DEVNULL, check=True)
+            try:
+                for mode, argv in rows + [('daemon', exec_args)]:
+                    samples = time_runs(argv, args.runs, cwd)
+                    print(f"{mode:<8}{len(samples):>6}{samples[0]:>10.2f}{statistics.median(samples):>10.2f}"
+                          f"{min(samples):>10.2f}{max(samples):>10.2f}")
+            finally:
+                subprocess.run([sys.executable, MANAGER, 'daemon', '--stop'], cwd=cwd, stdout=subprocess.DEVNULL)
+    finally:
+        parent.send(None)
+        server.join(timeout=10)
+
+if __name__ == "__main__":
+    main()
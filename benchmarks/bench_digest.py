@@ -0,0 +1,113 @@
+"""
+摘要优先比对基准：整网 cat 同一份包列表，比较全量取回与 --digest (只回传摘要、每组取回一台) 的耗时与回传字节数
+
+每台模拟主机拥有一个真实目录 (FakeHostSpec.root)，命令由 /bin/sh 执行；目录里放一份 --lines 行的包列表，
+其中 --outliers 台改动了一行。--packet-delay 模拟慢速链路 (每次发送前的时延)，输出越大发送次数越多。
+每种模式先登录全部主机再开始计时，耗时只含比对本身；回传字节数只计命令输出本身，不含回显与提示符。
+
+用法:
+    python benchmarks/bench_digest.py --hosts 40 --lines 5000
+    python benchmarks/bench_digest.py --protocol telnet --engine async --packet-delay 0.002
+"""
+import argparse
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+CMD = 'cat pkgs.txt'
+
+def _serve_fleet(specs, conn):
+    from benchmarks.fakehosts import FakeFleet
+    with FakeFleet(specs, seed=1) as fleet:
+        conn.send(fleet.hosts)
+        conn.recv()
+
+def make_executor(engine: str, workers: int):
+    from core.async_executor import AsyncRemoteExecutor
+    from core.executor import RemoteExecutor
+    if engine == 'async':
+        return AsyncRemoteExecutor(max_workers=workers)
+    return RemoteExecutor(max_workers=workers)
+
+def run_full(executor, hosts, grouper):
+    received = 0
+    for r in executor.iter_batch(hosts, CMD):
+        received += len(r.output)
+        grouper.add(r)
+    return received, len(hosts)
+
+def run_digest(executor, hosts, grouper):
+    """与 exec --digest 相同的两步：先收摘要，再从每个摘要分组取回一台的完整输出"""
+    from core.digest import DigestIndex, digest_command, plan_fetch
+    index, received = DigestIndex(), 0
+    for r in executor.iter_batch(hosts, digest_command(CMD)):
+        received += len(r.output)
+        index.add(r)
+    wanted = plan_fetch([index])
+    fetched = {}
+    for r in executor.iter_batch([h for h in hosts if h.alias in wanted], CMD):
+        received += len(r.output)
+        fetched[r.alias] = r
+    index.merge_into(grouper, fetched)
+    return received, len(wanted)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--hosts', type=int, default=40)
+    parser.add_argument('--lines', type=int, default=5000)
+    parser.add_argument('--outliers', type=int, default=2)
+    parser.add_argument('--protocol', choices=['ssh', 'telnet'], default='ssh')
+    parser.add_argument('--engine', choices=['thread', 'async'], default='thread')
+    parser.add_argument('--workers', type=int, default=40)
+    parser.add_argument('--packet-delay', type=float, default=0.0, help='模拟主机每次发送前的时延 (秒)')
+    parser.add_argument('--modes', default='full,digest')
+    args = parser.parse_args()
+
+    from benchmarks.fakehosts import make_specs
+    from core.analyzer import OutputGrouper
+
+    workdir = tempfile.mkdtemp(prefix='mt-bench-digest-')
+    specs = make_specs(args.hosts, args.protocol, packet_delay=args.packet_delay)
+    base = [f"pkg{i:05d}-{i % 7}.{i % 13}-1.el8.x86_64" for i in range(args.lines)]
+    step = max(1, args.hosts // max(1, args.outliers))
+    for n, spec in enumerate(specs):
+        spec.root = os.path.join(workdir, spec.hostname)
+        os.makedirs(spec.root)
+        lines = list(base)
+        if n % step == step // 2 and n // step < args.outliers:
+            lines[n % args.lines] = f"pkg{n % args.lines:05d}-9.9-1.el8.x86_64"
+        with open(os.path.join(spec.root, 'pkgs.txt'), 'w') as f:
+            f.write("\n".join(lines) + "\n")
+
+    print(f"主机: {args.hosts} ({args.protocol}, {args.engine})  每台 {args.lines} 行  "
+          f"离群 {args.outliers} 台  packet_delay {args.packet_delay}s")
+    print(f"{'mode':<8}{'wall(s)':>10}{'recv(KB)':>12}{'fetched':>9}{'groups':>8}{'diff':>6}")
+    parent, child = multiprocessing.Pipe()
+    server = multiprocessing.Process(target=_serve_fleet, args=(specs, child), daemon=True)
+    server.start()
+    try:
+        hosts = parent.recv()
+        for mode in [m.strip() for m in args.modes.split(',')]:
+            grouper = OutputGrouper()
+            with make_executor(args.engine, args.workers) as executor:
+                # 登录耗时与比对方式无关 (模拟主机首次登录还很慢)，先建好会话再计时
+                executor.run_batch(hosts, 'true')
+                start = time.perf_counter()
+                run = run_digest if mode == 'digest' else run_full
+                received, fetched = run(executor, hosts, grouper)
+                diffs = grouper.diffs()
+                wall = time.perf_counter() - start
+            diff_lines = sum(len(lines) for lines in diffs.values())
+            print(f"{mode:<8}{wall:>10.2f}{received / 1024:>12.1f}{fetched:>9}{len(grouper):>8}{diff_lines:>6}")
+    finally:
+        parent.send(None)
+        server.join(timeout=10)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+执行引擎对比基准：thread vs async
+
+每个引擎在独立子进程中运行，互不干扰，统计:
+  - 墙钟耗时
+  - 进程峰值内存 (ru_maxrss)
+  - 峰值线程数
+
+用法 (需先启动 simulation/ 中的容器或准备好真实 inventory):
+    python benchmarks/bench_engines.py --inventory inventory/hosts.yaml --cmd uptime
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+def run_child(engine, inventory, group, cmd, workers):
+    from core.inventory import InventoryManager
+    from core.executor import RemoteExecutor
+    from core.async_executor import AsyncRemoteExecutor
+
+    hosts = InventoryManager(inventory).get_hosts(group)
+    peak_threads = threading.active_count()
+
+    def on_result(res):
+        nonlocal peak_threads
+        peak_threads = max(peak_threads, threading.active_count())
+
+    executor_cls = AsyncRemoteExecutor if engine == 'async' else RemoteExecutor
+    start = time.perf_counter()
+    with executor_cls(max_workers=workers) as executor:
+        results = executor.run_batch(hosts, cmd, progress_callback=on_result)
+    wall = time.perf_counter() - start
+
+    print(json.dumps({
+        "engine": engine,
+        "hosts": len(hosts),
+        "success": sum(1 for r in results if r.status == 'SUCCESS'),
+        "wall_s": round(wall, 3),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "peak_threads": peak_threads,
+    }))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--inventory', default=os.path.join(ROOT, 'inventory', 'hosts.yaml'))
+    parser.add_argument('--group', default='all')
+    parser.add_argument('--cmd', default='uptime')
+    parser.add_argument('--workers', type=int, default=40, help='thread 引擎的线程数')
+    parser.add_argument('--async-workers', type=int, default=5000, help='async 引擎的并发上限')
+    parser.add_argument('--child', choices=['thread', 'async'], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        workers = args.async_workers if args.child == 'async' else args.workers
+        run_child(args.child, args.inventory, args.group, args.cmd, workers)
+        return
+
+    print(f"{'engine':<8}{'hosts':>7}{'ok':>7}{'wall(s)':>10}{'rss(MB)':>10}{'threads':>9}")
+    for engine in ('thread', 'async'):
+        proc = subprocess.run(
+            [sys.executable, __file__, '--child', engine,
+             '--inventory', args.inventory, '--group', args.group, '--cmd', args.cmd,
+             '--workers', str(args.workers), '--async-workers', str(args.async_workers)],
+            capture_output=True, text=True,
+        )
+        if proc.returncode != 0:
+            print(f"{engine:<8} 运行失败:\n{proc.stderr}")
+            continue
+        row = json.loads(proc.stdout.strip().splitlines()[-1])
+        print(f"{row['engine']:<8}{row['hosts']:>7}{row['success']:>7}{row['wall_s']:>10}"
+              f"{row['peak_rss_mb']:>10}{row['peak_threads']:>9}")
+
+if __name__ == "__main__":
+    main()
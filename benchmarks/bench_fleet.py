@@ -0,0 +1,178 @@
+"""
+执行器回归基准：用进程内模拟主机 (benchmarks/fakehosts.py) 代替 Docker 容器
+
+模拟主机在本进程中运行，被测的执行器在独立子进程中运行，互不干扰。
+对每个规模 (默认 40/400/4000 台) 和每种流程 (exec: run_batch / health: 复合探针 + 指标解析) 统计:
+  - 吞吐 (台/秒) 与墙钟耗时，关闭会话池的耗时单独统计
+  - 单台主机耗时的 p50 / p99
+  - 子进程峰值内存 (ru_maxrss) 与峰值线程数
+
+用法:
+    python benchmarks/bench_fleet.py
+    python benchmarks/bench_fleet.py --sizes 40,400 --flows exec --login-delay 0.2 --packet-delay 0.01
+    python benchmarks/bench_fleet.py --fail-rate 0.05 --drop-rate 0.01 --prompt busybox
+    python benchmarks/bench_fleet.py --save base.json          # 保存基线
+    python benchmarks/bench_fleet.py --compare base.json       # 与基线对比，退化超过容差时返回码为 1
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from dataclasses import asdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+def run_child(hosts_file, flow, engine, workers, cmd):
+    from core.inventory import HostConfig
+    from core.executor import RemoteExecutor
+    from core.async_executor import AsyncRemoteExecutor
+    from core.analyzer import HealthParser
+    from core.metrics import percentile
+    from core.health import HEALTH_PROBE
+
+    with open(hosts_file, 'r', encoding='utf-8') as f:
+        hosts = [HostConfig(**{**h, 'groups': tuple(h['groups']), 'tags': tuple(h['tags'])}) for h in json.load(f)]
+
+    peak_threads = threading.active_count()
+    done = threading.Event()
+
+    def sample_threads():
+        nonlocal peak_threads
+        while not done.wait(0.05):
+            peak_threads = max(peak_threads, threading.active_count() - 1)
+    threading.Thread(target=sample_threads, daemon=True).start()
+
+    executor_cls = AsyncRemoteExecutor if engine == 'async' else RemoteExecutor
+    executor = executor_cls(max_workers=workers)
+    start = time.perf_counter()
+    if flow == 'health':
+        per_host = executor.run_batch_multi(hosts, [HEALTH_PROBE])
+        metrics = HealthParser.parse_metrics(per_host)
+        latencies = [max(r.duration for r in rs) for rs in per_host.values()]
+        success = sum(1 for m in metrics.values() if m.online and not m.errors)
+    else:
+        results = executor.run_batch(hosts, cmd)
+        latencies = [r.duration for r in results]
+        success = sum(1 for r in results if r.status == 'SUCCESS')
+    wall = time.perf_counter() - start
+    close_start = time.perf_counter()
+    executor.close()
+    close_s = time.perf_counter() - close_start
+    done.set()
+
+    print(json.dumps({
+        "flow": flow,
+        "engine": engine,
+        "hosts": len(hosts),
+        "success": success,
+        "wall_s": round(wall, 3),
+        "close_s": round(close_s, 3),
+        "throughput": round(len(hosts) / wall, 1) if wall else 0.0,
+        "p50_s": round(percentile(latencies, 50), 3),
+        "p99_s": round(percentile(latencies, 99), 3),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "peak_threads": peak_threads,
+    }))
+
+def compare(rows, baseline_path, tolerance):
+    """墙钟耗时/p99/内存超过基线 (1 + tolerance) 倍，或成功数减少，视为退化"""
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = {(r['flow'], r['engine'], r['hosts']): r for r in json.load(f)}
+    regressions = []
+    for row in rows:
+        base = baseline.get((row['flow'], row['engine'], row['hosts']))
+        if base is None:
+            continue
+        for metric in ('wall_s', 'p99_s', 'peak_rss_mb'):
+            if base[metric] and row[metric] > base[metric] * (1 + tolerance):
+                regressions.append(f"{row['flow']}/{row['engine']}/{row['hosts']}: "
+                                   f"{metric} {base[metric]} -> {row[metric]}")
+        if row['success'] < base['success']:
+            regressions.append(f"{row['flow']}/{row['engine']}/{row['hosts']}: "
+                               f"success {base['success']} -> {row['success']}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='40,400,4000', help='主机规模，逗号分隔')
+    parser.add_argument('--flows', default='exec,health', help='exec / health，逗号分隔')
+    parser.add_argument('--engine', choices=['thread', 'async'], default='thread')
+    parser.add_argument('--workers', type=int, help='并发数 (默认 thread 40 / async 1000)')
+    parser.add_argument('--protocol', choices=['ssh', 'telnet', 'mixed'], default='ssh')
+    parser.add_argument('--cmd', default='uname -a', help='exec 流程执行的命令')
+    parser.add_argument('--prompt', default='bash', help='提示符风格: bash / busybox / dollar / cisco')
+    parser.add_argument('--login-delay', type=float, default=0.0, help='登录时延 (秒)')
+    parser.add_argument('--packet-delay', type=float, default=0.0, help='每次发送数据前的时延 (秒)')
+    parser.add_argument('--output-lines', type=int, default=20, help='未知命令的输出行数')
+    parser.add_argument('--fail-rate', type=float, default=0.0, help='登录失败概率')
+    parser.add_argument('--drop-rate', type=float, default=0.0, help='每条命令前会话断开的概率')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--save', help='把本次结果保存为 JSON 基线')
+    parser.add_argument('--compare', help='与 JSON 基线对比')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='允许的退化比例 (默认 20%%)')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--hosts-file', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    workers = args.workers or (1000 if args.engine == 'async' else 40)
+    if args.child:
+        run_child(args.hosts_file, args.flows, args.engine, workers, args.cmd)
+        return
+
+    from benchmarks.fakehosts import FakeFleet, make_specs
+
+    # 每台模拟主机占一个监听端口，4000 台需要放宽文件句柄上限
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+    sizes = [int(s) for s in args.sizes.split(',')]
+    flows = [f.strip() for f in args.flows.split(',')]
+    specs = make_specs(max(sizes), args.protocol, prompt_style=args.prompt, login_delay=args.login_delay,
+                       packet_delay=args.packet_delay, output_lines=args.output_lines,
+                       fail_rate=args.fail_rate, drop_rate=args.drop_rate)
+
+    rows = []
+    print(f"{'flow':<8}{'hosts':>7}{'ok':>7}{'wall(s)':>10}{'close(s)':>10}{'host/s':>9}"
+          f"{'p50(s)':>9}{'p99(s)':>9}{'rss(MB)':>10}{'threads':>9}")
+    with FakeFleet(specs, seed=args.seed) as fleet:
+        for size in sizes:
+            with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False, encoding='utf-8') as f:
+                json.dump([asdict(h) for h in fleet.hosts[:size]], f)
+                hosts_file = f.name
+            try:
+                for flow in flows:
+                    proc = subprocess.run(
+                        [sys.executable, __file__, '--child', '--hosts-file', hosts_file, '--flows', flow,
+                         '--engine', args.engine, '--workers', str(workers), '--cmd', args.cmd],
+                        capture_output=True, text=True, cwd=ROOT,
+                    )
+                    if proc.returncode != 0:
+                        print(f"{flow:<8}{size:>7} 运行失败:\n{proc.stderr}")
+                        continue
+                    row = json.loads(proc.stdout.strip().splitlines()[-1])
+                    rows.append(row)
+                    print(f"{row['flow']:<8}{row['hosts']:>7}{row['success']:>7}{row['wall_s']:>10}"
+                          f"{row['close_s']:>10}{row['throughput']:>9}{row['p50_s']:>9}{row['p99_s']:>9}"
+                          f"{row['peak_rss_mb']:>10}{row['peak_threads']:>9}")
+            finally:
+                os.unlink(hosts_file)
+        print(f"模拟主机统计: {fleet.stats}")
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(rows, f, indent=2)
+    if args.compare:
+        regressions = compare(rows, args.compare, args.tolerance)
+        for line in regressions:
+            print(f"[退化] {line}")
+        if regressions:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+多进程分片的扩展曲线：--procs 1/2/4/8/... 下的吞吐
+
+模拟主机分散在多个服务进程中 (--server-procs)，避免模拟端自身成为单核瓶颈。
+对每个分片数各跑两批:
+  - cold  首批，包含子进程启动、TCP/SSH 建连与认证
+  - warm  第二批，复用各分片进程内的常驻会话，只剩命令往返
+并给出相对 1 个分片的加速比。分片数超过 CPU 核数后不会再有收益。
+
+用法:
+    python benchmarks/bench_sharding.py --hosts 400 --procs 1,2,4,8
+    python benchmarks/bench_sharding.py --hosts 2000 --procs 1,4,16 --engine async --workers 500
+"""
+import argparse
+import multiprocessing
+import os
+import resource
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+def serve(specs, seed, conn):
+    """服务进程：启动一组模拟主机，把 HostConfig 发回父进程，收到任意消息后退出"""
+    sys.path.insert(0, ROOT)
+    from benchmarks.fakehosts import FakeFleet
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    with FakeFleet(specs, seed=seed) as fleet:
+        conn.send(fleet.hosts)
+        conn.recv()
+
+def start_servers(specs, server_procs, seed):
+    ctx = multiprocessing.get_context('spawn')
+    servers, hosts = [], []
+    for i in range(server_procs):
+        parent, child = ctx.Pipe()
+        proc = ctx.Process(target=serve, args=(specs[i::server_procs], seed + i, child), daemon=True)
+        proc.start()
+        servers.append((proc, parent))
+    for _, parent in servers:
+        hosts.extend(parent.recv())
+    return servers, hosts
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--hosts', type=int, default=400)
+    parser.add_argument('--procs', default='1,2,4,8', help='要测的分片进程数，逗号分隔')
+    parser.add_argument('--engine', choices=['thread', 'async'], default='thread')
+    parser.add_argument('--workers', type=int, default=40, help='每个分片进程的并发数')
+    parser.add_argument('--protocol', choices=['ssh', 'telnet', 'mixed'], default='ssh')
+    parser.add_argument('--cmd', default='uname -a')
+    parser.add_argument('--output-lines', type=int, default=200, help='命令输出行数 (越大读循环越吃 CPU)')
+    parser.add_argument('--login-delay', type=float, default=0.0)
+    parser.add_argument('--server-procs', type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                        help='模拟主机的服务进程数')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    from benchmarks.fakehosts import make_specs
+    from core.sharded import ShardedExecutor
+
+    specs = make_specs(args.hosts, args.protocol, login_delay=args.login_delay, output_lines=args.output_lines)
+    servers, hosts = start_servers(specs, args.server_procs, args.seed)
+    # 未知命令按 output_lines 输出，uname 等内置命令输出很短；这里统一用一个未知命令放大读循环开销
+    cmd = args.cmd if args.output_lines <= 0 else f"{args.cmd}; cat /var/log/bench"
+
+    print(f"CPU 核数: {os.cpu_count()}  主机: {len(hosts)}  引擎: {args.engine} x {args.workers}/进程  "
+          f"服务进程: {args.server_procs}")
+    print(f"{'procs':>6}{'ok':>7}{'cold(s)':>10}{'cold h/s':>10}{'warm(s)':>10}{'warm h/s':>10}{'speedup':>9}")
+    base = None
+    try:
+        for procs in [int(p) for p in args.procs.split(',')]:
+            with ShardedExecutor(procs, engine=args.engine, workers=args.workers) as executor:
+                start = time.perf_counter()
+                cold_results = executor.run_batch(hosts, cmd)
+                cold = time.perf_counter() - start
+                start = time.perf_counter()
+                warm_results = executor.run_batch(hosts, cmd)
+                warm = time.perf_counter() - start
+            ok = min(sum(1 for r in rs if r.status == 'SUCCESS') for rs in (cold_results, warm_results))
+            base = base or warm
+            print(f"{procs:>6}{ok:>7}{cold:>10.2f}{len(hosts) / cold:>10.1f}{warm:>10.2f}"
+                  f"{len(hosts) / warm:>10.1f}{base / warm:>8.2f}x")
+    finally:
+        for proc, parent in servers:
+            parent.send('stop')
+            proc.join(timeout=10)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+CLI 冷启动基准：反复以子进程调用 manager.py (或打包出的 exe)，统计不需要连接主机的固定开销
+
+场景:
+  help      manager.py --help
+  blocked   exec --cmd "rm -rf /tmp/x"   (被安全卫士拦截，不加载执行引擎)
+  history   history --limit 1            (只读审计库)
+
+--imports 额外打印 python -X importtime 统计出的最慢的顶层模块，便于定位新增的重量级导入。
+
+用法:
+    python benchmarks/bench_startup.py --runs 20
+    python benchmarks/bench_startup.py --exe release/multiTelnet.exe
+    python benchmarks/bench_startup.py --imports
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCENARIOS = {
+    'help': ['--help'],
+    'blocked': ['exec', '--cmd', 'rm -rf /tmp/x'],
+    'history': ['history', '--limit', '1'],
+}
+
+def time_runs(argv, runs: int, cwd: str):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(argv, cwd=cwd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=False)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+def slowest_imports(base, cwd: str, top: int):
+    """-X importtime 的输出: 'import time: self | cumulative | name'，只统计顶层模块"""
+    proc = subprocess.run([sys.executable, '-X', 'importtime'] + base[1:] + ['--help'],
+                          cwd=cwd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    rows = []
+    for line in proc.stderr.splitlines():
+        parts = line.split('|')
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        name = parts[2].rstrip()
+        if name.startswith('  '):
+            continue
+        rows.append((int(parts[1]), name.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--exe', help='测打包后的可执行文件而不是 python manager.py')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS))
+    parser.add_argument('--imports', action='store_true', help='打印最慢的顶层导入')
+    args = parser.parse_args()
+
+    base = [os.path.abspath(args.exe)] if args.exe else [sys.executable, os.path.join(ROOT, 'manager.py')]
+    # 空工作目录：没有清单与审计库，各场景都不会连接主机
+    with tempfile.TemporaryDirectory(prefix='mt-bench-startup-') as cwd:
+        print(f"{'scenario':<10}{'runs':>6}{'p50(ms)':>10}{'min(ms)':>10}{'max(ms)':>10}")
+        for name in [s.strip() for s in args.scenarios.split(',')]:
+            samples = time_runs(base + SCENARIOS[name], args.runs, cwd)
+            print(f"{name:<10}{len(samples):>6}{statistics.median(samples) * 1000:>10.0f}"
+                  f"{min(samples) * 1000:>10.0f}{max(samples) * 1000:>10.0f}")
+        if args.imports and not args.exe:
+            print("\n最慢的顶层导入 (累计 ms):")
+            for us, name in slowest_imports(base, cwd, 10):
+                print(f"  {us / 1000:>7.1f}  {name}")
+
+if __name__ == "__main__":
+    main()
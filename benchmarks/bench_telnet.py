@@ -0,0 +1,169 @@
+"""
+Telnet 传输基准：Netmiko generic_telnet vs 内置 Telnet 客户端 (core.telnet，线程与 asyncio 两种用法)
+
+generic_telnet 是 Netmiko 的终端服务器驱动，自己不登录；这里按 Netmiko 文档的终端服务器用法补齐：
+建连后调用 telnet_login，再 redispatch 到 linux 驱动，时序参数取 build_device 的默认值 (与改造前的执行器一致)。
+每种模式对每台主机建连一次、再在同一会话上连续执行 --rounds 次命令，统计:
+  - 建连 (TCP + 登录) 耗时的 p50 / p95
+  - 单条命令往返的 p50 / p95 (与执行器相同的哨兵流水线)
+  - 整批 (建连 + 全部命令) 的墙钟耗时
+
+默认在进程内启动 Telnet 模拟主机；--inventory 指定 simulation/ 容器或真实清单时只取其中的 Telnet 主机。
+--packet-delay 模拟高 RTT 链路 (模拟主机每次发送前的时延)。
+
+用法:
+    python benchmarks/bench_telnet.py --hosts 20
+    python benchmarks/bench_telnet.py --modes native,async --hosts 500 --packet-delay 0.02
+    python benchmarks/bench_telnet.py --inventory inventory/hosts.yaml
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+def _serve_fleet(specs, conn):
+    from benchmarks.fakehosts import FakeFleet
+    with FakeFleet(specs, seed=1) as fleet:
+        conn.send(fleet.hosts)
+        conn.recv()
+
+def netmiko_connect(host_cfg):
+    from netmiko import redispatch
+    from netmiko.base_connection import BaseConnection
+    from core.executor import build_device, connect_handler
+    conn = connect_handler(**build_device(host_cfg))
+    # TerminalServerTelnet 把 telnet_login 覆盖成了空操作，调用基类的实现完成登录
+    BaseConnection.telnet_login(conn)
+    redispatch(conn, device_type='linux')
+    return conn
+
+def native_connect(host_cfg):
+    from core.telnet import TelnetSession
+    return TelnetSession.open(host_cfg)
+
+def run_threaded(connect, hosts, cmd: str, rounds: int, workers: int):
+    """返回 (建连耗时列表, 命令耗时列表, 失败数)"""
+    from core.executor import FUZZY_PROMPT, SessionPool, build_pipeline, split_pipeline
+
+    def one(host_cfg):
+        start = time.perf_counter()
+        conn = connect(host_cfg)
+        connected = time.perf_counter() - start
+        latencies = []
+        try:
+            for _ in range(rounds):
+                start = time.perf_counter()
+                raw = conn.send_command(build_pipeline([cmd]), expect_string=rf'__MT_END_0__[\s\S]*{FUZZY_PROMPT}',
+                                        read_timeout=30)
+                if 0 not in split_pipeline(raw, 1):
+                    raise RuntimeError("Missing Sentinel")
+                latencies.append(time.perf_counter() - start)
+        finally:
+            SessionPool._close(conn)
+        return connected, latencies
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return _collect(pool.map(_guard(one), hosts))
+
+def run_async(hosts, cmd: str, rounds: int, workers: int):
+    from core.telnet import AsyncTelnetSession
+
+    async def one(host_cfg, sem):
+        async with sem:
+            start = time.perf_counter()
+            session = await AsyncTelnetSession.open(host_cfg, 30)
+            connected = time.perf_counter() - start
+            latencies = []
+            try:
+                for _ in range(rounds):
+                    start = time.perf_counter()
+                    if 0 not in await session.run([cmd], 30):
+                        raise RuntimeError("Missing Sentinel")
+                    latencies.append(time.perf_counter() - start)
+            finally:
+                session.close()
+            return connected, latencies
+
+    async def main():
+        sem = asyncio.Semaphore(workers)
+        return await asyncio.gather(*(one(h, sem) for h in hosts), return_exceptions=True)
+
+    return _collect(asyncio.run(main()))
+
+def _guard(fn):
+    def wrapped(host_cfg):
+        try:
+            return fn(host_cfg)
+        except Exception as e:
+            return e
+    return wrapped
+
+def _collect(outcomes):
+    connects, commands, failed = [], [], 0
+    for outcome in outcomes:
+        if isinstance(outcome, BaseException):
+            failed += 1
+            continue
+        connects.append(outcome[0])
+        commands.extend(outcome[1])
+    return connects, commands, failed
+
+def load_hosts(args):
+    """返回 (主机列表, 收尾函数)"""
+    if args.inventory:
+        from core.inventory import InventoryManager
+        hosts = [h for h in InventoryManager(args.inventory).get_hosts(args.group) if h.protocol == 'telnet']
+        return hosts, lambda: None
+    from benchmarks.fakehosts import make_specs
+    parent, child = multiprocessing.Pipe()
+    server = multiprocessing.Process(
+        target=_serve_fleet, args=(make_specs(args.hosts, 'telnet', packet_delay=args.packet_delay), child),
+        daemon=True)
+    server.start()
+    hosts = parent.recv()
+
+    def stop():
+        parent.send(None)
+        server.join(timeout=10)
+    return hosts, stop
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--hosts', type=int, default=20, help='模拟主机数 (未指定 --inventory 时)')
+    parser.add_argument('--inventory', help='使用已有清单中的 Telnet 主机，不启动模拟主机')
+    parser.add_argument('--group', default='all')
+    parser.add_argument('--cmd', default='uname -r')
+    parser.add_argument('--rounds', type=int, default=5, help='每个会话连续执行命令的次数')
+    parser.add_argument('--workers', type=int, default=40)
+    parser.add_argument('--packet-delay', type=float, default=0.0, help='模拟主机每次发送前的时延 (秒)')
+    parser.add_argument('--modes', default='netmiko,native,async')
+    args = parser.parse_args()
+
+    from core.metrics import percentile
+
+    hosts, stop = load_hosts(args)
+    print(f"Telnet 主机: {len(hosts)}  并发 {args.workers}  每会话 {args.rounds} 条命令  "
+          f"packet_delay {args.packet_delay}s")
+    print(f"{'mode':<9}{'wall(s)':>9}{'conn p50':>10}{'conn p95':>10}{'cmd p50':>10}{'cmd p95':>10}{'failed':>8}")
+    try:
+        for mode in [m.strip() for m in args.modes.split(',')]:
+            start = time.perf_counter()
+            if mode == 'async':
+                connects, commands, failed = run_async(hosts, args.cmd, args.rounds, args.workers)
+            else:
+                connect = netmiko_connect if mode == 'netmiko' else native_connect
+                connects, commands, failed = run_threaded(connect, hosts, args.cmd, args.rounds, args.workers)
+            wall = time.perf_counter() - start
+            print(f"{mode:<9}{wall:>9.2f}{percentile(connects, 50):>10.3f}{percentile(connects, 95):>10.3f}"
+                  f"{percentile(commands, 50):>10.3f}{percentile(commands, 95):>10.3f}{failed:>8}")
+    finally:
+        stop()
+
+if __name__ == "__main__":
+    main()
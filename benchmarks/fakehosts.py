@@ -0,0 +1,542 @@
+"""
+进程内的 SSH / Telnet 模拟主机，替代 simulation/ 中的 Docker 容器做基准测试。
+
+每台模拟主机在 127.0.0.1 上占用一个端口，所有监听端口由同一个 selectors 线程接入，
+因此几千台主机也只需要一个监听线程。每台主机可单独配置:
+  - login_delay   登录 (认证) 时延，模拟慢速链路/慢 PAM
+  - packet_delay  每次发送数据前的时延，模拟高 RTT
+  - prompt_style  提示符风格，默认模拟现场的 ZS_S6_SITE_xx 主机名
+  - output_lines  未知命令的输出行数，用于测大输出
+  - fail_rate     登录失败概率
+  - drop_rate     每条命令执行前会话被断开的概率
+  - root          设置后该主机拥有一个真实目录：内置之外的命令交给 /bin/sh 在该目录下执行，
+                  SSH 端同时提供以该目录为根的 SFTP 子系统 (用于文件分发基准)
+
+SSH 端基于 paramiko 的 ServerInterface，同时支持交互 shell (netmiko) 和 exec 通道 (asyncssh)；
+Telnet 端会发送 IAC 协商并忽略客户端的应答，行为接近常见的 telnetd。
+"""
+import logging
+import os
+import random
+import re
+import selectors
+import shlex
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+from dataclasses import dataclass
+from typing import List, Optional
+
+import paramiko
+
+from core.inventory import HostConfig
+
+PROMPT_STYLES = {
+    'bash': "[{user}@{hostname} ~]# ",
+    'busybox': "{hostname}:~# ",
+    'dollar': "{user}@{hostname}:~$ ",  # 普通用户；netmiko 的 Telnet 登录只认 # 和 >，可用来模拟登录卡死
+    'cisco': "{hostname}#",
+}
+
+# Telnet 协议常量 (RFC 854)
+IAC, DONT, DO, WONT, WILL, SB, SE = 255, 254, 253, 252, 251, 250, 240
+OPT_ECHO, OPT_SGA = 1, 3
+
+# 不产生输出的环境类命令
+SILENT_COMMANDS = {'stty', 'terminal', 'export', 'set', 'unset', 'unalias', 'cd', 'true', ''}
+
+@dataclass
+class FakeHostSpec:
+    hostname: str
+    protocol: str = 'ssh'
+    username: str = 'root'
+    password: str = 'admin123'
+    prompt_style: str = 'bash'
+    login_delay: float = 0.0
+    packet_delay: float = 0.0
+    output_lines: int = 20
+    fail_rate: float = 0.0
+    drop_rate: float = 0.0
+    root: Optional[str] = None
+
+class SessionDropped(Exception):
+    pass
+
+def split_commands(line: str) -> List[str]:
+    """按引号外的 ';' 拆分一行命令"""
+    parts, buf, quote = [], [], None
+    for ch in line:
+        if quote:
+            buf.append(ch)
+            if ch == quote:
+                quote = None
+        elif ch in ('"', "'"):
+            quote = ch
+            buf.append(ch)
+        elif ch == ';':
+            parts.append("".join(buf).strip())
+            buf = []
+        else:
+            buf.append(ch)
+    parts.append("".join(buf).strip())
+    return [p for p in parts if p]
+
+class FakeShell:
+    """与传输层无关的命令解释器：一行命令进，文本输出出"""
+    def __init__(self, spec: FakeHostSpec, rng: random.Random):
+        self.spec = spec
+        self.rng = rng
+        self.echo = True
+        self.cpu_ticks = (0, 0)
+
+    @property
+    def prompt(self) -> str:
+        return PROMPT_STYLES[self.spec.prompt_style].format(user=self.spec.username, hostname=self.spec.hostname)
+
+    def run(self, line: str) -> str:
+        if self.spec.root is not None and any(
+                (p.split() or [''])[0] not in SILENT_COMMANDS for p in split_commands(line)):
+            return self._run_real(line)
+        outputs = []
+        for part in split_commands(line):
+            if self.spec.drop_rate and self.rng.random() < self.spec.drop_rate:
+                raise SessionDropped()
+            out = self._run_one(part)
+            if out:
+                outputs.append(out)
+        return "\n".join(outputs)
+
+    def _run_real(self, line: str) -> str:
+        if self.spec.drop_rate and self.rng.random() < self.spec.drop_rate:
+            raise SessionDropped()
+        # 输出写临时文件而不是管道：命令里放到后台的进程 (如 nc -l ... &) 会继承管道，读管道要等它退出
+        with tempfile.TemporaryFile() as out:
+            subprocess.run(['/bin/sh', '-c', line], cwd=self.spec.root, stdin=subprocess.DEVNULL,
+                           stdout=out, stderr=subprocess.STDOUT)
+            out.seek(0)
+            return out.read().decode('utf-8', errors='replace').rstrip("\n")
+
+    def _run_one(self, cmd: str) -> str:
+        try:
+            argv = shlex.split(cmd)
+        except ValueError:
+            argv = cmd.split()
+        argv = [a for a in argv if not a.startswith('2>')]  # 忽略 stderr 重定向
+        name = argv[0] if argv else ''
+        if name in SILENT_COMMANDS:
+            if argv[1:2] == ['-echo']:
+                self.echo = False
+            elif name == 'stty' and argv[1:2] == ['echo']:
+                self.echo = True
+            return ""
+        if name == 'echo':
+            return " ".join(argv[1:])
+        if name == 'printf':
+            # 只处理 \n、\t 转义与 %s/%d；输出结尾的换行由 serve_shell 补上，这里去掉一个
+            text = argv[1] if len(argv) > 1 else ""
+            for arg in argv[2:]:
+                text = re.sub(r'%[sd]', lambda _: arg, text, count=1)
+            text = text.replace('\\n', '\n').replace('\\t', '\t')
+            return text[:-1] if text.endswith('\n') else text
+        if name == 'hostname':
+            return self.spec.hostname
+        if name == 'whoami':
+            return self.spec.username
+        if name == 'uname':
+            if '-a' in argv:
+                return f"Linux {self.spec.hostname} 5.10.0-fake #1 SMP x86_64 GNU/Linux"
+            return "5.10.0-fake" if '-r' in argv else "Linux"
+        if name == 'uptime':
+            load = self.rng.uniform(0.0, 6.0)
+            return (f" {time.strftime('%H:%M:%S')} up 12 days,  3:04,  1 user,  "
+                    f"load average: {load:.2f}, {load * 0.8:.2f}, {load * 0.6:.2f}")
+        if name == 'free':
+            used = self.rng.randint(1000, 7900)
+            return ("              total        used        free      shared  buff/cache   available\n"
+                    f"Mem:           7982        {used}        {7982 - used}          12         512        {7982 - used}\n"
+                    "Swap:          2047           0        2047")
+        if name == 'df':
+            pct = self.rng.randint(10, 95)
+            if '-Pi' in argv:
+                return ("Filesystem      Inodes IUsed   IFree IUse% Mounted on\n"
+                        f"/dev/sda1      3276800 {pct * 32768} {3276800 - pct * 32768}  {pct}% /")
+            if '-P' in argv:
+                return ("Filesystem     1024-blocks     Used Available Capacity Mounted on\n"
+                        f"/dev/sda1         52428800 {pct * 524288} {52428800 - pct * 524288}      {pct}% /")
+            return ("Filesystem      Size  Used Avail Use% Mounted on\n"
+                    f"/dev/sda1        50G  {pct // 2}G  {50 - pct // 2}G  {pct}% /")
+        if name in ('cat', 'head') and argv[-1:] == ['/proc/loadavg']:
+            load = self.rng.uniform(0.0, 6.0)
+            return f"{load:.2f} {load * 0.8:.2f} {load * 0.6:.2f} 2/389 12345"
+        if name in ('cat', 'head') and argv[-1:] == ['/proc/meminfo']:
+            available = self.rng.randint(80, 7000) * 1024
+            return ("MemTotal:        8173568 kB\n"
+                    f"MemFree:         {available // 2} kB\n"
+                    f"MemAvailable:    {available} kB\n"
+                    "Buffers:          102400 kB\n"
+                    "Cached:           409600 kB\n"
+                    "SwapTotal:       2097148 kB\n"
+                    f"SwapFree:        {self.rng.randint(1048576, 2097148)} kB")
+        if name in ('cat', 'head') and argv[-1:] == ['/proc/stat']:
+            # 累计计数单调递增，监控模式两次采样求差得到 CPU 使用率
+            busy, idle = self.rng.randint(0, 100), self.rng.randint(0, 100)
+            self.cpu_ticks = (self.cpu_ticks[0] + busy, self.cpu_ticks[1] + idle)
+            return f"cpu  {self.cpu_ticks[0]} 0 0 {self.cpu_ticks[1]} 0 0 0 0 0 0"
+        return "\n".join(
+            f"{self.spec.hostname} {cmd[:20]} line {n:05d} " + "x" * 40
+            for n in range(self.spec.output_lines)
+        )
+
+class _LineReader:
+    """把客户端按字节发来的输入拼成行，按需回显；兼容 \\r、\\n、\\r\\n、\\r\\0 结尾"""
+    def __init__(self, recv, send):
+        self.recv = recv
+        self.send = send
+        self.buf = ""
+        self._skip_lf = False
+
+    def readline(self, echo: bool) -> Optional[str]:
+        while True:
+            for i, ch in enumerate(self.buf):
+                if ch in '\r\n':
+                    line, self.buf = self.buf[:i], self.buf[i + 1:]
+                    if ch == '\r':
+                        if self.buf[:1] == '\n':
+                            self.buf = self.buf[1:]
+                        else:
+                            self._skip_lf = not self.buf
+                    if echo:
+                        self.send(line + "\r\n")
+                    return line
+            data = self.recv()
+            if not data:
+                return None
+            text = data.decode('utf-8', errors='replace')
+            if self._skip_lf and text[:1] in ('\n', '\0'):
+                text = text[1:]
+            self._skip_lf = False
+            self.buf += text.replace('\0', '')
+
+def serve_shell(shell: FakeShell, reader: _LineReader, send):
+    """交互 shell 主循环：打印提示符、读一行、执行、输出"""
+    send(shell.prompt)
+    while True:
+        line = reader.readline(shell.echo)
+        if line is None or line.strip() in ('exit', 'logout'):
+            return
+        output = shell.run(line)
+        if output:
+            send(output.replace("\n", "\r\n") + "\r\n")
+        send(shell.prompt)
+
+class _SSHServer(paramiko.ServerInterface):
+    def __init__(self, fleet: 'FakeFleet', spec: FakeHostSpec):
+        self.fleet = fleet
+        self.spec = spec
+
+    def get_allowed_auths(self, username):
+        return 'password'
+
+    def check_auth_password(self, username, password):
+        if self.spec.login_delay:
+            time.sleep(self.spec.login_delay)
+        if self.fleet.login_ok(self.spec, username, password):
+            return paramiko.AUTH_SUCCESSFUL
+        return paramiko.AUTH_FAILED
+
+    def check_channel_request(self, kind, chanid):
+        if kind == 'session':
+            return paramiko.OPEN_SUCCEEDED
+        return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+    def check_channel_pty_request(self, channel, term, width, height, pixelwidth, pixelheight, modes):
+        return True
+
+    def check_channel_shell_request(self, channel):
+        threading.Thread(target=self._shell, args=(channel,), daemon=True).start()
+        return True
+
+    def check_channel_exec_request(self, channel, command):
+        threading.Thread(target=self._exec, args=(channel, command.decode('utf-8', errors='replace')),
+                         daemon=True).start()
+        return True
+
+    def _sender(self, channel):
+        def send(text: str):
+            if self.spec.packet_delay:
+                time.sleep(self.spec.packet_delay)
+            channel.sendall(text.encode('utf-8'))
+        return send
+
+    def _shell(self, channel):
+        shell = FakeShell(self.spec, self.fleet.rng)
+        send = self._sender(channel)
+        try:
+            serve_shell(shell, _LineReader(lambda: channel.recv(4096), send), send)
+        except (SessionDropped, OSError, EOFError):
+            self.fleet.count('drops')
+        finally:
+            self._close(channel)
+
+    def _exec(self, channel, command):
+        shell = FakeShell(self.spec, self.fleet.rng)
+        try:
+            output = shell.run(command)
+            self._sender(channel)(output + "\n" if output else "")
+            channel.send_exit_status(0)
+        except SessionDropped:
+            self.fleet.count('drops')
+            channel.get_transport().close()
+        except (OSError, EOFError):
+            pass
+        finally:
+            self._close(channel)
+
+    @staticmethod
+    def _close(channel):
+        try:
+            channel.close()
+        except (OSError, EOFError):
+            pass  # 客户端已先断开
+
+class _SFTPHandle(paramiko.SFTPHandle):
+    def stat(self):
+        return paramiko.SFTPAttributes.from_stat(os.fstat(self.readfile.fileno()))
+
+class _RootedSFTP(paramiko.SFTPServerInterface):
+    """以主机 root 目录为根的最小 SFTP 服务端：支持打开/读写/stat/删除/改名"""
+    def __init__(self, server: '_SSHServer', *args, **kwargs):
+        super().__init__(server, *args, **kwargs)
+        self.root = server.spec.root
+
+    def _path(self, path: str) -> str:
+        return os.path.join(self.root, os.path.normpath('/' + path).lstrip('/'))
+
+    def open(self, path, flags, attr):
+        try:
+            fd = os.open(self._path(path), flags, 0o644)
+            if flags & os.O_WRONLY:
+                mode = 'ab' if flags & os.O_APPEND else 'wb'
+            elif flags & os.O_RDWR:
+                mode = 'a+b' if flags & os.O_APPEND else 'r+b'
+            else:
+                mode = 'rb'
+            handle = _SFTPHandle(flags)
+            handle.readfile = handle.writefile = os.fdopen(fd, mode)
+            return handle
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+
+    def stat(self, path):
+        try:
+            return paramiko.SFTPAttributes.from_stat(os.stat(self._path(path)))
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+
+    lstat = stat
+
+    def remove(self, path):
+        try:
+            os.remove(self._path(path))
+            return paramiko.SFTP_OK
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+
+    def rename(self, oldpath, newpath):
+        try:
+            os.replace(self._path(oldpath), self._path(newpath))
+            return paramiko.SFTP_OK
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+
+class FakeFleet:
+    """
+    一组模拟主机。start() 绑定端口并返回对应的 HostConfig 列表，可直接交给执行器。
+
+        with FakeFleet(make_specs(400)) as fleet:
+            results = RemoteExecutor().run_batch(fleet.hosts, "uptime")
+    """
+    _host_key = None
+
+    def __init__(self, specs: List[FakeHostSpec], bind: str = '127.0.0.1', seed: Optional[int] = None):
+        self.specs = specs
+        self.bind = bind
+        self.rng = random.Random(seed)
+        self.hosts: List[HostConfig] = []
+        self.stats = {'connections': 0, 'login_failures': 0, 'drops': 0}
+        self._stats_lock = threading.Lock()
+        self._sel = selectors.DefaultSelector()
+        self._listeners = []
+        self._stop = threading.Event()
+        self._thread = None
+        logging.getLogger('paramiko').setLevel(logging.CRITICAL)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    @classmethod
+    def host_key(cls) -> paramiko.RSAKey:
+        # 生成 RSA 密钥较慢，整个进程共用一把
+        if cls._host_key is None:
+            cls._host_key = paramiko.RSAKey.generate(2048)
+        return cls._host_key
+
+    def count(self, name: str):
+        with self._stats_lock:
+            self.stats[name] += 1
+
+    def login_ok(self, spec: FakeHostSpec, username: str, password: str) -> bool:
+        ok = (username == spec.username and password == spec.password
+              and not (spec.fail_rate and self.rng.random() < spec.fail_rate))
+        if not ok:
+            self.count('login_failures')
+        return ok
+
+    def start(self) -> List[HostConfig]:
+        if any(s.protocol == 'ssh' for s in self.specs):
+            self.host_key()
+        for spec in self.specs:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            sock.bind((self.bind, 0))
+            sock.listen(128)
+            sock.setblocking(False)
+            self._sel.register(sock, selectors.EVENT_READ, spec)
+            self._listeners.append(sock)
+            port = sock.getsockname()[1]
+            self.hosts.append(HostConfig(
+                hostname=self.bind,
+                port=port,
+                username=spec.username,
+                password=spec.password,
+                protocol=spec.protocol,
+                group_name=f"fake_{spec.protocol}",
+                alias=spec.hostname,
+                groups=(f"fake_{spec.protocol}",),
+            ))
+        self._thread = threading.Thread(target=self._accept_loop, name="fake-fleet", daemon=True)
+        self._thread.start()
+        return self.hosts
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        for sock in self._listeners:
+            self._sel.unregister(sock)
+            sock.close()
+        self._listeners = []
+        self._sel.close()
+
+    def _accept_loop(self):
+        while not self._stop.is_set():
+            for key, _ in self._sel.select(0.2):
+                try:
+                    conn, _ = key.fileobj.accept()
+                except OSError:
+                    continue
+                conn.setblocking(True)
+                self.count('connections')
+                handler = self._serve_ssh if key.data.protocol == 'ssh' else self._serve_telnet
+                threading.Thread(target=handler, args=(conn, key.data), daemon=True).start()
+
+    def _serve_ssh(self, conn, spec: FakeHostSpec):
+        transport = paramiko.Transport(conn)
+        transport.add_server_key(self.host_key())
+        if spec.root is not None:
+            transport.set_subsystem_handler('sftp', paramiko.SFTPServer, _RootedSFTP)
+        try:
+            # 协商完成后由 transport 自身的线程继续处理，本线程退出
+            transport.start_server(server=_SSHServer(self, spec))
+        except (paramiko.SSHException, EOFError, OSError):
+            transport.close()
+
+    def _serve_telnet(self, conn, spec: FakeHostSpec):
+        def send(text: str):
+            if spec.packet_delay:
+                time.sleep(spec.packet_delay)
+            conn.sendall(text.encode('utf-8'))
+
+        pending = b""
+
+        def recv() -> bytes:
+            # 剥离客户端发来的 IAC 应答，不影响会话
+            nonlocal pending
+            while True:
+                data = conn.recv(4096)
+                if not data:
+                    return b""
+                data = pending + data
+                pending = b""
+                out = bytearray()
+                i = 0
+                while i < len(data):
+                    b = data[i]
+                    if b != IAC:
+                        out.append(b)
+                        i += 1
+                    elif i + 1 >= len(data):
+                        pending = data[i:]
+                        break
+                    elif data[i + 1] in (DO, DONT, WILL, WONT):
+                        if i + 2 >= len(data):
+                            pending = data[i:]
+                            break
+                        i += 3
+                    elif data[i + 1] == SB:
+                        end = data.find(bytes([IAC, SE]), i)
+                        if end < 0:
+                            pending = data[i:]
+                            break
+                        i = end + 2
+                    else:
+                        i += 2
+                if out:
+                    return bytes(out)
+
+        shell = FakeShell(spec, self.rng)
+        reader = _LineReader(recv, send)
+        try:
+            conn.sendall(bytes([IAC, WILL, OPT_ECHO, IAC, WILL, OPT_SGA]))
+            send("login: ")
+            username = reader.readline(echo=True)
+            while username is not None and not username.strip():
+                # 与真实的 login 一样，空用户名 (客户端先发的回车) 重新提示
+                send("login: ")
+                username = reader.readline(echo=True)
+            send("Password: ")
+            password = reader.readline(echo=False)
+            if username is None or password is None:
+                return
+            send("\r\n")
+            if spec.login_delay:
+                time.sleep(spec.login_delay)
+            if not self.login_ok(spec, username.strip(), password):
+                send("Login incorrect\r\n")
+                return
+            send(f"Last login: {time.strftime('%a %b %d %H:%M:%S')} from 127.0.0.1\r\n")
+            serve_shell(shell, reader, send)
+        except SessionDropped:
+            self.count('drops')
+        except OSError:
+            pass
+        finally:
+            conn.close()
+
+def make_specs(count: int, protocol: str = 'ssh', **options) -> List[FakeHostSpec]:
+    """
+    生成 count 台模拟主机，主机名沿用现场风格 ZS_S6_SITE_xx。
+    protocol 为 'mixed' 时 SSH/Telnet 各占一半。
+    """
+    specs = []
+    width = max(2, len(str(count)))
+    for i in range(1, count + 1):
+        proto = protocol if protocol != 'mixed' else ('ssh' if i % 2 else 'telnet')
+        specs.append(FakeHostSpec(hostname=f"ZS_S6_SITE_{i:0{width}d}", protocol=proto, **options))
+    return specs
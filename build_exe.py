@@ -1,36 +1,56 @@
+import argparse
 import subprocess
 import shutil
 import os
 
-def build():
+# --slim 模式下排除的模块：都是依赖链上可选、本工具从不使用的包
+# (Netmiko 的驱动目录由 ssh_dispatcher 静态导入，排除单个驱动会让 import netmiko 直接失败，只能整体保留)
+SLIM_EXCLUDES = [
+    'invoke',         # paramiko 仅在 ssh_config 使用 Match exec 时才需要，导入它本身要几十毫秒
+    'ntc_templates',  # Netmiko use_textfsm 的模板库，数千个模板文件
+    'ttp',            # Netmiko use_ttp
+    'genie',          # Netmiko use_genie
+    'pyats',
+    'tkinter',
+]
+
+def build(slim: bool = False):
     # 1. 清理之前的构建
     for path in ['build', 'dist']:
         if os.path.exists(path):
             shutil.rmtree(path)
 
     # 2. 执行 PyInstaller
-    print("正在打包中，请稍候...")
+    # 默认单文件：便于拷贝，但每次启动都要先把整个包解压到临时目录。
+    # --slim 改为目录形式 (启动时无需解压) 并排除用不到的依赖，脚本高频调用时启动更快
+    print("正在打包中，请稍候..." + (" (精简模式)" if slim else ""))
     cmd = [
         'pyinstaller',
-        '--onefile',
+        '--onedir' if slim else '--onefile',
         '--console',
         '--name=multiTelnet',
-        'manager.py'
     ]
+    if slim:
+        cmd += [f'--exclude-module={name}' for name in SLIM_EXCLUDES]
+    cmd.append('manager.py')
     subprocess.run(cmd)
 
     # 3. 准备分发包
     release_dir = 'release'
     if os.path.exists(release_dir):
         shutil.rmtree(release_dir)
-    os.makedirs(release_dir)
 
-    # 拷贝 exe
-    shutil.copy('dist/multiTelnet.exe', f'{release_dir}/multiTelnet.exe')
-    
+    if slim:
+        # 目录形式：exe 与依赖目录需要放在一起
+        shutil.copytree('dist/multiTelnet', release_dir)
+    else:
+        os.makedirs(release_dir)
+        # 拷贝 exe
+        shutil.copy('dist/multiTelnet.exe', f'{release_dir}/multiTelnet.exe')
+
     # 拷贝必要的目录结构
     shutil.copytree('inventory', f'{release_dir}/inventory')
-    
+
     # 创建空日志目录
     os.makedirs(f'{release_dir}/logs', exist_ok=True)
 
@@ -38,4 +58,6 @@ def build():
     print("你可以直接把整个 'release' 文件夹拷贝到任何电脑上运行。")
 
 if __name__ == "__main__":
-    build()
+    parser = argparse.ArgumentParser(description='使用 PyInstaller 打包 multiTelnet')
+    parser.add_argument('--slim', action='store_true', help='精简模式：目录形式 + 排除用不到的依赖，启动更快')
+    build(parser.parse_args().slim)
@@ -1,39 +1,111 @@
-from collections import defaultdict
-from typing import List, Dict
+from contextlib import contextmanager
+from typing import Callable, List, Dict, Optional
 from core.executor import ExecutionResult
+from core.audit import AuditStore
+from core.capture import iter_spool_chunks
+from core.cluster import DEFAULT_SIMILARITY, Cluster, cluster_groups
+from core.compare import OutputGroup, diff_against, diff_against_majority, iter_normalized_lines, lines_key, normalize, output_key, reorders
+from core.health import HostHealth, collect
 import json
 import csv
 import os
 from datetime import datetime
 
+class OutputGrouper:
+    """
+    增量归类：结果边到达边归组，无需等整批执行结束。
+    传入 normalizers 时按归一化后输出的哈希归组，主机名、时间戳等差异不再把每台主机拆成单独一组。
+    捕获模式下落盘的输出从文件按块流式归一化并计算哈希，不会整体读入内存。
+    """
+    def __init__(self, normalizers: Optional[List[Callable]] = None):
+        self.normalizers = normalizers or []
+        self._unordered = reorders(self.normalizers)
+        self._groups: Dict[str, OutputGroup] = {}
+
+    def add(self, r: ExecutionResult, aliases: Optional[List[str]] = None):
+        """aliases 给出时，r 的输出代表这些主机 (摘要模式下同一摘要只取回一台的输出)"""
+        if r.status == 'SUCCESS' and r.spool:
+            lines = lambda: iter_normalized_lines(iter_spool_chunks(r.spool), r, self.normalizers)
+            key = lines_key(lines(), self._unordered)
+            if key not in self._groups:
+                self._groups[key] = OutputGroup(key=key, sample=r.output, normalized="", lines=lines)
+        elif r.status == 'SUCCESS':
+            normalized = normalize(r.output, r, self.normalizers)
+            key = lines_key(normalized.splitlines(), self._unordered)
+            if key not in self._groups:
+                self._groups[key] = OutputGroup(key=key, sample=r.output, normalized=normalized)
+        else:
+            sample = f"[{r.status}] {r.error}"
+            key = output_key(sample)
+            if key not in self._groups:
+                self._groups[key] = OutputGroup(key=key, sample=sample, normalized=sample, failed=True)
+        self._groups[key].aliases.extend(aliases if aliases is not None else [r.alias])
+
+    def __len__(self):
+        return len(self._groups)
+
+    def entries(self) -> List[OutputGroup]:
+        """按主机数从多到少排列的分组"""
+        return sorted(self._groups.values(), key=lambda g: len(g.aliases), reverse=True)
+
+    def groups(self) -> Dict[str, List[str]]:
+        return {g.sample: g.aliases for g in self._groups.values()}
+
+    def diffs(self) -> Dict[str, List[str]]:
+        return diff_against_majority(self.entries())
+
+    def clusters(self, threshold: float = DEFAULT_SIMILARITY) -> List[Cluster]:
+        """把精确分组再按 MinHash 相似度聚成簇，输出各不相同的大批主机也能看出少数真正不同的机器"""
+        return cluster_groups(self.entries(), threshold)
+
+    def cluster_diffs(self, clusters: List[Cluster]) -> Dict[str, List[str]]:
+        """每个离群簇的代表输出相对最相似大簇代表输出的差异，按离群簇代表分组的 key 索引"""
+        diffs = {}
+        for c in clusters:
+            if c.outlier:
+                diffs.update(diff_against(clusters[c.nearest].representative, [c.representative]))
+        return diffs
+
 class ResultAnalyzer:
     @staticmethod
-    def group_by_output(results: List[ExecutionResult]) -> Dict[str, List[str]]:
-        groups = defaultdict(list)
+    def group_by_output(results: List[ExecutionResult], normalizers: Optional[List[Callable]] = None) -> Dict[str, List[str]]:
+        grouper = OutputGrouper(normalizers)
         for r in results:
-            if r.status == 'SUCCESS':
-                groups[r.output].append(r.alias)
-            else:
-                groups[f"[FAILED] {r.error}"].append(r.alias)
-        return dict(groups)
+            grouper.add(r)
+        return grouper.groups()
+
+    @staticmethod
+    def cluster_by_similarity(results: List[ExecutionResult], normalizers: Optional[List[Callable]] = None,
+                              threshold: float = DEFAULT_SIMILARITY) -> List[Cluster]:
+        grouper = OutputGrouper(normalizers)
+        for r in results:
+            grouper.add(r)
+        return grouper.clusters(threshold)
 
 class SimpleLogger:
+    FIELDNAMES = ['timestamp', 'alias', 'host', 'port', 'group', 'command', 'status', 'duration', 'output_summary', 'error']
+
     def __init__(self, log_dir: str):
         self.log_dir = log_dir
         if not os.path.exists(log_dir):
             os.makedirs(log_dir)
         
         self.latest_log = os.path.join(log_dir, "latest_execution.csv")
+        self.audit_db = os.path.join(log_dir, "audit.db")
 
-    def log_results(self, results: List[ExecutionResult]):
-        fieldnames = ['timestamp', 'alias', 'host', 'port', 'group', 'command', 'status', 'duration', 'output_summary', 'error']
-        
-        # 写入最新记录
-        with open(self.latest_log, 'w', newline='', encoding='utf-8') as f:
-            writer = csv.DictWriter(f, fieldnames=fieldnames)
-            writer.writeheader()
-            for r in results:
-                writer.writerow({
+    @contextmanager
+    def stream(self):
+        """
+        流式写日志：返回 write(result)，每到一条结果立即写入。
+        latest_execution.csv 在打开时重写；完整输出进入 SQLite 审计库 (批量事务提交，退出时按清理周期清理过期记录)。
+        """
+        with open(self.latest_log, 'w', newline='', encoding='utf-8') as latest_f, \
+                AuditStore(self.audit_db) as audit:
+            latest = csv.DictWriter(latest_f, fieldnames=self.FIELDNAMES)
+            latest.writeheader()
+
+            def write(r: ExecutionResult):
+                latest.writerow({
                     'timestamp': r.start_time,
                     'alias': r.alias,
                     'host': r.host,
@@ -45,85 +117,30 @@ class SimpleLogger:
                     'output_summary': r.output[:100].replace('\n', ' ') if r.output else "",
                     'error': r.error
                 })
-        
-        # 同时追加到审计总日志
-        audit_file = os.path.join(self.log_dir, "audit_history.csv")
-        file_exists = os.path.isfile(audit_file)
-        with open(audit_file, 'a', newline='', encoding='utf-8') as f:
-            writer = csv.DictWriter(f, fieldnames=fieldnames)
-            if not file_exists:
-                writer.writeheader()
+                latest_f.flush()
+                audit.add(r)
+
+            yield write
+            audit.flush()
+            audit.prune_if_due()
+
+    def log_results(self, results: List[ExecutionResult]):
+        with self.stream() as write:
             for r in results:
-                writer.writerow({
-                    'timestamp': r.start_time,
-                    'alias': r.alias,
-                    'host': r.host,
-                    'port': r.port,
-                    'group': r.group,
-                    'command': r.command,
-                    'status': r.status,
-                    'duration': r.duration,
-                    'output_summary': r.output[:500].replace('\n', ' ') if r.output else "",
-                    'error': r.error
-                })
+                write(r)
 
 class HealthParser:
-    """系统健康指标解析器"""
+    """系统健康指标解析器：每台主机一次探针 (core.health.HEALTH_PROBE)，按注册的指标解析器逐项解析"""
     @staticmethod
-    def parse_metrics(results_map: Dict[str, List[ExecutionResult]]) -> Dict[str, dict]:
+    def parse_metrics(results_map: Dict[str, List[ExecutionResult]]) -> Dict[str, HostHealth]:
         """
-        根据执行结果解析核心指标
+        results_map 为 run_batch_multi 返回的以主机 Alias 为 Key 的映射。
+        任一条命令失败的主机记为离线；解析失败的指标记录在 HostHealth.errors 中
         """
         metrics = {}
-        # 结果是以命令为 Key 的映射
-        # 我们需要按主机 Alias 进行聚合
-        
-        all_hosts = set()
-        for res_list in results_map.values():
-            for r in res_list:
-                all_hosts.add(r.alias)
-                
-        for alias in all_hosts:
-            metrics[alias] = {"status": "ONLINE", "load": "-", "mem": "-", "disk": "-"}
-
-        for cmd, res_list in results_map.items():
-            cmd = cmd.lower()
-            for res in res_list:
-                if res.status != "SUCCESS":
-                    metrics[res.alias]["status"] = "OFFLINE"
-                    continue
-                
-                output = res.output.lower()
-                
-                # 1. 解析负载 (uptime)
-                if "load average" in output:
-                    try:
-                        load_part = output.split("load average:")[1].split(",")[0].strip()
-                        metrics[res.alias]["load"] = float(load_part)
-                    except: pass
-                
-                # 2. 解析内存 (free -m)
-                if "mem:" in output:
-                    try:
-                        lines = output.splitlines()
-                        for line in lines:
-                            if "mem:" in line:
-                                parts = line.split()
-                                total = int(parts[1])
-                                used = int(parts[2])
-                                metrics[res.alias]["mem"] = int((used / total) * 100)
-                    except: pass
-
-                # 3. 解析磁盘 (df -h)
-                if "/" in output and "%" in output:
-                    try:
-                        lines = output.splitlines()
-                        for line in lines:
-                            # 匹配根路径输出
-                            if line.strip().endswith("/"):
-                                parts = line.split()
-                                for p in parts:
-                                    if "%" in p:
-                                        metrics[res.alias]["disk"] = int(p.replace("%", ""))
-                    except: pass
+        for alias, res_list in results_map.items():
+            if any(r.status != "SUCCESS" for r in res_list):
+                metrics[alias] = HostHealth(online=False)
+                continue
+            metrics[alias] = collect("\n".join(r.output for r in res_list))
         return metrics
@@ -0,0 +1,365 @@
+import asyncio
+import socket
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Iterator, List, Dict, Optional
+
+from core.capture import CaptureConfig
+from core.metrics import PhaseTimer, add_phases, phase, recording
+from core.executor import ExecutionResult, RemoteExecutor, session_key, timeout_results, unreachable_results
+from core.retry import TIMEOUT_STATUS, ConnectStats, Deadline, RetryPolicy, is_transient
+from core.telnet import AsyncTelnetSession, CommandTimeoutError, TelnetAuthenticationError
+
+COMMAND_TIMEOUT = 10.0  # 每条命令的读超时 (秒)，与线程引擎一致；再收紧到批次截止时间之内
+
+async def _open_socket(host_cfg) -> socket.socket:
+    """单独完成 TCP 建连，便于与 SSH 协商/认证分开计时"""
+    loop = asyncio.get_running_loop()
+    infos = await loop.getaddrinfo(host_cfg.hostname, host_cfg.port, type=socket.SOCK_STREAM)
+    family, _, _, _, addr = infos[0]
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setblocking(False)
+    try:
+        await loop.sock_connect(sock, addr)
+    except BaseException:
+        sock.close()
+        raise
+    return sock
+
+class _AsyncSSHSession:
+    """asyncssh 会话：使用 exec 通道，无需处理提示符"""
+    def __init__(self, conn):
+        self.conn = conn
+
+    @classmethod
+    async def open(cls, host_cfg, timeout: float):
+        import asyncssh
+        with phase('tcp'):
+            sock = await asyncio.wait_for(_open_socket(host_cfg), timeout)
+        try:
+            with phase('login'):
+                conn = await asyncssh.connect(
+                    sock=sock, host=host_cfg.hostname,
+                    username=host_cfg.username, password=host_cfg.password,
+                    known_hosts=None, connect_timeout=timeout,
+                )
+        except BaseException:
+            sock.close()
+            raise
+        return cls(conn)
+
+    async def run(self, commands: List[str], timeout: float) -> Dict[int, str]:
+        """timeout 为整组命令的读超时"""
+        import asyncssh
+        outputs = {}
+        end = time.monotonic() + timeout
+        for i, cmd in enumerate(commands):
+            try:
+                res = await self.conn.run(cmd, stderr=asyncssh.STDOUT,
+                                          timeout=max(Deadline.MIN_TIMEOUT, end - time.monotonic()))
+            except asyncssh.TimeoutError:
+                raise CommandTimeoutError(f"Command timed out after {timeout:g}s")
+            outputs[i] = (res.stdout or "").strip()
+        return outputs
+
+    async def stream(self, commands: List[str], spools: list, timeout: float):
+        """捕获模式：超时按连续无数据计算，与线程引擎一致"""
+        import asyncssh
+        for cmd, spool in zip(commands, spools):
+            async with self.conn.create_process(cmd, stderr=asyncssh.STDOUT) as proc:
+                try:
+                    while True:
+                        chunk = await asyncio.wait_for(proc.stdout.read(65536), timeout)
+                        if not chunk:
+                            break
+                        spool.write(chunk)
+                    await asyncio.wait_for(proc.wait(), timeout)
+                except asyncio.TimeoutError:
+                    raise CommandTimeoutError(f"No output for {timeout:g}s")
+
+    def close(self):
+        self.conn.close()
+
+class AsyncRemoteExecutor:
+    """
+    基于 asyncio 的执行引擎，单线程即可维持数千个并发会话。
+    对外接口 (run_batch / run_batch_multi / progress_callback / ExecutionResult) 与 RemoteExecutor 一致。
+    SSH 依赖 asyncssh，Telnet 使用内置的 asyncio 客户端。
+    """
+    def __init__(self, max_workers: int = 1000, conn_timeout: float = 30, scheduler=None, preflight=None,
+                 capture: Optional[CaptureConfig] = None, retry: Optional[RetryPolicy] = None, hedge: bool = False,
+                 deadline: Optional[float] = None):
+        self.max_workers = max_workers
+        self.conn_timeout = conn_timeout
+        self.scheduler = scheduler  # ConnectionScheduler，与线程引擎共用同一套限流规则
+        self.preflight = preflight  # ReachabilityProbe，None 表示不做预检
+        self.capture = capture  # CaptureConfig，None 表示输出整体保存在内存中
+        self.retry = retry  # RetryPolicy，None 表示建连失败不重试
+        self.hedge = hedge  # 建连慢于本批 p95 时发起对冲
+        self.deadline = deadline  # 每批的截止时间 (秒)，None 表示等所有主机结束
+        self.deadline_budget = None  # 作为分片运行时父进程下发的剩余时间
+        self._deadline = Deadline()
+        self._connect_stats = ConnectStats()
+        self._loop = asyncio.new_event_loop()
+        self._sessions = {}  # session_key -> 会话，跨批次复用
+        self._locks = defaultdict(asyncio.Lock)  # 同一会话同一时刻只跑一组命令
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        for session in self._sessions.values():
+            try:
+                session.close()
+            except Exception:
+                pass
+        self._sessions.clear()
+        self._cancel_all(asyncio.all_tasks(self._loop))
+        self._loop.run_until_complete(asyncio.sleep(0))
+        self._loop.close()
+
+    def _cancel_all(self, tasks):
+        """
+        取消任务并等它们真正退出，连同它们派生出、同样被取消的任务 (对冲建连的各次尝试)。
+        事件循环关闭时还挂着的任务会在别的上下文里被销毁，其中半开的连接也不会关闭
+        """
+        while True:
+            pending = [t for t in tasks if not t.done()]
+            if not pending:
+                return
+            for t in pending:
+                t.cancel()
+            self._loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+            tasks = asyncio.all_tasks(self._loop)
+
+    @staticmethod
+    def _error_message(exc: Exception) -> str:
+        if isinstance(exc, CommandTimeoutError):
+            return str(exc)
+        if isinstance(exc, asyncio.TimeoutError):
+            return "Connection Timeout"
+        if type(exc).__name__ == 'PermissionDenied' or isinstance(exc, TelnetAuthenticationError):
+            return "Authentication Failed"
+        return str(exc) or type(exc).__name__
+
+    async def _get_session(self, host_cfg):
+        key = session_key(host_cfg)
+        session = self._sessions.get(key)
+        if session is None:
+            session = await self._open_session(host_cfg)
+            self._sessions[key] = session
+        return session
+
+    async def _open_session(self, host_cfg):
+        """新建会话：瞬时故障按带抖动的指数退避重试 (不超过截止时间)"""
+        attempt = 0
+        while True:
+            try:
+                return await self._hedged_open(host_cfg)
+            except Exception as e:
+                if self.retry is None or attempt >= self.retry.attempts or not is_transient(e):
+                    raise
+                delay = self.retry.backoff(attempt)
+                remaining = self._deadline.remaining()
+                if remaining is not None and remaining <= delay:
+                    raise
+                attempt += 1
+                with phase('retry'):
+                    await asyncio.sleep(delay)
+
+    async def _open(self, host_cfg):
+        opener = _AsyncSSHSession if host_cfg.protocol == 'ssh' else AsyncTelnetSession
+        if self.scheduler is not None:
+            delay = self.scheduler.connect_delay(host_cfg)
+            if delay > 0:
+                with phase('throttle'):
+                    await asyncio.sleep(delay)
+        start = time.perf_counter()
+        session = await opener.open(host_cfg, self._deadline.clamp(self.conn_timeout))
+        self._connect_stats.add(time.perf_counter() - start)
+        return session
+
+    async def _hedged_open(self, host_cfg):
+        """建连超过本批 p95 仍未完成时再并行发起一次，先成功的胜出，另一个取消；有单 IP 上限的主机不对冲"""
+        if not self.hedge or (self.scheduler is not None and self.scheduler.ip_cap(host_cfg)):
+            return await self._open(host_cfg)
+
+        async def attempt():
+            # 每次尝试单独计时，只把胜出那次的 tcp/login 耗时计入本主机
+            with recording(PhaseTimer()) as timer:
+                try:
+                    return timer, await self._open(host_cfg), None
+                except Exception as e:
+                    return timer, None, e
+
+        tasks = {asyncio.ensure_future(attempt())}
+        started, hedged_at = time.perf_counter(), None
+        try:
+            while True:
+                wait = None
+                if hedged_at is None:
+                    wait = self._connect_stats.hedge_wait(time.perf_counter() - started)
+                    if wait == 0:
+                        tasks.add(asyncio.ensure_future(attempt()))
+                        hedged_at, wait = time.perf_counter(), None
+                done, _ = await asyncio.wait(tasks, timeout=wait, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    tasks.discard(task)
+                    timer, session, exc = task.result()
+                    if exc is None or not tasks:
+                        add_phases(timer.phases)
+                        if hedged_at is not None:
+                            add_phases({'hedge': time.perf_counter() - hedged_at})
+                        if exc is not None:
+                            raise exc
+                        return session
+        finally:
+            # 取消输掉或仍在进行的尝试，并等它们退出后再关闭其间建连成功的会话
+            for task in tasks:
+                task.cancel()
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+            for task in tasks:
+                if not task.cancelled() and task.result()[1] is not None:
+                    task.result()[1].close()
+
+    async def _run_commands(self, session, host_cfg, commands: List[str]) -> dict:
+        timeout = self._deadline.clamp(COMMAND_TIMEOUT * len(commands))
+        if self.capture is None:
+            return await session.run(commands, timeout)
+        spools = [self.capture.open(host_cfg, i) for i in range(len(commands))]
+        try:
+            await session.stream(commands, spools, timeout)
+        except BaseException:
+            for spool in spools:
+                spool.discard()
+            raise
+        return {i: spool.close() for i, spool in enumerate(spools)}
+
+    def _drop_session(self, host_cfg):
+        stale = self._sessions.pop(session_key(host_cfg), None)
+        if stale is not None:
+            with phase('disconnect'):
+                stale.close()
+
+    def failure(self, exc: Exception):
+        """(状态, 错误信息)；截止时间已过时被收紧的超时打断的主机记为 TIMEOUT"""
+        if self._deadline.expired():
+            return TIMEOUT_STATUS, self._deadline.message
+        return "FAILED", self._error_message(exc)
+
+    async def _execute_host(self, host_cfg, commands: List[str], sem, batch_start: float) -> List[ExecutionResult]:
+        async with sem:
+            queue_wait = round(time.perf_counter() - batch_start, 4)
+            start_time_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            start_ts = time.time()
+            outputs = {}
+            status, error = "FAILED", ""
+            with recording(PhaseTimer()) as timer:
+                try:
+                    async with self._locks[session_key(host_cfg)]:
+                        session = await self._get_session(host_cfg)
+                        with phase('command'):
+                            outputs = await self._run_commands(session, host_cfg, commands)
+                except Exception as e:
+                    status, error = self.failure(e)
+                    # 失败的会话不再复用
+                    self._drop_session(host_cfg)
+                except asyncio.CancelledError:
+                    # 被取消 (调用方提前停止或到了截止时间) 时会话可能停在命令中途
+                    self._drop_session(host_cfg)
+                    raise
+            duration = round(time.time() - start_ts, 2)
+
+        results = []
+        for i, cmd in enumerate(commands):
+            if error:
+                results.append(RemoteExecutor._make_result(host_cfg, cmd, status, "", error, start_time_str, duration, timer.phases))
+            elif i not in outputs:
+                results.append(RemoteExecutor._make_result(host_cfg, cmd, "FAILED", "", "Missing Sentinel", start_time_str, duration, timer.phases))
+            else:
+                results.append(RemoteExecutor._make_result(host_cfg, cmd, "SUCCESS", outputs[i], "", start_time_str, duration, timer.phases))
+        for r in results:
+            r.queue_wait = queue_wait
+        return results
+
+    def iter_batch_multi(self, hosts, commands: List[str]) -> Iterator[List[ExecutionResult]]:
+        """按完成顺序逐台产出该主机的结果列表；到了截止时间，未完成的主机取消并产出 TIMEOUT 结果"""
+        self._deadline = Deadline(self.deadline, self.deadline_budget)
+        self._connect_stats = ConnectStats()
+        if self.preflight is not None:
+            hosts, dead = self.preflight.split(hosts)
+            for h in dead:
+                yield unreachable_results(h, commands)
+
+        sem = asyncio.Semaphore(self.max_workers)
+        done = asyncio.Queue()
+        sched = self.scheduler
+        slots = asyncio.Condition()
+        batch_start = time.perf_counter()
+
+        async def run_one(host_cfg):
+            if sched is None:
+                await done.put(await self._execute_host(host_cfg, commands, sem, batch_start))
+                return
+            # 组/IP 满额时等待其它主机释放名额
+            async with slots:
+                await slots.wait_for(lambda: sched.try_start(host_cfg))
+            try:
+                await done.put(await self._execute_host(host_cfg, commands, sem, batch_start))
+            finally:
+                sched.finish(host_cfg)
+                async with slots:
+                    slots.notify_all()
+
+        ordered = sched.order(hosts) if sched is not None else hosts
+        tasks = [self._loop.create_task(run_one(h)) for h in ordered]
+        finished = set()
+        try:
+            for _ in range(len(tasks)):
+                try:
+                    results = self._loop.run_until_complete(
+                        asyncio.wait_for(done.get(), self._deadline.remaining()))
+                except asyncio.TimeoutError:
+                    break
+                finished.add(results[0].alias)
+                yield results
+            else:
+                return
+            # 截止时间已到：取消其余主机，已经排队的结果照常产出，其余记为 TIMEOUT
+            self._cancel_all(tasks)
+            while not done.empty():
+                results = done.get_nowait()
+                finished.add(results[0].alias)
+                yield results
+            cut = time.perf_counter()
+            for h in ordered:
+                if h.alias not in finished:
+                    yield timeout_results(h, commands, self._deadline, cut - batch_start)
+        finally:
+            # 调用方提前停止迭代时取消尚未完成的主机
+            self._cancel_all(tasks)
+
+    def iter_batch(self, hosts, command: str) -> Iterator[ExecutionResult]:
+        for host_results in self.iter_batch_multi(hosts, [command]):
+            yield host_results[0]
+
+    def run_batch(self, hosts, command: str, progress_callback=None) -> List[ExecutionResult]:
+        results = []
+        for res in self.iter_batch(hosts, command):
+            results.append(res)
+            if progress_callback:
+                progress_callback(res)
+        return results
+
+    def run_batch_multi(self, hosts, commands: List[str], progress_callback=None) -> Dict[str, List[ExecutionResult]]:
+        results = {}
+        for host_results in self.iter_batch_multi(hosts, commands):
+            results[host_results[0].alias] = host_results
+            if progress_callback:
+                progress_callback(host_results)
+        return results
@@ -0,0 +1,193 @@
+import hashlib
+import os
+import re
+import sqlite3
+import zlib
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outputs (
+    hash TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    body BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    ts TEXT NOT NULL,
+    alias TEXT NOT NULL,
+    host TEXT,
+    port INTEGER,
+    grp TEXT,
+    command TEXT NOT NULL,
+    status TEXT,
+    duration REAL,
+    error TEXT,
+    output_hash TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_runs_alias_cmd_ts ON runs(alias, command, ts);
+CREATE INDEX IF NOT EXISTS idx_runs_cmd_ts ON runs(command, ts);
+CREATE INDEX IF NOT EXISTS idx_runs_ts ON runs(ts);
+CREATE INDEX IF NOT EXISTS idx_runs_output ON runs(output_hash);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+TS_FORMAT = "%Y-%m-%d %H:%M:%S"
+# 保留期按天计，过期清理每天最多做一次；体积超限则随时清理
+PRUNE_INTERVAL = timedelta(days=1)
+RELATIVE_RE = re.compile(r'^(\d+)([mhdw])$')
+
+def parse_since(value: str) -> str:
+    """把 7d / 12h / 30m / 2w 或 YYYY-MM-DD[ HH:MM:SS] 转成可比较的时间戳字符串"""
+    m = RELATIVE_RE.match(value.strip())
+    if m:
+        unit = {'m': 'minutes', 'h': 'hours', 'd': 'days', 'w': 'weeks'}[m.group(2)]
+        return (datetime.now() - timedelta(**{unit: int(m.group(1))})).strftime(TS_FORMAT)
+    for fmt in (TS_FORMAT, "%Y-%m-%d"):
+        try:
+            return datetime.strptime(value.strip(), fmt).strftime(TS_FORMAT)
+        except ValueError:
+            continue
+    raise ValueError(f"Invalid time: {value}")
+
+class AuditStore:
+    """
+    基于 SQLite 的审计库，替代无限追加的 audit_history.csv。
+
+    - runs 表按 alias/command/时间 建索引，按主机+命令查历史无需全表扫描
+    - 完整输出经 zlib 压缩后按内容哈希去重存放在 outputs 表
+    - 批量事务写入；超过保留天数或库体积上限时自动清理最旧记录
+      (上次清理时间记在 meta 表，未到清理周期且体积未超限时不扫库)
+    """
+    def __init__(self, path: str, max_age_days: int = 180, max_mb: int = 512, batch_size: int = 500):
+        self.path = path
+        self.max_age_days = max_age_days
+        self.max_bytes = max_mb * 1024 * 1024
+        self.batch_size = batch_size
+        self._pending_runs = []
+        self._pending_outputs = {}
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def add(self, r):
+        output_hash = None
+        if r.output:
+            data = r.output.encode('utf-8', errors='replace')
+            output_hash = hashlib.sha1(data).hexdigest()
+            if output_hash not in self._pending_outputs:
+                self._pending_outputs[output_hash] = (len(data), zlib.compress(data))
+        self._pending_runs.append((
+            r.start_time, r.alias, r.host, r.port, r.group, r.command,
+            r.status, r.duration, r.error, output_hash,
+        ))
+        if len(self._pending_runs) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self._pending_runs:
+            return
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO outputs(hash, size, body) VALUES (?, ?, ?)",
+                [(h, size, body) for h, (size, body) in self._pending_outputs.items()],
+            )
+            self.conn.executemany(
+                "INSERT INTO runs(ts, alias, host, port, grp, command, status, duration, error, output_hash) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                self._pending_runs,
+            )
+        self._pending_runs = []
+        self._pending_outputs = {}
+
+    def _used_bytes(self) -> int:
+        page_size = self.conn.execute("PRAGMA page_size").fetchone()[0]
+        pages = self.conn.execute("PRAGMA page_count").fetchone()[0]
+        free = self.conn.execute("PRAGMA freelist_count").fetchone()[0]
+        return (pages - free) * page_size
+
+    def _last_pruned(self) -> Optional[datetime]:
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'last_pruned'").fetchone()
+        return datetime.strptime(row[0], TS_FORMAT) if row else None
+
+    def prune_if_due(self) -> bool:
+        """距上次清理满一个周期或库体积超限时才清理，返回是否执行了清理"""
+        last = self._last_pruned()
+        if last is not None and datetime.now() - last < PRUNE_INTERVAL and self._used_bytes() <= self.max_bytes:
+            return False
+        self.prune()
+        return True
+
+    def prune(self):
+        """按保留天数和体积上限清理最旧记录，并删除不再被引用的输出"""
+        cutoff = (datetime.now() - timedelta(days=self.max_age_days)).strftime(TS_FORMAT)
+        with self.conn:
+            self.conn.execute("DELETE FROM runs WHERE ts < ?", (cutoff,))
+            self._drop_orphan_outputs()
+        while self._used_bytes() > self.max_bytes:
+            total = self.conn.execute("SELECT COUNT(*) FROM runs").fetchone()[0]
+            if total == 0:
+                break
+            with self.conn:
+                # 每次淘汰最旧的 5%，避免一条条删
+                self.conn.execute(
+                    "DELETE FROM runs WHERE id IN (SELECT id FROM runs ORDER BY ts LIMIT ?)",
+                    (max(1, total // 20),),
+                )
+                self._drop_orphan_outputs()
+        with self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO meta(key, value) VALUES ('last_pruned', ?)",
+                              (datetime.now().strftime(TS_FORMAT),))
+
+    def _drop_orphan_outputs(self):
+        self.conn.execute(
+            "DELETE FROM outputs WHERE NOT EXISTS (SELECT 1 FROM runs WHERE runs.output_hash = outputs.hash)"
+        )
+
+    def query(self, alias: Optional[str] = None, command: Optional[str] = None,
+              since: Optional[str] = None, until: Optional[str] = None,
+              status: Optional[str] = None, limit: int = 50) -> List[dict]:
+        """按条件查询历史，最新的在前；alias/command 含 * 时按通配符匹配"""
+        clauses, params = [], []
+        for column, value in (('alias', alias), ('command', command)):
+            if value:
+                clauses.append(f"runs.{column} GLOB ?" if '*' in value else f"runs.{column} = ?")
+                params.append(value)
+        if since:
+            clauses.append("runs.ts >= ?")
+            params.append(since)
+        if until:
+            clauses.append("runs.ts <= ?")
+            params.append(until)
+        if status:
+            clauses.append("runs.status = ?")
+            params.append(status)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        sql = (
+            "SELECT runs.ts, runs.alias, runs.host, runs.port, runs.grp, runs.command, runs.status, "
+            "runs.duration, runs.error, outputs.body FROM runs "
+            f"LEFT JOIN outputs ON outputs.hash = runs.output_hash {where} "
+            "ORDER BY runs.ts DESC, runs.id DESC LIMIT ?"
+        )
+        rows = []
+        for ts, a, host, port, grp, cmd, st, duration, error, body in self.conn.execute(sql, params + [limit]):
+            rows.append({
+                'timestamp': ts, 'alias': a, 'host': host, 'port': port, 'group': grp,
+                'command': cmd, 'status': st, 'duration': duration, 'error': error,
+                'output': zlib.decompress(body).decode('utf-8', errors='replace') if body else "",
+            })
+        return rows
+
+    def close(self):
+        self.flush()
+        self.conn.close()
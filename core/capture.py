@@ -0,0 +1,141 @@
+import mmap
+import os
+import re
+import shutil
+import tempfile
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Iterator, Optional
+
+# 大输出捕获：输出边读边写入落盘文件 (spool)，内存里只保留首尾各一小段，
+# 分组/比对再从落盘文件按块流式读取，整批执行的内存占用与输出大小无关
+DEFAULT_HEAD_BYTES = 4096
+DEFAULT_TAIL_BYTES = 4096
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+SPOOL_CHUNK = 1024 * 1024
+SPOOL_KEEP_DAYS = 3
+
+@dataclass
+class CapturedOutput:
+    text: str                # 完整输出 (不超过首尾缓冲时) 或 "首部 + 省略提示 + 尾部" 的预览
+    size: int                # 远端输出的总字节数 (去掉首尾空白后)
+    spool: Optional[str]     # 完整输出的落盘文件；输出已完整保存在 text 中时为 None
+    capped: bool = False     # 超出每主机上限，落盘文件只保存了前 max_bytes 字节
+
+@dataclass
+class CaptureConfig:
+    spool_dir: str
+    head_bytes: int = DEFAULT_HEAD_BYTES
+    tail_bytes: int = DEFAULT_TAIL_BYTES
+    max_bytes: Optional[int] = DEFAULT_MAX_BYTES  # 每台主机每条命令最多落盘的字节数，None 不限
+
+    def open(self, host_cfg, index: int) -> 'OutputSpool':
+        return OutputSpool(self, f"{_safe_name(host_cfg.alias)}.{index}.")
+
+def _safe_name(name: str) -> str:
+    return re.sub(r'[^\w.-]', '_', name or 'host')
+
+def prepare_spool_dir(root: str, keep_days: float = SPOOL_KEEP_DAYS) -> str:
+    """在 root 下新建本批次的落盘目录，顺手清理 keep_days 天前的旧批次"""
+    os.makedirs(root, exist_ok=True)
+    deadline = time.time() - keep_days * 86400
+    for name in os.listdir(root):
+        path = os.path.join(root, name)
+        if os.path.isdir(path) and os.path.getmtime(path) < deadline:
+            shutil.rmtree(path, ignore_errors=True)
+    return tempfile.mkdtemp(prefix=datetime.now().strftime("%Y%m%d-%H%M%S-"), dir=root)
+
+class OutputSpool:
+    """
+    单条命令输出的流式写入端。
+
+    - 与 str.strip() 等价地去掉首尾空白 (尾部空白暂存，后面再有内容才写出)
+    - 输出不超过 head_bytes + tail_bytes 时只在内存中，不创建文件
+    - 超过后写入落盘文件，内存中只保留首部与滚动更新的尾部
+    - 落盘超过 max_bytes 后不再写文件，但继续计数并更新尾部
+    """
+    def __init__(self, config: CaptureConfig, prefix: str):
+        self.config = config
+        self.prefix = prefix
+        self.size = 0
+        self.path = None
+        self._file = None
+        self._buffer = bytearray()  # 落盘前的全部内容；落盘后只保留首部
+        self._tail = bytearray()
+        self._written = 0
+        self._started = False
+        self._ws = ""
+
+    def write(self, text: str):
+        if not self._started:
+            text = text.lstrip()
+            if not text:
+                return
+            self._started = True
+        body = text.rstrip()
+        if not body:
+            self._ws += text
+            if len(self._ws) > SPOOL_CHUNK:
+                self._emit(self._ws)
+                self._ws = ""
+            return
+        self._emit(self._ws + body)
+        self._ws = text[len(body):]
+
+    def _emit(self, text: str):
+        data = text.encode('utf-8', errors='replace')
+        self.size += len(data)
+        cfg = self.config
+        self._tail += data
+        if len(self._tail) > cfg.tail_bytes:
+            del self._tail[:len(self._tail) - cfg.tail_bytes]
+        if self._file is None:
+            self._buffer += data
+            if len(self._buffer) <= cfg.head_bytes + cfg.tail_bytes:
+                return
+            fd, self.path = tempfile.mkstemp(prefix=self.prefix, suffix='.out', dir=cfg.spool_dir)
+            self._file = os.fdopen(fd, 'wb')
+            data = bytes(self._buffer)
+            del self._buffer[cfg.head_bytes:]
+        if cfg.max_bytes is not None:
+            data = data[:max(0, cfg.max_bytes - self._written)]
+        if data:
+            self._file.write(data)
+            self._written += len(data)
+
+    def close(self) -> CapturedOutput:
+        if self._file is None:
+            return CapturedOutput(text=self._buffer.decode('utf-8', errors='replace'), size=self.size, spool=None)
+        self._file.close()
+        cfg = self.config
+        omitted = self.size - len(self._buffer) - len(self._tail)
+        # 首尾截断处可能切在多字节字符中间，解码时丢弃残缺字符
+        text = (f"{self._buffer.decode('utf-8', errors='ignore')}\n"
+                f"...... [省略 {omitted} 字节，完整输出见 {self.path}] ......\n"
+                f"{self._tail.decode('utf-8', errors='ignore')}")
+        capped = cfg.max_bytes is not None and self.size > cfg.max_bytes
+        return CapturedOutput(text=text, size=self.size, spool=self.path, capped=capped)
+
+    def discard(self):
+        """执行失败时丢弃已写入的内容"""
+        if self._file is not None:
+            self._file.close()
+            os.remove(self.path)
+            self._file = None
+
+def iter_spool_chunks(path: str, chunk_size: int = SPOOL_CHUNK) -> Iterator[str]:
+    """以内存映射按块读取落盘输出，每块结束在换行处，逐行生效的归一化可以逐块应用"""
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            start, end = 0, len(mm)
+            while start < end:
+                stop = min(start + chunk_size, end)
+                if stop < end:
+                    nl = mm.rfind(b'\n', start, stop)
+                    if nl >= start:
+                        stop = nl + 1
+                yield mm[start:stop].decode('utf-8', errors='replace')
+                start = stop
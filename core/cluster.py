@@ -0,0 +1,156 @@
+import math
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional
+
+from core.compare import OutputGroup
+
+# 近似聚类：上千台主机执行包列表、配置导出这类命令时，几乎每台的输出都略有不同，
+# 精确分组会得到上千个单主机分组。这里把每种输出切成 shingle (行)，用 MinHash 估计两两的 Jaccard 相似度，
+# 再用 LSH 分桶只比较可能相似的输出，整批耗时与输出总行数近似线性。
+DEFAULT_SIMILARITY = 0.7
+NUM_BINS = 128            # MinHash 签名长度 (单次哈希分桶，每个 shingle 只算一次哈希)
+BANDS = 16                # LSH 分段数，每段 NUM_BINS // BANDS 行；命中阈值约为 (1/16)^(1/8) ≈ 0.71
+LARGE_CLUSTER = 0.05      # 主机数达到本批 5% (且至少 2 台) 的簇算作"大簇"
+OUTLIER_SIMILARITY = 0.5  # 与所有大簇的相似度都低于它的小簇标记为离群
+SHORT_OUTPUT_LINES = 8    # 行数少于它的输出再加入词级 3-gram，否则单行输出只有"相同/完全不同"两种结果
+
+_MASK64 = (1 << 64) - 1
+_VALUE_SPAN = 1 << 64     # 空桶借用右侧非空桶的值时按距离加上的偏移，保证借来的值不与原值冲突
+
+@dataclass
+class Cluster:
+    groups: List[OutputGroup]         # 簇内的精确分组，按主机数从多到少 (同样多时越接近簇的共识越靠前)
+    size: int                         # 簇内主机数
+    signature: Optional[List[int]]    # 代表输出的签名；空输出为 None
+    large: bool = False
+    outlier: bool = False
+    nearest: Optional[int] = None     # 最相似的大簇在结果列表中的下标
+    similarity: float = 0.0           # 与 nearest 的估计相似度
+
+    @property
+    def representative(self) -> OutputGroup:
+        """主机数最多、且最接近簇内共识的那种输出作为代表"""
+        return self.groups[0]
+
+    @property
+    def aliases(self) -> List[str]:
+        return [a for g in self.groups for a in g.aliases]
+
+def _hash64(text: str) -> int:
+    # 内置的字符串哈希 (SipHash) 每个进程随机加盐，但进程内稳定，签名只在本批内相互比较，足够用且比 hashlib 快得多
+    return hash(text) & _MASK64
+
+def shingles(lines: Iterable[str]) -> set:
+    """每个归一化后的行是一个 shingle；短输出再按词切 3-gram"""
+    out, short = set(), []
+    for line in lines:
+        out.add(_hash64(line))
+        if len(short) < SHORT_OUTPUT_LINES:
+            short.append(line)
+    if len(out) < SHORT_OUTPUT_LINES:
+        words = " ".join(short).split()
+        for i in range(max(0, len(words) - 2)):
+            out.add(_hash64(" ".join(words[i:i + 3])) ^ 1)
+    return out
+
+def signature(shingle_hashes: Iterable[int], num_bins: int = NUM_BINS) -> Optional[List[int]]:
+    """
+    单次哈希 MinHash：按哈希低位分桶，每桶取高位最小值；
+    空桶沿环向右借用最近的非空桶 (旋转致密化)，签名各位仍可按位比较
+    """
+    empty = _VALUE_SPAN
+    sig = [empty] * num_bins
+    for h in shingle_hashes:
+        b, v = h % num_bins, h // num_bins
+        if v < sig[b]:
+            sig[b] = v
+    filled = [i for i, v in enumerate(sig) if v != empty]
+    if not filled:
+        return None
+    if len(filled) < num_bins:
+        dense = list(sig)
+        for i in range(num_bins):
+            if sig[i] == empty:
+                step = 1
+                while sig[(i + step) % num_bins] == empty:
+                    step += 1
+                dense[i] = sig[(i + step) % num_bins] + step * _VALUE_SPAN
+        sig = dense
+    return sig
+
+def similarity(a: Optional[List[int]], b: Optional[List[int]]) -> float:
+    """签名相同位的比例，即 Jaccard 相似度的估计"""
+    if a is None or b is None:
+        return 1.0 if a is b else 0.0
+    return sum(x == y for x, y in zip(a, b)) / len(a)
+
+def _find(parent: List[int], i: int) -> int:
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
+
+def cluster_groups(groups: List[OutputGroup], threshold: float = DEFAULT_SIMILARITY,
+                   bands: int = BANDS, num_bins: int = NUM_BINS) -> List[Cluster]:
+    """
+    把精确分组 (OutputGrouper.entries()) 按相似度聚成簇，返回按主机数从多到少排列的簇；失败的分组不参与。
+    落盘的大输出经 OutputGroup.iter_lines 流式读取，不会整体进入内存。
+    """
+    ok = sorted((g for g in groups if not g.failed), key=lambda g: len(g.aliases), reverse=True)
+    sigs = [signature(shingles(g.iter_lines()), num_bins) for g in ok]
+
+    # LSH：签名切成 bands 段，任一段完全相同的输出落进同一个桶；
+    # 桶内只与桶里的第一个成员核对估计相似度，避免大桶内两两比较
+    parent = list(range(len(ok)))
+    rows = num_bins // bands
+    for band in range(bands):
+        buckets: Dict[tuple, int] = {}
+        for i, sig in enumerate(sigs):
+            key = tuple(sig[band * rows:(band + 1) * rows]) if sig is not None else None
+            first = buckets.setdefault(key, i)
+            if first != i and similarity(sigs[first], sig) >= threshold:
+                a, b = _find(parent, first), _find(parent, i)
+                if a != b:
+                    parent[max(a, b)] = min(a, b)
+
+    members: Dict[int, List[int]] = {}
+    for i in range(len(ok)):
+        members.setdefault(_find(parent, i), []).append(i)
+    clusters = []
+    for idx in members.values():
+        idx = _by_consensus(idx, ok, sigs)
+        clusters.append(Cluster(groups=[ok[i] for i in idx], size=sum(len(ok[i].aliases) for i in idx),
+                                signature=sigs[idx[0]]))
+    clusters.sort(key=lambda c: c.size, reverse=True)
+    _flag_outliers(clusters)
+    return clusters
+
+def _by_consensus(idx: List[int], groups: List[OutputGroup], sigs: List[Optional[List[int]]]) -> List[int]:
+    """
+    簇内按主机数排序；主机数相同 (如每台输出都不同) 时按与共识签名 (每位取按主机数加权的众数) 的一致程度排序，
+    代表输出就不是随手取的某一台，与离群簇比较时差异里尽量少混进代表自身的零星改动
+    """
+    if len(idx) == 1 or any(sigs[i] is None for i in idx):
+        return idx
+    consensus = []
+    for pos in range(len(sigs[idx[0]])):
+        votes = Counter()
+        for i in idx:
+            votes[sigs[i][pos]] += len(groups[i].aliases)
+        consensus.append(votes.most_common(1)[0][0])
+    return sorted(idx, key=lambda i: (len(groups[i].aliases), similarity(sigs[i], consensus)), reverse=True)
+
+def _flag_outliers(clusters: List[Cluster]):
+    """小簇与每个大簇的代表输出比较，记下最相似的大簇；都不够相似的标记为离群"""
+    total = sum(c.size for c in clusters)
+    min_large = max(2, math.ceil(total * LARGE_CLUSTER))
+    large = [i for i, c in enumerate(clusters) if c.size >= min_large]
+    for i in large:
+        clusters[i].large = True
+    for c in clusters:
+        if c.large or not large:
+            continue
+        scores = [(similarity(c.signature, clusters[j].signature), j) for j in large]
+        c.similarity, c.nearest = max(scores)
+        c.outlier = c.similarity < OUTLIER_SIMILARITY
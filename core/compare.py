@@ -0,0 +1,203 @@
+import difflib
+import hashlib
+import re
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+# 归一化器: (文本, ExecutionResult) -> 文本。按名称注册，命令行通过 --normalize 组合使用
+NORMALIZERS: Dict[str, Callable] = {}
+
+# 默认只抹掉主机自身的别名/IP 并压缩空白：时间戳、PID 可能正是要找的差异 (时钟漂移、配置里的时间值)，须显式开启
+DEFAULT_NORMALIZERS = ['alias', 'whitespace']
+
+def register_normalizer(name: str, reorders: bool = False):
+    """
+    reorders=True 表示该归一化器只调整行序 (如 sort)。其余归一化器须逐行生效，
+    落盘的大输出才能分块归一化；分组键对 reorders 的归一化按行的多重集合计算
+    """
+    def decorator(fn):
+        fn.reorders = reorders
+        NORMALIZERS[name] = fn
+        return fn
+    return decorator
+
+TIMESTAMP_RES = [
+    re.compile(r'\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}(:\d{2}(\.\d+)?)?([+-]\d{2}:?\d{2}|Z)?'),
+    re.compile(r'\b(Mon|Tue|Wed|Thu|Fri|Sat|Sun)?\s*(Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)\s+\d{1,2}\b'),
+    re.compile(r'\b\d{1,2}:\d{2}(:\d{2})?\b'),
+]
+IPV4_RE = re.compile(r'\b(?:\d{1,3}\.){3}\d{1,3}\b')
+IPV6_RE = re.compile(r'\b(?:[0-9a-fA-F]{1,4}:){2,7}[0-9a-fA-F]{1,4}\b')
+PID_RES = [
+    re.compile(r'(?i)\bpid[\s=:]*\d+'),
+    re.compile(r'(?<=\w)\[\d+\]'),  # syslog 风格: sshd[1234]
+]
+
+def token_re(token: str) -> re.Pattern:
+    """
+    只匹配完整的 token：前后不能紧挨字母数字、_ 或 -，也不能是点号分隔的更长名字/地址的一部分。
+    10.0.0.1 不会命中 10.0.0.10，web1 不会命中 web10，句末的 "host." 仍会命中
+    """
+    return re.compile(r'(?<![\w-])(?<!\w\.)' + re.escape(token) + r'(?![\w-])(?!\.\w)')
+
+@register_normalizer('alias')
+def mask_alias(text, r):
+    """抹掉主机自身的别名/IP，避免输出里带主机名导致每台一组"""
+    for token in sorted({r.alias, r.host}, key=len, reverse=True):
+        if token:
+            text = token_re(token).sub('<HOST>', text)
+    return text
+
+@register_normalizer('timestamp')
+def mask_timestamp(text, r):
+    for pattern in TIMESTAMP_RES:
+        text = pattern.sub('<TIME>', text)
+    return text
+
+@register_normalizer('ip')
+def mask_ip(text, r):
+    return IPV6_RE.sub('<IP>', IPV4_RE.sub('<IP>', text))
+
+@register_normalizer('pid')
+def mask_pid(text, r):
+    for pattern in PID_RES:
+        text = pattern.sub('<PID>', text)
+    return text
+
+@register_normalizer('sort', reorders=True)
+def sort_lines(text, r):
+    return "\n".join(sorted(text.splitlines()))
+
+@register_normalizer('whitespace')
+def collapse_whitespace(text, r):
+    return "\n".join(" ".join(line.split()) for line in text.splitlines() if line.strip())
+
+def mask_pattern_normalizer(pattern: str) -> Callable:
+    """把用户给出的正则 (如现场主机名 ZS_S6_SITE_\\d+) 做成一个归一化器"""
+    regex = re.compile(pattern)
+    return lambda text, r: regex.sub('<MASK>', text)
+
+def resolve_normalizers(names: List[str], masks: Optional[List[str]] = None) -> List[Callable]:
+    unknown = [n for n in names if n not in NORMALIZERS]
+    if unknown:
+        raise ValueError(f"Unknown normalizer: {', '.join(unknown)}")
+    fns = [mask_pattern_normalizer(p) for p in (masks or [])]
+    return fns + [NORMALIZERS[n] for n in names]
+
+def normalize(text: str, r, normalizers: List[Callable]) -> str:
+    for fn in normalizers:
+        text = fn(text, r)
+    return text
+
+def reorders(normalizers: List[Callable]) -> bool:
+    return any(getattr(fn, 'reorders', False) for fn in normalizers)
+
+def iter_normalized_lines(chunks: Iterable[str], r, normalizers: List[Callable]) -> Iterator[str]:
+    """逐块归一化 (块须在换行处切开) 并逐行产出；调整行序的归一化器跳过，由 lines_key 处理"""
+    line_fns = [fn for fn in normalizers if not getattr(fn, 'reorders', False)]
+    for chunk in chunks:
+        yield from normalize(chunk, r, line_fns).splitlines()
+
+def lines_key(lines: Iterable[str], unordered: bool = False) -> str:
+    """
+    逐行流式计算分组键，内存中的输出与落盘的输出用同一种算法，同样内容得到同样的键。
+    unordered 时按行哈希排序后再汇总，只需每行 20 字节
+    """
+    h = hashlib.sha1()
+    if unordered:
+        for digest in sorted(hashlib.sha1(line.encode('utf-8', errors='replace')).digest() for line in lines):
+            h.update(digest)
+    else:
+        for line in lines:
+            h.update(line.encode('utf-8', errors='replace'))
+            h.update(b'\n')
+    return h.hexdigest()
+
+@dataclass
+class OutputGroup:
+    key: str                  # 归一化后输出的哈希
+    sample: str               # 第一个到达的原始输出 (落盘输出为首尾预览)，用于展示
+    normalized: str           # 归一化后的输出，用于比对；落盘输出为空，改用 lines
+    failed: bool = False
+    aliases: List[str] = field(default_factory=list)
+    lines: Optional[Callable[[], Iterator[str]]] = None  # 落盘输出：每次调用从文件重新产出归一化后的行
+
+    def iter_lines(self) -> Iterator[str]:
+        return self.lines() if self.lines is not None else iter(self.normalized.splitlines())
+
+def output_key(normalized: str) -> str:
+    return hashlib.sha1(normalized.encode('utf-8', errors='replace')).hexdigest()
+
+def majority_group(groups: List[OutputGroup]) -> Optional[OutputGroup]:
+    """主机数最多的成功分组作为基准"""
+    ok = [g for g in groups if not g.failed]
+    return max(ok, key=lambda g: len(g.aliases)) if ok else None
+
+def diff_against_majority(groups: List[OutputGroup], context: int = 0, max_lines: int = 20) -> Dict[str, List[str]]:
+    """
+    对每个少数派分组生成相对基准分组的精简行级差异，返回 {分组 key: 差异行}。
+    差异行以 '-' (基准有而本组没有) / '+' (本组多出) 开头。
+    """
+    baseline = majority_group(groups)
+    if baseline is None:
+        return {}
+    return diff_against(baseline, groups, context, max_lines)
+
+def diff_against(baseline: OutputGroup, groups: List[OutputGroup], context: int = 0,
+                 max_lines: int = 20) -> Dict[str, List[str]]:
+    """同 diff_against_majority，但由调用方指定基准分组"""
+    if baseline.lines is not None or any(g.lines is not None for g in groups):
+        return _diff_streamed(baseline, groups, max_lines)
+    base_lines = baseline.normalized.splitlines()
+    diffs = {}
+    for g in groups:
+        if g is baseline or g.failed:
+            continue
+        lines = []
+        for line in difflib.unified_diff(base_lines, g.normalized.splitlines(), n=context, lineterm=''):
+            if line.startswith(('---', '+++', '@@')):
+                continue
+            lines.append(line)
+        if len(lines) > max_lines:
+            lines = lines[:max_lines] + [f"... (另有 {len(lines) - max_lines} 行差异)"]
+        diffs[g.key] = lines
+    return diffs
+
+def _line_digests(g: OutputGroup) -> List[bytes]:
+    return [hashlib.blake2b(line.encode('utf-8', errors='replace'), digest_size=8).digest() for line in g.iter_lines()]
+
+def _pick_lines(g: OutputGroup, wanted: set) -> Dict[int, str]:
+    return {i: line for i, line in enumerate(g.iter_lines()) if i in wanted}
+
+def _diff_streamed(baseline: OutputGroup, groups: List[OutputGroup], max_lines: int) -> Dict[str, List[str]]:
+    """
+    有落盘输出时的差异：先对每行的 8 字节摘要做序列比对，只把要展示的前 max_lines 行从文件里取回，
+    内存占用与行数成正比而与输出大小无关。不带上下文行
+    """
+    base = _line_digests(baseline)
+    diffs = {}
+    for g in groups:
+        if g is baseline or g.failed:
+            continue
+        own = _line_digests(g)
+        # 大输出通常只有零星几行不同，先剥掉相同的首尾再做序列比对
+        lo, hi = 0, 0
+        while lo < min(len(base), len(own)) and base[lo] == own[lo]:
+            lo += 1
+        while hi < min(len(base), len(own)) - lo and base[-1 - hi] == own[-1 - hi]:
+            hi += 1
+        ops = []  # [(符号, 是否基准侧, 行号)]
+        matcher = difflib.SequenceMatcher(None, base[lo:len(base) - hi], own[lo:len(own) - hi])
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+            if tag in ('replace', 'delete'):
+                ops.extend(('-', True, lo + i) for i in range(i1, i2))
+            if tag in ('replace', 'insert'):
+                ops.extend(('+', False, lo + j) for j in range(j1, j2))
+        shown = ops[:max_lines]
+        base_text = _pick_lines(baseline, {i for _, is_base, i in shown if is_base})
+        own_text = _pick_lines(g, {i for _, is_base, i in shown if not is_base})
+        lines = [sign + (base_text if is_base else own_text)[i] for sign, is_base, i in shown]
+        if len(ops) > max_lines:
+            lines.append(f"... (另有 {len(ops) - max_lines} 行差异)")
+        diffs[g.key] = lines
+    return diffs
@@ -0,0 +1,275 @@
+import json
+import os
+import signal
+import socket
+import threading
+import time
+from dataclasses import asdict
+from typing import Callable, Dict, Iterator, List, Optional
+
+# 常驻进程：保持编译好的主机清单与已登录的会话，exec/health 通过本地 Unix socket 把批次交给它执行，
+# 结果按完成顺序流式返回。连续调用的脚本只需付远端命令本身的时间，不再重复导入 Netmiko 和登录。
+#
+# 协议：每条消息一行 JSON。
+#   请求  {"op": "batch", "aliases": [...], "commands": [...], "options": {...}}
+#         {"op": "ping"} / {"op": "stop"}
+#   响应  batch: 每台主机一条 {"type": "result", "results": [...]}，最后 {"type": "done"} 或 {"type": "error"}
+#         ping:  {"type": "pong", ...状态}    stop: {"type": "bye"}
+CONNECT_TIMEOUT = 0.5
+
+def socket_supported() -> bool:
+    """Windows 的部分 Python 构建没有 AF_UNIX，此时 exec/health 始终在本进程执行"""
+    return hasattr(socket, 'AF_UNIX')
+
+def _send(sock, msg: dict):
+    sock.sendall(json.dumps(msg, ensure_ascii=False).encode('utf-8') + b'\n')
+
+def _connect(socket_path: str, timeout: Optional[float] = CONNECT_TIMEOUT):
+    """连接常驻进程；socket 文件不存在或进程已退出 (残留文件) 时返回 None"""
+    if not socket_supported() or not os.path.exists(socket_path):
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        sock.connect(socket_path)
+    except OSError:
+        sock.close()
+        return None
+    return sock
+
+def request(socket_path: str, msg: dict, timeout: float = 5.0) -> Optional[dict]:
+    """一问一答的控制请求 (ping/stop)；常驻进程不在时返回 None"""
+    sock = _connect(socket_path, timeout)
+    if sock is None:
+        return None
+    with sock, sock.makefile('rb') as reader:
+        _send(sock, msg)
+        line = reader.readline()
+    return json.loads(line) if line else None
+
+class DaemonServer:
+    """
+    常驻进程的服务端。
+
+    - 清单只在 hosts.yaml 变化 (mtime/大小) 时重新加载，否则一直复用编译结果
+    - 执行引擎按 (engine, workers, procs) 常驻，会话池跨请求复用；每批按请求重建连接调度与预检选项
+    - 批次串行执行，避免两个脚本同时操作同一台主机的同一个会话
+    - 客户端中途断开 (如 Ctrl+C) 时停止该批次，尚未开始的主机不再执行
+    """
+    def __init__(self, socket_path: str, inventory_path: str, cache_path: Optional[str],
+                 executor_factory: Callable):
+        self.socket_path = socket_path
+        self.inventory_path = inventory_path
+        self.cache_path = cache_path
+        self.executor_factory = executor_factory  # (engine, workers, procs) -> 执行引擎
+        self.executors: Dict[tuple, object] = {}
+        self.started = time.time()
+        self.batches = 0
+        self._mgr = None
+        self._mgr_stamp = None
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._listener = None
+
+    def _inventory(self):
+        from core.inventory import InventoryManager
+        st = os.stat(self.inventory_path)
+        stamp = (st.st_mtime_ns, st.st_size)
+        if self._mgr is None or stamp != self._mgr_stamp:
+            self._mgr = InventoryManager(self.inventory_path, self.cache_path)
+            self._mgr_stamp = stamp
+        return self._mgr
+
+    def _executor(self, options: dict, mgr):
+        from core.capture import CaptureConfig
+        from core.executor import ConnectionScheduler
+        from core.retry import RetryPolicy
+        key = (options.get('engine', 'thread'), options.get('workers', 40), options.get('procs', 1))
+        executor = self.executors.get(key)
+        if executor is None:
+            executor = self.executors[key] = self.executor_factory(*key)
+        capture = options.get('capture')
+        executor.capture = CaptureConfig(**capture) if capture else None
+        executor.retry = RetryPolicy(attempts=options['retries']) if options.get('retries') else None
+        executor.hedge = options.get('hedge', False)
+        executor.deadline = options.get('deadline')
+        if executor.preflight is not None:
+            executor.preflight.recheck = options.get('recheck', False)
+        if hasattr(executor, 'scheduler'):
+            executor.scheduler = ConnectionScheduler(
+                group_limits=mgr.group_limits,
+                per_ip_limit=options.get('per_ip'),
+                connect_rate=options.get('connect_rate'),
+                profiles=getattr(executor, 'profiles', None),
+            )
+        else:
+            # 多进程分片引擎：限额随每批下发给各分片
+            executor.group_limits = mgr.group_limits
+            executor.per_ip = options.get('per_ip')
+            executor.connect_rate = options.get('connect_rate')
+        return executor
+
+    def status(self) -> dict:
+        return {
+            'type': 'pong',
+            'pid': os.getpid(),
+            'uptime': round(time.time() - self.started, 1),
+            'batches': self.batches,
+            'engines': [f"{e}/{w}/{p}" for e, w, p in self.executors],
+        }
+
+    def _run_batch(self, conn, req: dict):
+        from core.executor import ExecutionResult
+        commands = req['commands']
+        with self._lock:
+            mgr = self._inventory()
+            executor = self._executor(req.get('options') or {}, mgr)
+            hosts, unknown = [], []
+            for alias in req['aliases']:
+                idx = mgr.by_alias.get(alias)
+                (unknown if idx is None else hosts).append(alias if idx is None else mgr.hosts[idx])
+            for alias in unknown:
+                results = [ExecutionResult(host='', port=0, group='', alias=alias, command=cmd, status='FAILED',
+                                           output='', error='Unknown host in daemon inventory',
+                                           start_time=time.strftime("%Y-%m-%d %H:%M:%S"), duration=0.0)
+                           for cmd in commands]
+                _send(conn, {'type': 'result', 'results': [asdict(r) for r in results]})
+            self.batches += 1
+            stream = executor.iter_batch_multi(hosts, commands)
+            try:
+                for host_results in stream:
+                    _send(conn, {'type': 'result', 'results': [asdict(r) for r in host_results]})
+            finally:
+                stream.close()
+        _send(conn, {'type': 'done'})
+
+    def _handle(self, conn):
+        with conn, conn.makefile('rb') as reader:
+            try:
+                line = reader.readline()
+                if not line:
+                    return
+                req = json.loads(line)
+                op = req.get('op')
+                if op == 'ping':
+                    _send(conn, self.status())
+                elif op == 'stop':
+                    _send(conn, {'type': 'bye'})
+                    self.stop()
+                elif op == 'batch':
+                    self._run_batch(conn, req)
+                else:
+                    _send(conn, {'type': 'error', 'message': f"unknown op: {op}"})
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # 客户端已断开，批次在上面的 finally 中停止
+            except Exception as e:
+                try:
+                    _send(conn, {'type': 'error', 'message': f"{type(e).__name__}: {e}"})
+                except OSError:
+                    pass
+
+    def stop(self):
+        self._stopping.set()
+        if self._listener is not None:
+            # 关闭监听 socket 让 accept 返回
+            try:
+                self._listener.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            self._listener.close()
+
+    def serve_forever(self):
+        if _connect(self.socket_path) is not None:
+            raise RuntimeError(f"常驻进程已在运行: {self.socket_path}")
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)  # 上次异常退出残留的 socket 文件
+        os.makedirs(os.path.dirname(os.path.abspath(self.socket_path)), exist_ok=True)
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        old_umask = os.umask(0o177)  # 会话带着登录凭据，只允许本用户连接
+        try:
+            listener.bind(self.socket_path)
+        finally:
+            os.umask(old_umask)
+        listener.listen(16)
+        self._listener = listener
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGTERM, lambda *_: self.stop())
+        try:
+            while not self._stopping.is_set():
+                try:
+                    conn, _ = listener.accept()
+                except OSError:
+                    break
+                threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+        finally:
+            self.stop()
+            with self._lock:
+                for executor in self.executors.values():
+                    executor.close()
+                self.executors.clear()
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+
+class DaemonExecutor:
+    """
+    常驻进程的客户端，对外接口与 RemoteExecutor 一致：主机按别名发给常驻进程，结果逐台读回。
+    用 DaemonExecutor.find() 探测，常驻进程不在时返回 None，调用方退回本进程执行。
+    """
+    def __init__(self, socket_path: str, options: Optional[dict] = None):
+        self.socket_path = socket_path
+        self.options = options or {}
+
+    @classmethod
+    def find(cls, socket_path: str, options: Optional[dict] = None) -> Optional['DaemonExecutor']:
+        sock = _connect(socket_path)
+        if sock is None:
+            return None
+        sock.close()
+        return cls(socket_path, options)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        pass  # 会话归常驻进程所有，客户端无需清理
+
+    def iter_batch_multi(self, hosts, commands: List[str]) -> Iterator[List]:
+        from core.executor import ExecutionResult
+        sock = _connect(self.socket_path, timeout=None)
+        if sock is None:
+            raise ConnectionError(f"常驻进程已退出: {self.socket_path}")
+        with sock, sock.makefile('rb') as reader:
+            _send(sock, {'op': 'batch', 'aliases': [h.alias for h in hosts],
+                         'commands': list(commands), 'options': self.options})
+            for line in reader:
+                msg = json.loads(line)
+                if msg['type'] == 'result':
+                    yield [ExecutionResult(**r) for r in msg['results']]
+                elif msg['type'] == 'done':
+                    return
+                else:
+                    raise RuntimeError(f"常驻进程执行失败: {msg.get('message')}")
+        raise ConnectionError("常驻进程中途断开")
+
+    def iter_batch(self, hosts, command: str) -> Iterator:
+        for host_results in self.iter_batch_multi(hosts, [command]):
+            yield host_results[0]
+
+    def run_batch(self, hosts, command: str, progress_callback=None) -> List:
+        results = []
+        for res in self.iter_batch(hosts, command):
+            results.append(res)
+            if progress_callback:
+                progress_callback(res)
+        return results
+
+    def run_batch_multi(self, hosts, commands: List[str], progress_callback=None) -> Dict[str, List]:
+        results = {}
+        for host_results in self.iter_batch_multi(hosts, commands):
+            results[host_results[0].alias] = host_results
+            if progress_callback:
+                progress_callback(host_results)
+        return results
@@ -0,0 +1,96 @@
+import re
+from dataclasses import dataclass, field, replace
+from typing import Dict, List, Optional, Set, Tuple
+
+from core.executor import ExecutionResult
+
+# 摘要优先比对：整网比对配置文件、rpm -qa 这类输出时，绝大多数主机的输出完全相同，全量取回后又被归类丢弃。
+# 先让每台主机在远端计算输出的 md5 与字节数、只回传这两项；按摘要分组后，每组只从一台主机取回完整输出，
+# 摘要解析不出来的主机 (远端没有 md5sum 等) 也取回完整输出，照常参与归类
+DIGEST_RE = re.compile(r'^([0-9a-f]{32})\s+-?\s*$', re.MULTILINE)
+BYTES_RE = re.compile(r'^bytes\s+(\d+)\s*$', re.MULTILINE)
+
+def digest_command(cmd: str) -> str:
+    """
+    把 cmd 包装成只回传摘要的命令：输出 (含 stderr) 经 tee 同时交给 md5sum 与 wc -c，两者的结果写到终端 (fd 3)，
+    输出本身不经过网络。只用到 POSIX sh 与 busybox 也有的命令
+    """
+    cmd = cmd.strip().rstrip(';')
+    return (f"{{ {{ {{ {cmd} ; }} 2>&1 | tee /dev/fd/4 | wc -c | sed 's/^ */bytes /' >&3; }} 4>&1 "
+            f"| md5sum >&3; }} 3>&1")
+
+def parse_digest(output: str) -> Optional[Tuple[str, int]]:
+    """(md5, 字节数)；回显里缺任何一项都返回 None"""
+    digest, size = DIGEST_RE.search(output), BYTES_RE.search(output)
+    if digest is None or size is None:
+        return None
+    return digest.group(1), int(size.group(1))
+
+def digest_preview(output: str) -> str:
+    """结果表中摘要结果的预览"""
+    parsed = parse_digest(output)
+    if parsed is None:
+        return output[:50]
+    digest, size = parsed
+    return f"md5 {digest[:12]} · {size / 1024:.1f} KB"
+
+@dataclass
+class DigestGroup:
+    digest: str
+    size: int
+    aliases: List[str] = field(default_factory=list)
+    representative: Optional[str] = None   # 取回完整输出的那台主机
+
+class DigestIndex:
+    """一条命令的摘要结果：按摘要分组；执行失败的与摘要解析不出来的主机分别记下"""
+    def __init__(self):
+        self.groups: Dict[str, DigestGroup] = {}
+        self.unparsed: List[ExecutionResult] = []
+        self.failed: List[ExecutionResult] = []
+
+    def add(self, r: ExecutionResult):
+        if r.status != 'SUCCESS':
+            self.failed.append(r)
+            return
+        parsed = parse_digest(r.output)
+        if parsed is None:
+            self.unparsed.append(r)
+            return
+        digest, size = parsed
+        self.groups.setdefault(digest, DigestGroup(digest, size)).aliases.append(r.alias)
+
+    @property
+    def total_bytes(self) -> int:
+        """若全量取回要传输的输出字节数 (只计摘要成功的主机)"""
+        return sum(g.size * len(g.aliases) for g in self.groups.values())
+
+    @property
+    def fetched_bytes(self) -> int:
+        return sum(g.size for g in self.groups.values())
+
+    def merge_into(self, grouper, fetched: Dict[str, ExecutionResult]):
+        """把取回的完整输出并入 OutputGrouper：代表主机的输出代表整个摘要分组"""
+        for g in self.groups.values():
+            r = fetched.get(g.representative)
+            if r is None:
+                continue
+            if r.status != 'SUCCESS':
+                # 代表主机取回失败时整组没有可展示的内容，错误里注明是哪台、哪一步
+                r = replace(r, error=f"Fetch failed ({r.alias}): {r.error}")
+            grouper.add(r, aliases=g.aliases)
+        for r in self.unparsed:
+            grouper.add(fetched.get(r.alias, r))
+        for r in self.failed:
+            grouper.add(r)
+
+def plan_fetch(indexes: List[DigestIndex]) -> Set[str]:
+    """
+    需要取回完整输出的主机：每个摘要分组一台代表，加上摘要解析不出来的主机。
+    多条命令时优先选已经要取回其它命令输出的主机做代表，少连几台
+    """
+    chosen = {r.alias for index in indexes for r in index.unparsed}
+    for index in indexes:
+        for g in index.groups.values():
+            g.representative = next((a for a in g.aliases if a in chosen), g.aliases[0])
+            chosen.add(g.representative)
+    return chosen
@@ -1,9 +1,21 @@
+import codecs
+import queue
+import re
+import socket
+import sys
 import time
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from dataclasses import dataclass
+import threading
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from contextlib import contextmanager
+from dataclasses import dataclass, field
 from datetime import datetime
-from netmiko import ConnectHandler, NetmikoTimeoutException, NetmikoAuthenticationException
-from typing import List, Dict
+from typing import Iterator, List, Dict, Optional
+from core.capture import CaptureConfig, CapturedOutput
+from core.profiles import measure_prompt
+from core.metrics import PhaseTimer, add_phases, phase, recording
+from core.retry import TIMEOUT_STATUS, ConnectStats, Deadline, RetryPolicy, is_transient
+from core.telnet import TelnetAuthenticationError, TelnetSession, TelnetTimeoutError
 
 @dataclass
 class ExecutionResult:
@@ -12,52 +24,638 @@ class ExecutionResult:
     group: str
     alias: str
     command: str
-    status: str  # 'SUCCESS' or 'FAILED'
+    status: str  # 'SUCCESS' / 'FAILED' / 'TIMEOUT' (超过批次截止时间仍未完成)
     output: str
     error: str
     start_time: str
     duration: float
+    queue_wait: float = 0.0  # 从批次开始到该主机真正开始执行的等待时间
+    phases: Dict[str, float] = field(default_factory=dict)  # 分阶段耗时: throttle/tcp/login/prompt/command/disconnect
+    spool: Optional[str] = None  # 捕获模式下完整输出的落盘文件；output 已是完整输出时为 None
+    output_bytes: int = 0        # 捕获模式下的输出总字节数
+    output_capped: bool = False  # 输出超出每主机上限，落盘文件只保存了前一部分
+
+def connect_handler(**device):
+    """
+    Netmiko 连同 paramiko 与全部设备驱动导入要一百多毫秒，推迟到第一次真正建连时再导入，
+    --help、被拦截的危险命令、async 引擎、审计查询等都不必付这笔启动开销
+    """
+    from netmiko import ConnectHandler
+    return ConnectHandler(**device)
+
+def is_netmiko_error(exc: Exception, name: str) -> bool:
+    """按名称判断 Netmiko 异常；Netmiko 尚未导入时不可能抛出它的异常，无需为判断类型去导入"""
+    netmiko = sys.modules.get('netmiko')
+    return netmiko is not None and isinstance(exc, getattr(netmiko, name))
+
+# 模糊匹配提示符，解决现场极其不标准的 Shell Prompt 问题
+FUZZY_PROMPT = r'[#\$>]'
+
+# 捕获模式下单次从 SSH 通道读取的上限
+READ_CHUNK = 65536
+
+def build_device(host_cfg, profile=None) -> dict:
+    """
+    根据主机配置生成 Netmiko 连接参数；有实测画像时按画像放宽/收紧时序。
+    Telnet 主机只取其中的 conn_timeout (由 core.telnet 建连)，generic_telnet 仅留给基准测试做对照
+    """
+    device = {
+        'device_type': 'linux' if host_cfg.protocol == 'ssh' else 'generic_telnet',
+        'host': host_cfg.hostname,
+        'username': host_cfg.username,
+        'password': host_cfg.password,
+        'port': host_cfg.port,
+        'conn_timeout': 30,          # 强力模式：连接超时增加到30秒
+        'global_delay_factor': 3,    # 强力模式：全局延迟系数增加到3
+        'fast_cli': False,           # 强力模式：禁用快显，确保稳定
+    }
+    if profile is not None:
+        device.update({
+            'conn_timeout': profile.conn_timeout,
+            'global_delay_factor': profile.delay_factor,
+            'fast_cli': True,
+        })
+    return device
+
+# 流水线模式下每条命令结束后打印的哨兵行；回显里引号把它拆开，不会被误匹配。
+# 哨兵前先补一个换行：命令输出不以换行结尾 (printf、cat 无尾换行的文件) 时哨兵仍独占一行，
+# 切分时恰好去掉这一个换行
+SENTINEL_FMT = "__MT_END_{}__"
+SENTINEL_RE = re.compile(r'(?:\A|\n)__MT_END_(\d+)__[ \t]*$', re.MULTILINE)
+SENTINEL_ECHO = '__MT_""END_'   # 回显里被引号拆开的哨兵
+
+def build_pipeline(commands: List[str]) -> str:
+    """把多条命令拼成一次往返发送的命令行，每条命令后跟一个哨兵行"""
+    return "; ".join(f'{cmd}; printf "\\n{SENTINEL_ECHO}{i}__\\n"' for i, cmd in enumerate(commands))
+
+def split_pipeline(raw: str, count: int) -> Dict[int, str]:
+    """按哨兵行切分流水线输出，返回 {命令序号: 输出}"""
+    outputs = {}
+    last = 0
+    for m in SENTINEL_RE.finditer(raw):
+        idx = int(m.group(1))
+        if idx < count:
+            outputs[idx] = raw[last:m.start()].strip()
+        last = m.end()
+    return outputs
+
+class PipelineSplitter:
+    """
+    split_pipeline 的流式版本：边读边按哨兵行切分，各段写入对应命令的 OutputSpool。
+    内存中只保留最后一个换行及其后尚未结束的一行 (超长行直接写出)，最后一个哨兵之后的内容留在 rest 中等提示符。
+    """
+    ECHO_LIMIT = 65536   # 超过这么多字节仍未见到命令回显，视为终端不回显
+    MAX_PENDING = 64     # 未结束的行超过该长度就不可能是哨兵行
+
+    def __init__(self, spools: list):
+        self.spools = spools
+        self.index = 0
+        self.rest = ""
+        self._buf = ""
+        self._echo = True
+        # 回显里最后一个哨兵是被引号拆开的形式，据此丢掉整段命令回显
+        self._echo_tag = f'{SENTINEL_ECHO}{len(spools) - 1}__'
+        # 哨兵连同前面补的换行和行尾换行一起去掉，各命令的输出按字节原样落盘
+        self._sentinels = [re.compile(r'\n__MT_END_%d__[ \t]*\n' % i) for i in range(len(spools))]
+
+    @property
+    def done(self) -> bool:
+        return self.index >= len(self.spools)
+
+    def finished(self, prompt_re) -> bool:
+        return self.done and prompt_re.search(self.rest) is not None
+
+    def feed(self, text: str):
+        if self.done:
+            self.rest = (self.rest + text)[-4096:]
+            return
+        self._buf += text
+        if self._echo:
+            pos = self._buf.rfind(self._echo_tag)
+            if pos >= 0:
+                nl = self._buf.find('\n', pos)
+                if nl < 0:
+                    return
+                self._buf = self._buf[nl + 1:]
+            elif not (self._sentinels[0].search(self._buf) or len(self._buf) > self.ECHO_LIMIT):
+                return
+            self._echo = False
+        self._drain()
+
+    def _drain(self):
+        while not self.done:
+            spool = self.spools[self.index]
+            m = self._sentinels[self.index].search(self._buf)
+            if m is not None:
+                spool.write(self._buf[:m.start()])
+                self._buf = self._buf[m.end():]
+                self.index += 1
+                continue
+            # 哨兵行前一定有换行：最后一个换行连同其后未结束的一行留到下次，没有换行或超长的行不可能是哨兵行
+            keep = self._buf.rfind('\n')
+            if keep < 0 or len(self._buf) - keep > self.MAX_PENDING:
+                keep = len(self._buf)
+            spool.write(self._buf[:keep])
+            self._buf = self._buf[keep:]
+            return
+        self.rest = self._buf[-4096:]
+        self._buf = ""
+
+def session_key(host_cfg) -> tuple:
+    """会话池的主机键 (同一目标 + 同一凭据才允许复用)"""
+    return (host_cfg.protocol, host_cfg.hostname, host_cfg.port, host_cfg.username)
+
+def unreachable_results(host_cfg, commands: List[str]) -> List[ExecutionResult]:
+    start_time_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    return [RemoteExecutor._make_result(host_cfg, cmd, "FAILED", "", "Unreachable", start_time_str, 0.0)
+            for cmd in commands]
+
+def timeout_results(host_cfg, commands: List[str], deadline: Deadline, duration: float = 0.0) -> List[ExecutionResult]:
+    """批次截止时仍在执行或尚未开始的主机"""
+    start_time_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    return [RemoteExecutor._make_result(host_cfg, cmd, TIMEOUT_STATUS, "", deadline.message, start_time_str,
+                                        round(duration, 2)) for cmd in commands]
+
+class SessionPool:
+    """
+    按主机复用已登录的会话。
+
+    - 借出前做健康检查，失效会话直接丢弃重连
+    - 空闲超过 idle_timeout 的会话会被回收
+    - 全局打开的会话数不超过 max_sessions，满额时优先淘汰最久未用的空闲会话
+    """
+    def __init__(self, max_sessions: int = 200, idle_timeout: float = 300.0, connect=None):
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self._connect = connect or (lambda host_cfg: connect_handler(**build_device(host_cfg)))
+        self._idle: Dict[tuple, list] = defaultdict(list)  # key -> [(conn, last_used)]
+        self._open = 0
+        self._cond = threading.Condition()
+
+    @contextmanager
+    def session(self, host_cfg):
+        """借出一个会话；命令异常时会话被丢弃，正常结束后归还"""
+        conn = self.acquire(host_cfg)
+        try:
+            yield conn
+        except BaseException:
+            self.discard(conn)
+            raise
+        self.release(host_cfg, conn)
+
+    def acquire(self, host_cfg):
+        key = session_key(host_cfg)
+        while True:
+            conn = self._take_idle(key)
+            if conn is None:
+                break
+            if self._is_healthy(conn):
+                return conn
+            self.discard(conn)
+
+        self._reserve_slot()
+        try:
+            return self._connect(host_cfg)
+        except BaseException:
+            with self._cond:
+                self._open -= 1
+                self._cond.notify()
+            raise
+
+    def release(self, host_cfg, conn):
+        with self._cond:
+            self._idle[session_key(host_cfg)].append((conn, time.time()))
+            self._cond.notify()
+        self.evict_idle()
+
+    def discard(self, conn):
+        self._close(conn)
+        with self._cond:
+            self._open -= 1
+            self._cond.notify()
+
+    def evict_idle(self):
+        """回收空闲超时的会话"""
+        deadline = time.time() - self.idle_timeout
+        expired = []
+        with self._cond:
+            for key in list(self._idle):
+                keep = [(c, ts) for c, ts in self._idle[key] if ts >= deadline]
+                expired.extend(c for c, ts in self._idle[key] if ts < deadline)
+                if keep:
+                    self._idle[key] = keep
+                else:
+                    del self._idle[key]
+        for conn in expired:
+            self.discard(conn)
+
+    def close_all(self):
+        with self._cond:
+            conns = [c for entries in self._idle.values() for c, _ in entries]
+            self._idle.clear()
+        for conn in conns:
+            self.discard(conn)
+
+    def _take_idle(self, key):
+        with self._cond:
+            entries = self._idle.get(key)
+            if not entries:
+                return None
+            conn, ts = entries.pop()
+            if not entries:
+                del self._idle[key]
+        if time.time() - ts > self.idle_timeout:
+            self.discard(conn)
+            return self._take_idle(key)
+        return conn
+
+    def _reserve_slot(self):
+        victim = None
+        with self._cond:
+            while self._open >= self.max_sessions:
+                victim = self._pop_lru_locked()
+                if victim is not None:
+                    break
+                self._cond.wait()
+            self._open += 1
+        if victim is not None:
+            # 名额由被淘汰的会话让出
+            self._close(victim)
+            with self._cond:
+                self._open -= 1
+
+    def _pop_lru_locked(self):
+        oldest_key, oldest_idx, oldest_ts = None, None, None
+        for key, entries in self._idle.items():
+            for idx, (_, ts) in enumerate(entries):
+                if oldest_ts is None or ts < oldest_ts:
+                    oldest_key, oldest_idx, oldest_ts = key, idx, ts
+        if oldest_key is None:
+            return None
+        conn, _ = self._idle[oldest_key].pop(oldest_idx)
+        if not self._idle[oldest_key]:
+            del self._idle[oldest_key]
+        return conn
+
+    @staticmethod
+    def _is_healthy(conn) -> bool:
+        try:
+            if not conn.is_alive():
+                return False
+            # 清掉上一条命令残留的提示符/回显，避免污染下一次输出
+            conn.clear_buffer(backoff=False)
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    def _close(conn):
+        # 不走 Netmiko 的 disconnect()：Linux 驱动会把 root 的 '#' 提示符当成配置模式，
+        # 先发 exit 退出 "配置模式" 再等提示符回来，shell 已经退出，每个会话白等 10 秒
+        with phase('disconnect'):
+            try:
+                conn.write_channel("exit" + conn.RETURN)
+            except Exception:
+                pass
+            try:
+                if conn.protocol == 'ssh':
+                    conn.paramiko_cleanup()
+                else:
+                    conn.remote_conn.close()
+            except Exception:
+                pass
+
+class TokenBucket:
+    """令牌桶：限制每秒新建连接数，允许 burst 个突发"""
+    def __init__(self, rate: float, burst: Optional[int] = None):
+        self.rate = rate
+        self.capacity = burst or max(1, int(rate))
+        self._tokens = float(self.capacity)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """预订一个令牌，返回需要等待的秒数 (不阻塞，线程/协程都可用)"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+class ConnectionScheduler:
+    """
+    决定主机的下发顺序与时机，保护跳板机和老旧 Telnet 集中器:
+      - 每组并发上限 (组级 max_concurrency)
+      - 每个目标 IP 的并发上限 (组级 max_per_ip 或全局 per_ip_limit)
+      - 新建连接的令牌桶限速 (全局 connect_rate + 组级 connect_rate/connect_burst)
+      - 画像中已知的慢主机优先下发，与快主机重叠执行
+    """
+    def __init__(self, group_limits: Optional[Dict[str, dict]] = None, per_ip_limit: Optional[int] = None,
+                 connect_rate: Optional[float] = None, connect_burst: Optional[int] = None, profiles=None):
+        self.group_limits = group_limits or {}
+        self.per_ip_limit = per_ip_limit
+        self.profiles = profiles
+        self._global_bucket = TokenBucket(connect_rate, connect_burst) if connect_rate else None
+        self._group_buckets = {
+            g: TokenBucket(lim['connect_rate'], lim.get('connect_burst'))
+            for g, lim in self.group_limits.items() if lim.get('connect_rate')
+        }
+        self._running_groups = defaultdict(int)
+        self._running_ips = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def _groups(self, host_cfg):
+        return host_cfg.groups or (host_cfg.group_name,)
+
+    def group_cap(self, group: str) -> Optional[int]:
+        cap = self.group_limits.get(group, {}).get('max_concurrency')
+        return max(1, int(cap)) if cap else None
+
+    def ip_cap(self, host_cfg) -> Optional[int]:
+        caps = [self.group_limits.get(g, {}).get('max_per_ip') for g in self._groups(host_cfg)]
+        caps = [int(c) for c in caps + [self.per_ip_limit] if c]
+        return max(1, min(caps)) if caps else None
+
+    def order(self, hosts) -> list:
+        """按画像时延从慢到快排序；没有画像的主机排在已知慢主机之后、已知快主机之前"""
+        if self.profiles is None:
+            return list(hosts)
+        latencies = {}
+        for h in hosts:
+            profile = self.profiles.get(h)
+            if profile is not None:
+                latencies[h.alias] = profile.latency
+        if not latencies:
+            return list(hosts)
+        known = sorted(latencies.values())
+        unknown_rank = known[len(known) // 2]
+        return sorted(hosts, key=lambda h: -latencies.get(h.alias, unknown_rank))
+
+    def try_start(self, host_cfg) -> bool:
+        """组/IP 均未满额时占用名额并返回 True"""
+        with self._lock:
+            for g in self._groups(host_cfg):
+                cap = self.group_cap(g)
+                if cap is not None and self._running_groups[g] >= cap:
+                    return False
+            cap = self.ip_cap(host_cfg)
+            if cap is not None and self._running_ips[host_cfg.hostname] >= cap:
+                return False
+            for g in self._groups(host_cfg):
+                self._running_groups[g] += 1
+            self._running_ips[host_cfg.hostname] += 1
+            return True
+
+    def finish(self, host_cfg):
+        with self._lock:
+            for g in self._groups(host_cfg):
+                self._running_groups[g] -= 1
+            self._running_ips[host_cfg.hostname] -= 1
+
+    def connect_delay(self, host_cfg) -> float:
+        """新建连接前需要等待的秒数 (同时受全局与所属组的令牌桶约束)"""
+        delays = [b.reserve() for b in [self._global_bucket] + [self._group_buckets.get(g) for g in self._groups(host_cfg)] if b]
+        return max(delays, default=0.0)
 
 class RemoteExecutor:
-    def __init__(self, max_workers: int = 40):
+    def __init__(self, max_workers: int = 40, pool: SessionPool = None, profiles=None,
+                 scheduler: ConnectionScheduler = None, preflight=None, capture: Optional[CaptureConfig] = None,
+                 retry: Optional[RetryPolicy] = None, hedge: bool = False, deadline: Optional[float] = None):
         self.max_workers = max_workers
+        self.profiles = profiles  # ProfileStore，None 表示始终使用保守默认值
+        self.scheduler = scheduler
+        self.preflight = preflight  # ReachabilityProbe，None 表示不做预检
+        self.capture = capture  # CaptureConfig，None 表示输出整体保存在内存中
+        self.retry = retry  # RetryPolicy，None 表示建连失败不重试
+        self.hedge = hedge  # 建连慢于本批 p95 时发起对冲
+        self.deadline = deadline  # 每批的截止时间 (秒)，None 表示等所有主机结束
+        self.deadline_budget = None  # 作为分片运行时父进程下发的剩余时间
+        self._deadline = Deadline()
+        self._connect_stats = ConnectStats()
+        self.pool = pool or SessionPool(connect=self._open_session)
 
-    def _execute_single(self, host_cfg, command: str) -> ExecutionResult:
-        start_time_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        start_ts = time.time()
-        
-        device = {
-            'device_type': 'linux' if host_cfg.protocol == 'ssh' else 'generic_telnet',
-            'host': host_cfg.hostname,
-            'username': host_cfg.username,
-            'password': host_cfg.password,
-            'port': host_cfg.port,
-            'conn_timeout': 30,          # 强力模式：连接超时增加到30秒
-            'global_delay_factor': 3,    # 强力模式：全局延迟系数增加到3
-            'fast_cli': False,           # 强力模式：禁用快显，确保稳定
-        }
+    def __enter__(self):
+        return self
 
-        output = ""
-        error = ""
-        status = "SUCCESS"
+    def __exit__(self, *exc):
+        self.close()
 
+    def close(self):
+        """断开会话池中的所有连接并落盘主机画像"""
+        self.pool.close_all()
+        if self.profiles is not None:
+            self.profiles.save()
+
+    def _profile(self, host_cfg):
+        return self.profiles.get(host_cfg) if self.profiles is not None else None
+
+    def _connect(self, host_cfg):
+        if self.scheduler is not None:
+            delay = self.scheduler.connect_delay(host_cfg)
+            if delay > 0:
+                with phase('throttle'):
+                    time.sleep(delay)
+        device = build_device(host_cfg, self._profile(host_cfg))
+        if self._deadline.at is not None:
+            # 建连的各段超时都收紧到截止时间之内
+            timeout = self._deadline.clamp(device['conn_timeout'])
+            device.update(conn_timeout=timeout, auth_timeout=timeout, banner_timeout=timeout)
+        start = time.perf_counter()
+        if host_cfg.protocol == 'telnet':
+            # 内置 Telnet 客户端按收到的数据推进登录 (自己计 tcp/login)，不走 Netmiko 的 generic_telnet
+            conn = TelnetSession.open(host_cfg, device['conn_timeout'])
+        else:
+            conn = self._connect_ssh(host_cfg, device)
+        self._connect_stats.add(time.perf_counter() - start)
+        if self.profiles is not None:
+            # 每次新建会话都刷新一次实测提示符与时延；测量失败不影响本次执行
+            try:
+                with phase('prompt'):
+                    prompt, latency = measure_prompt(conn)
+                self.profiles.record(host_cfg, prompt, latency)
+            except Exception:
+                pass
+        return conn
+
+    @staticmethod
+    def _connect_ssh(host_cfg, device: dict):
+        # 自己建 TCP 连接再交给 Netmiko，才能把 TCP 建连与 SSH 协商/认证分开计时
+        with phase('tcp'):
+            device['sock'] = socket.create_connection((host_cfg.hostname, host_cfg.port), timeout=device['conn_timeout'])
         try:
-            # 建立连接
-            with ConnectHandler(**device) as conn:
-                # 模糊匹配提示符，解决现场极其不标准的 Shell Prompt 问题
-                output = conn.send_command(command, expect_string=r'[#\$>]')
-        except NetmikoTimeoutException:
-            status = "FAILED"
-            error = "Connection Timeout"
-        except NetmikoAuthenticationException:
-            status = "FAILED"
-            error = "Authentication Failed"
+            # Netmiko 在构造时完成协商、认证和提示符识别
+            with phase('login'):
+                return connect_handler(**device)
+        except BaseException:
+            device['sock'].close()
+            raise
+
+    def _open_session(self, host_cfg):
+        """会话池新建会话：瞬时故障按带抖动的指数退避重试 (不超过截止时间)"""
+        attempt = 0
+        while True:
+            try:
+                return self._hedged_connect(host_cfg)
+            except Exception as e:
+                if self.retry is None or attempt >= self.retry.attempts or not is_transient(e):
+                    raise
+                delay = self.retry.backoff(attempt)
+                remaining = self._deadline.remaining()
+                if remaining is not None and remaining <= delay:
+                    raise
+                attempt += 1
+                with phase('retry'):
+                    time.sleep(delay)
+
+    def _hedged_connect(self, host_cfg):
+        """
+        建连超过本批 p95 仍未完成时，再并行发起一次，先成功的胜出，另一个随后关闭。
+        有单 IP 并发上限的主机 (跳板机/Telnet 集中器) 不对冲，避免超出它们的连接数限制
+        """
+        if not self.hedge or (self.scheduler is not None and self.scheduler.ip_cap(host_cfg)):
+            return self._connect(host_cfg)
+
+        outcomes = queue.Queue()
+
+        def attempt():
+            # 每次尝试单独计时，只把胜出那次的 tcp/login 耗时计入本主机
+            with recording(PhaseTimer()) as timer:
+                try:
+                    outcomes.put((timer, self._connect(host_cfg), None))
+                except BaseException as e:
+                    outcomes.put((timer, None, e))
+
+        # 尝试放在守护线程里：输掉的那次不占用工作线程，批次截止时也不会拖住进程退出
+        threading.Thread(target=attempt, daemon=True).start()
+        started, running, hedged_at = time.perf_counter(), 1, None
+        while True:
+            wait = None
+            if hedged_at is None:
+                wait = self._connect_stats.hedge_wait(time.perf_counter() - started)
+                if wait == 0:
+                    threading.Thread(target=attempt, daemon=True).start()
+                    running, hedged_at, wait = running + 1, time.perf_counter(), None
+            try:
+                timer, conn, exc = outcomes.get(timeout=wait)
+            except queue.Empty:
+                continue
+            running -= 1
+            if exc is None or running == 0:
+                add_phases(timer.phases)
+                if hedged_at is not None:
+                    add_phases({'hedge': time.perf_counter() - hedged_at})
+                if exc is not None:
+                    raise exc
+                if running:
+                    threading.Thread(target=self._reap, args=(outcomes, running), daemon=True).start()
+                return conn
+
+    @staticmethod
+    def _reap(outcomes, count: int):
+        """关闭对冲中输掉、但随后也建连成功的会话"""
+        for _ in range(count):
+            _, conn, _ = outcomes.get()
+            if conn is not None:
+                SessionPool._close(conn)
+
+    def _send(self, host_cfg, commands: List[str]) -> Dict[int, str]:
+        """
+        借用会话执行命令；按画像执行失败时作废画像。
+        只有命令还没发出 (建连、登录阶段失败) 时才以保守默认值重试一次：命令发出后不重发 (命令不一定幂等)
+        """
+        profile = self._profile(host_cfg)
+        sent = []
+        try:
+            return self._send_once(host_cfg, commands, profile, sent)
         except Exception as e:
-            status = "FAILED"
-            error = str(e)
+            if profile is None or self._is_auth_error(e) or self._deadline.expired():
+                raise
+            self.profiles.invalidate(host_cfg)
+            if sent:
+                raise
+            return self._send_once(host_cfg, commands, None, sent)
 
-        duration = round(time.time() - start_ts, 2)
-        
+    def _send_once(self, host_cfg, commands: List[str], profile, sent: list) -> Dict[int, str]:
+        """sent 在命令写入会话前被置为非空，供调用方判断失败时命令是否已经发出"""
+        prompt = profile.prompt_regex if profile is not None else FUZZY_PROMPT
+        if self.capture is not None:
+            return self._stream_once(host_cfg, commands, re.compile(prompt), sent)
+        # 从会话池借用已登录的连接，避免每条命令重新握手
+        with self.pool.session(host_cfg) as conn, phase('command'):
+            sent.append(True)
+            # 没有画像时只能按模糊提示符匹配，命令回显里的 > # $ (如 2>&1、摘要命令的 >&3) 会被误认作提示符、
+            # 截断输出，单条命令也改用哨兵判断结束；哨兵没出现时整条命令记为 Missing Sentinel
+            if len(commands) == 1 and profile is not None:
+                return {0: conn.send_command(commands[0], expect_string=prompt,
+                                             read_timeout=self._deadline.clamp(10.0))}
+            # 等到最后一个哨兵之后的提示符出现，才算整组命令结束
+            last = SENTINEL_FMT.format(len(commands) - 1)
+            raw = conn.send_command(
+                build_pipeline(commands),
+                expect_string=rf'{last}[\s\S]*{prompt}',
+                read_timeout=self._deadline.clamp(10 * len(commands)),
+            )
+        return split_pipeline(raw, len(commands))
+
+    def _stream_once(self, host_cfg, commands: List[str], prompt_re, sent: list) -> Dict[int, CapturedOutput]:
+        """
+        捕获模式：不经过 send_command (它会把整段输出攒成一个字符串)，
+        自己轮询读通道，按哨兵切分后流式写入各命令的落盘文件。超时按连续无数据的时间计算。
+        """
+        spools = [self.capture.open(host_cfg, i) for i in range(len(commands))]
+        splitter = PipelineSplitter(spools)
+        idle_timeout = 10 * len(commands)
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        try:
+            with self.pool.session(host_cfg) as conn, phase('command'):
+                sent.append(True)
+                conn.write_channel(build_pipeline(commands) + conn.RETURN)
+                last_data = time.monotonic()
+                while not splitter.finished(prompt_re):
+                    if self._deadline.expired():
+                        raise TimeoutError(self._deadline.message)
+                    data = self._read_chunk(conn, decoder)
+                    if data:
+                        splitter.feed(data.replace('\r', ''))
+                        last_data = time.monotonic()
+                    elif time.monotonic() - last_data > idle_timeout:
+                        raise TimeoutError(f"No output for {idle_timeout}s")
+                    else:
+                        time.sleep(0.01)
+        except BaseException:
+            for spool in spools:
+                spool.discard()
+            raise
+        return {i: spool.close() for i, spool in enumerate(spools)}
+
+    @staticmethod
+    def _read_chunk(conn, decoder) -> str:
+        """
+        SSH 直接按固定大小读 paramiko 通道：Netmiko 的 read_channel 会把缓冲区里的数据一次读空，
+        远端输出很快时单次就能攒下几 MB
+        """
+        if conn.protocol != 'ssh':
+            return conn.read_channel()
+        chan = conn.remote_conn
+        return decoder.decode(chan.recv(READ_CHUNK)) if chan.recv_ready() else ""
+
+    @staticmethod
+    def _is_auth_error(exc: Exception) -> bool:
+        return isinstance(exc, TelnetAuthenticationError) or is_netmiko_error(exc, 'NetmikoAuthenticationException')
+
+    @staticmethod
+    def _error_message(exc: Exception) -> str:
+        if isinstance(exc, TelnetTimeoutError) or is_netmiko_error(exc, 'NetmikoTimeoutException'):
+            return "Connection Timeout"
+        if RemoteExecutor._is_auth_error(exc):
+            return "Authentication Failed"
+        return str(exc)
+
+    @staticmethod
+    def _make_result(host_cfg, command, status, output, error, start_time_str, duration, phases=None) -> ExecutionResult:
+        """output 为字符串，或捕获模式下的 CapturedOutput (已去除首尾空白)"""
+        captured = output if isinstance(output, CapturedOutput) else None
         return ExecutionResult(
             host=host_cfg.hostname,
             port=host_cfg.port,
@@ -65,19 +663,189 @@ class RemoteExecutor:
             alias=host_cfg.alias,
             command=command,
             status=status,
-            output=output.strip(),
+            output=captured.text if captured else output.strip(),
             error=error,
             start_time=start_time_str,
-            duration=duration
+            duration=duration,
+            phases=dict(phases or {}),
+            spool=captured.spool if captured else None,
+            output_bytes=captured.size if captured else 0,
+            output_capped=captured.capped if captured else False,
         )
 
+    def _execute_single(self, host_cfg, command: str) -> ExecutionResult:
+        start_time_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        start_ts = time.time()
+
+        output = ""
+        error = ""
+        status = "SUCCESS"
+
+        with recording(PhaseTimer()) as timer:
+            try:
+                outputs = self._send(host_cfg, [command])
+                if 0 in outputs:
+                    output = outputs[0]
+                else:
+                    status, error = "FAILED", "Missing Sentinel"
+            except Exception as e:
+                status, error = self.failure(e)
+
+        duration = round(time.time() - start_ts, 2)
+        return self._make_result(host_cfg, command, status, output, error, start_time_str, duration, timer.phases)
+
+    def _execute_multi(self, host_cfg, commands: List[str]) -> List[ExecutionResult]:
+        """在同一个会话上一次往返执行整组命令"""
+        if len(commands) == 1:
+            return [self._execute_single(host_cfg, commands[0])]
+
+        start_time_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        start_ts = time.time()
+
+        outputs = {}
+        status, error = "FAILED", ""
+        with recording(PhaseTimer()) as timer:
+            try:
+                outputs = self._send(host_cfg, commands)
+            except Exception as e:
+                status, error = self.failure(e)
+
+        # 一次往返的耗时由整组命令共享
+        duration = round(time.time() - start_ts, 2)
+        results = []
+        for i, cmd in enumerate(commands):
+            if error:
+                results.append(self._make_result(host_cfg, cmd, status, "", error, start_time_str, duration, timer.phases))
+            elif i not in outputs:
+                results.append(self._make_result(host_cfg, cmd, "FAILED", "", "Missing Sentinel", start_time_str, duration, timer.phases))
+            else:
+                results.append(self._make_result(host_cfg, cmd, "SUCCESS", outputs[i], "", start_time_str, duration, timer.phases))
+        return results
+
+    def failure(self, exc: Exception):
+        """(状态, 错误信息)；截止时间已过时被收紧的超时打断的主机记为 TIMEOUT"""
+        if self._deadline.expired():
+            return TIMEOUT_STATUS, self._deadline.message
+        return "FAILED", self._error_message(exc)
+
+    @staticmethod
+    def _run_queued(fn, host_cfg, arg, batch_start: float):
+        """在工作线程中执行，并记录该主机在队列中等待的时间"""
+        queue_wait = round(time.perf_counter() - batch_start, 4)
+        out = fn(host_cfg, arg)
+        for r in (out if isinstance(out, list) else [out]):
+            r.queue_wait = queue_wait
+        return out
+
+    def _iter_completed(self, fn, hosts, arg, commands: List[str], single: bool):
+        """
+        调度循环：按调度器给出的顺序逐台下发，组/IP 满额的主机暂缓，
+        有主机完成、名额释放后再继续补位。
+        到了截止时间，仍在执行和尚未开始的主机直接产出 TIMEOUT 结果 (按 commands 命名)，不再等待。
+        """
+        sched = self.scheduler
+        deadline = self._deadline
+        pending = deque(sched.order(hosts) if sched else hosts)
+        running = {}
+        started = {}
+        batch_start = time.perf_counter()
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        try:
+            while (pending or running) and not deadline.expired():
+                deferred = []
+                while pending and len(running) < self.max_workers:
+                    h = pending.popleft()
+                    if sched is not None and not sched.try_start(h):
+                        deferred.append(h)
+                        continue
+                    running[executor.submit(self._run_queued, fn, h, arg, batch_start)] = h
+                    started[h.alias] = time.perf_counter()
+                pending.extendleft(reversed(deferred))
+
+                done, _ = wait(running, timeout=deadline.remaining(), return_when=FIRST_COMPLETED)
+                for future in done:
+                    # 及时丢弃已产出的 Future，大批量时内存保持平稳
+                    h = running.pop(future)
+                    started.pop(h.alias, None)
+                    if sched is not None:
+                        sched.finish(h)
+                    yield future.result()
+
+            # 恰好在截止时刻完成的主机照常产出
+            for future in [f for f in running if f.done() and not f.cancelled()]:
+                h = running.pop(future)
+                started.pop(h.alias, None)
+                if sched is not None:
+                    sched.finish(h)
+                yield future.result()
+            for h in list(running.values()) + list(pending):
+                elapsed = time.perf_counter() - started[h.alias] if h.alias in started else 0.0
+                results = timeout_results(h, commands, deadline, elapsed)
+                yield results[0] if single else results
+        finally:
+            # 调用方提前停止迭代或到了截止时间：尚未开始的主机不再执行，并归还调度名额
+            for future, h in running.items():
+                future.cancel()
+                if sched is not None:
+                    sched.finish(h)
+            # 截止后仍在跑的主机，其超时已被收紧到截止时间，会自行很快退出，不必等它们
+            executor.shutdown(wait=not deadline.expired(), cancel_futures=True)
+
+    def _begin_batch(self):
+        """每批开始时重置截止时间与对冲用的建连统计"""
+        self._deadline = Deadline(self.deadline, self.deadline_budget)
+        self._connect_stats = ConnectStats()
+
+    def iter_batch(self, hosts, command: str) -> Iterator[ExecutionResult]:
+        """按完成顺序逐条产出结果，最快的主机最先返回"""
+        self._begin_batch()
+        reachable = yield from self._skip_unreachable(hosts, [command], single=True)
+        yield from self._iter_completed(self._execute_single, reachable, command, [command], single=True)
+
+    def iter_batch_multi(self, hosts, commands: List[str]) -> Iterator[List[ExecutionResult]]:
+        """按完成顺序逐台产出该主机整组命令的结果列表"""
+        self._begin_batch()
+        reachable = yield from self._skip_unreachable(hosts, commands, single=False)
+        yield from self._iter_completed(self._execute_multi, reachable, commands, commands, single=False)
+
+    def iter_jobs(self, hosts, label: str, fn, arg=None, new_batch: bool = True) -> Iterator[ExecutionResult]:
+        """
+        在本执行器的工作线程中对每台主机执行 fn(host_cfg, arg) (如文件分发)，按完成顺序产出它返回的结果。
+        与 iter_batch 一样做批次准备、可达性预检和调度；label 作为不可达/超时结果中的命令名。
+        同一批里的后续阶段传 new_batch=False：沿用本批的截止时间，也不再预检
+        """
+        if new_batch:
+            self._begin_batch()
+            hosts = yield from self._skip_unreachable(hosts, [label], single=True)
+        yield from self._iter_completed(fn, hosts, arg, [label], single=True)
+
+    def _skip_unreachable(self, hosts, commands: List[str], single: bool):
+        """预检不可达的主机立即产出 FAILED 结果，不占用执行器名额；返回可达主机列表"""
+        if self.preflight is None:
+            return list(hosts)
+        reachable, dead = self.preflight.split(hosts)
+        for h in dead:
+            results = unreachable_results(h, commands)
+            yield results[0] if single else results
+        return reachable
+
     def run_batch(self, hosts, command: str, progress_callback=None) -> List[ExecutionResult]:
         results = []
-        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-            future_to_host = {executor.submit(self._execute_single, h, command): h for h in hosts}
-            for future in as_completed(future_to_host):
-                res = future.result()
-                results.append(res)
-                if progress_callback:
-                    progress_callback(res)
+        for res in self.iter_batch(hosts, command):
+            results.append(res)
+            if progress_callback:
+                progress_callback(res)
+        return results
+
+    def run_batch_multi(self, hosts, commands: List[str], progress_callback=None) -> Dict[str, List[ExecutionResult]]:
+        """
+        每台主机在自己的会话上顺序跑完整组命令，主机之间互不等待。
+        返回 {alias: [ExecutionResult, ...]}，可直接交给 HealthParser.parse_metrics。
+        progress_callback 在每台主机完成后以该主机的结果列表调用一次。
+        """
+        results = {}
+        for host_results in self.iter_batch_multi(hosts, commands):
+            results[host_results[0].alias] = host_results
+            if progress_callback:
+                progress_callback(host_results)
         return results
@@ -0,0 +1,183 @@
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+# 体检探针：一条复合命令一次往返读完所有数据源，各数据源的输出之间用分段标记隔开
+SECTION_MARK = "@@mt:"
+
+# 段名 -> 产生该段输出的 shell 片段。只用 cat/head/df 这类 busybox 也有的命令。
+# 不能含 # $ > 等字符 (包括 2>/dev/null)：命令回显里出现提示符字符会让模糊提示符匹配提前结束读取；
+# 报错信息会留在段内，由解析器报告为解析失败
+PROBE_SECTIONS: Dict[str, str] = {
+    'loadavg': "cat /proc/loadavg",
+    'meminfo': "cat /proc/meminfo",
+    'stat': "head -n 1 /proc/stat",
+    'df': "df -P /",
+    'dfi': "df -Pi /",
+}
+
+def build_probe(sections: Optional[Dict[str, str]] = None) -> str:
+    parts = []
+    for name, cmd in (sections or PROBE_SECTIONS).items():
+        # 标记拆成两段引号拼接，命令回显里不会出现完整的标记行
+        parts.append(f'echo "{SECTION_MARK[:2]}""{SECTION_MARK[2:]}{name}"; {cmd}')
+    return "; ".join(parts)
+
+HEALTH_PROBE = build_probe()
+
+def split_sections(output: str) -> Dict[str, str]:
+    """按分段标记切开探针输出；标记之前的内容 (登录横幅、残留回显) 丢弃"""
+    sections: Dict[str, str] = {}
+    current, buf = None, []
+    for line in output.splitlines():
+        stripped = line.strip()
+        if stripped.startswith(SECTION_MARK):
+            if current is not None:
+                sections[current] = "\n".join(buf).strip()
+            current, buf = stripped[len(SECTION_MARK):], []
+        elif current is not None:
+            buf.append(line)
+    if current is not None:
+        sections[current] = "\n".join(buf).strip()
+    return sections
+
+class MetricParseError(ValueError):
+    pass
+
+@dataclass(frozen=True)
+class MetricSpec:
+    name: str
+    section: str
+    parse: Callable[[str], object]
+    type: type
+    label: Optional[str] = None  # 体检表的列名；None 表示不直接展示 (如 CPU 累计计数，需要两次采样求差)
+    percent: bool = False
+    optional: bool = False       # 为 True 时该段无输出 (设备不支持) 不算失败
+
+# 指标解析器: 段文本 -> 指定类型的值，不适用时返回 None，数据不合预期时抛 MetricParseError。
+# 新增指标只需注册解析器 (必要时在 PROBE_SECTIONS 加一段)，不增加往返次数
+METRICS: Dict[str, MetricSpec] = {}
+
+def register_metric(name: str, section: str, type: type, label: Optional[str] = None,
+                    percent: bool = False, optional: bool = False):
+    def decorator(fn):
+        METRICS[name] = MetricSpec(name, section, fn, type, label, percent, optional)
+        return fn
+    return decorator
+
+def table_metrics() -> List[MetricSpec]:
+    return [spec for spec in METRICS.values() if spec.label]
+
+def _pct(used: float, total: float) -> int:
+    if total <= 0:
+        raise MetricParseError(f"total is {total}")
+    return int(used / total * 100)
+
+def _kv_table(text: str) -> Dict[str, int]:
+    """/proc/meminfo 格式: 'MemTotal:  8167848 kB'"""
+    fields = {}
+    for line in text.splitlines():
+        key, _, rest = line.partition(':')
+        parts = rest.split()
+        if parts and parts[0].isdigit():
+            fields[key.strip()] = int(parts[0])
+    return fields
+
+def _df_capacity(text: str) -> Optional[int]:
+    """df -P 的根分区行: Filesystem 1024-blocks Used Available Capacity Mounted-on"""
+    for line in text.splitlines()[1:]:
+        parts = line.split()
+        if len(parts) >= 6 and parts[-1] == '/':
+            capacity = parts[-2]
+            if capacity == '-':
+                return None  # 不统计 inode 的文件系统 (btrfs 等)
+            if not capacity.endswith('%'):
+                raise MetricParseError(f"unexpected capacity column {capacity!r}")
+            return int(capacity[:-1])
+    raise MetricParseError("no row mounted on /")
+
+@register_metric('load', 'loadavg', float, label="负载 (1min)")
+def parse_load(text: str) -> float:
+    return float(text.split()[0])
+
+@register_metric('mem', 'meminfo', int, label="内存使用率", percent=True)
+def parse_mem(text: str) -> int:
+    fields = _kv_table(text)
+    if 'MemTotal' not in fields:
+        raise MetricParseError("MemTotal missing")
+    # 3.14 之前的内核没有 MemAvailable，按 free + buffers + cached 估算
+    available = fields.get('MemAvailable')
+    if available is None:
+        available = fields.get('MemFree', 0) + fields.get('Buffers', 0) + fields.get('Cached', 0)
+    return _pct(fields['MemTotal'] - available, fields['MemTotal'])
+
+@register_metric('swap', 'meminfo', int, label="Swap", percent=True)
+def parse_swap(text: str) -> Optional[int]:
+    fields = _kv_table(text)
+    if 'SwapTotal' not in fields:
+        raise MetricParseError("SwapTotal missing")
+    if not fields['SwapTotal']:
+        return None
+    return _pct(fields['SwapTotal'] - fields.get('SwapFree', 0), fields['SwapTotal'])
+
+@register_metric('disk', 'df', int, label="磁盘占用 (/)", percent=True)
+def parse_disk(text: str) -> Optional[int]:
+    return _df_capacity(text)
+
+@register_metric('inode', 'dfi', int, label="Inode (/)", percent=True, optional=True)
+def parse_inode(text: str) -> Optional[int]:
+    return _df_capacity(text)
+
+class CpuTimes(NamedTuple):
+    busy: int
+    total: int
+
+@register_metric('cpu', 'stat', CpuTimes, optional=True)
+def parse_cpu(text: str) -> CpuTimes:
+    """/proc/stat 首行的累计 jiffies；guest 已计入 user，只取前 8 列"""
+    parts = text.split()
+    if not parts or parts[0] != 'cpu':
+        raise MetricParseError("no aggregate cpu line")
+    ticks = [int(v) for v in parts[1:9]]
+    if len(ticks) < 4:
+        raise MetricParseError(f"only {len(ticks)} cpu columns")
+    idle = ticks[3] + (ticks[4] if len(ticks) > 4 else 0)
+    return CpuTimes(busy=sum(ticks) - idle, total=sum(ticks))
+
+def cpu_percent(prev: Optional[CpuTimes], cur: Optional[CpuTimes]) -> Optional[int]:
+    """两次采样之间的 CPU 使用率；计数回绕或主机重启时返回 None"""
+    if prev is None or cur is None or cur.total <= prev.total or cur.busy < prev.busy:
+        return None
+    return int((cur.busy - prev.busy) / (cur.total - prev.total) * 100)
+
+@dataclass
+class HostHealth:
+    online: bool
+    values: Dict[str, object] = field(default_factory=dict)
+    errors: Dict[str, str] = field(default_factory=dict)  # 指标名 -> 失败原因
+
+    def get(self, name: str):
+        return self.values.get(name)
+
+def collect(output: str, metrics: Optional[Dict[str, MetricSpec]] = None) -> HostHealth:
+    """把一次探针输出交给各指标解析器；任何一个解析失败都记录原因，不影响其它指标"""
+    sections = split_sections(output)
+    health = HostHealth(online=True)
+    for name, spec in (metrics or METRICS).items():
+        text = sections.get(spec.section)
+        if text is None:
+            health.errors[name] = f"section '{spec.section}' missing from probe output"
+            continue
+        if not text:
+            if not spec.optional:
+                health.errors[name] = f"no output from `{PROBE_SECTIONS.get(spec.section, spec.section)}`"
+            continue
+        try:
+            value = spec.parse(text)
+        except (ValueError, IndexError, KeyError) as e:
+            health.errors[name] = f"{type(e).__name__}: {e}"
+            continue
+        if value is not None and not isinstance(value, spec.type):
+            health.errors[name] = f"parser returned {type(value).__name__}, expected {spec.type.__name__}"
+            continue
+        health.values[name] = value
+    return health
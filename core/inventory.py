@@ -1,6 +1,13 @@
-import yaml
+import hashlib
+import ipaddress
+import os
+import pickle
+import re
 from dataclasses import dataclass
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple
+
+# 编译缓存格式变化时递增，旧缓存自动失效
+CACHE_VERSION = 3
 
 @dataclass
 class HostConfig:
@@ -11,55 +18,251 @@ class HostConfig:
     protocol: str
     group_name: str
     alias: str
+    groups: Tuple[str, ...] = ()   # 所属的全部组 (含 group_name)
+    tags: Tuple[str, ...] = ()
+
+# hosts.yaml 中组级别的调度限制字段 (见 ConnectionScheduler)
+LIMIT_KEYS = ('max_concurrency', 'max_per_ip', 'connect_rate', 'connect_burst')
+
+PORT_RANGE_RE = re.compile(r'^(\d+)-(\d+)$')
+
+def expand_ports(spec, default_port: int) -> List[int]:
+    """2201 / "2201-2240" -> 端口列表；端口必须是 1-65535 的整数，区间不能倒序"""
+    if spec is None or spec == '':
+        return [default_port]
+    text = str(spec).strip()
+    m = PORT_RANGE_RE.match(text)
+    if m:
+        lo, hi = int(m.group(1)), int(m.group(2))
+    elif text.isdigit():
+        lo = hi = int(text)
+    else:
+        raise ValueError(f"Invalid port: {spec!r}")
+    if not 1 <= lo <= hi <= 65535:
+        raise ValueError(f"Invalid port range: {spec!r}")
+    return list(range(lo, hi + 1))
+
+def expand_ips(spec: str) -> List[str]:
+    """
+    支持以下写法:
+      10.0.0.5              单个地址 (或主机名)
+      10.0.0.0/30           CIDR 网段 (去掉网络/广播地址)
+      10.0.0.1-10.0.0.20    地址区间
+      10.0.0.1-20           末段区间
+    """
+    spec = str(spec).strip()
+    if '/' in spec:
+        net = ipaddress.ip_network(spec, strict=False)
+        addrs = list(net.hosts()) if net.num_addresses > 2 else list(net)
+        return [str(a) for a in addrs]
+    if '-' in spec:
+        start, end = spec.split('-', 1)
+        try:
+            first = ipaddress.ip_address(start)
+        except ValueError:
+            return [spec]  # 带连字符的主机名
+        if '.' not in end and ':' not in end:
+            end = start.rsplit('.', 1)[0] + '.' + end
+        last = ipaddress.ip_address(end)
+        return [str(ipaddress.ip_address(i)) for i in range(int(first), int(last) + 1)]
+    return [spec]
+
+def split_host_port(entry: str) -> Tuple[str, Optional[str]]:
+    """127.0.0.1:2201-2240 -> ("127.0.0.1", "2201-2240")；IPv6 需写成 [::1]:22"""
+    entry = str(entry).strip()
+    if entry.startswith('['):
+        host, _, rest = entry[1:].partition(']')
+        return host, rest.lstrip(':') or None
+    if entry.count(':') == 1:
+        host, port = entry.split(':')
+        return host, port
+    return entry, None
+
+def as_tuple(value) -> Tuple[str, ...]:
+    if not value:
+        return ()
+    if isinstance(value, str):
+        return tuple(v.strip() for v in value.split(',') if v.strip())
+    return tuple(str(v) for v in value)
 
 class InventoryManager:
-    def __init__(self, yaml_path: str):
+    """
+    主机清单：解析 hosts.yaml，展开地址/端口区间，并按组、标签、别名建立索引。
+    编译结果缓存在 cache_path，YAML 未变化 (mtime/大小/内容哈希) 时直接加载缓存。
+    """
+    def __init__(self, yaml_path: str, cache_path: Optional[str] = None):
         self.yaml_path = yaml_path
+        self.cache_path = cache_path
         self.hosts: List[HostConfig] = []
+        self.by_alias: Dict[str, int] = {}
+        self.by_group: Dict[str, List[int]] = {}
+        self.by_tag: Dict[str, List[int]] = {}
+        self.group_limits: Dict[str, dict] = {}
         self._load()
 
     def _load(self):
-        with open(self.yaml_path, 'r', encoding='utf-8') as f:
-            data = yaml.safe_load(f)
-            
+        st = os.stat(self.yaml_path)
+        cached = self._read_cache()
+        if cached and cached['mtime'] == st.st_mtime_ns and cached['size'] == st.st_size:
+            self._apply(cached)
+            return
+
+        with open(self.yaml_path, 'rb') as f:
+            raw = f.read()
+        digest = hashlib.sha256(raw).hexdigest()
+        if cached and cached['sha256'] == digest:
+            # 仅 mtime 变化 (如 touch/检出)，内容未变
+            compiled = cached
+        else:
+            # yaml 只在缓存失效时才需要，命中缓存的调用省掉它的导入
+            import yaml
+            compiled = self._compile(yaml.safe_load(raw.decode('utf-8')) or {})
+            compiled['sha256'] = digest
+        compiled['mtime'] = st.st_mtime_ns
+        compiled['size'] = st.st_size
+        self._apply(compiled)
+        self._write_cache(compiled)
+
+    def _read_cache(self) -> Optional[dict]:
+        if not self.cache_path or not os.path.isfile(self.cache_path):
+            return None
+        try:
+            with open(self.cache_path, 'rb') as f:
+                data = pickle.load(f)
+        except Exception:
+            return None
+        if not isinstance(data, dict) or data.get('version') != CACHE_VERSION:
+            return None
+        return data
+
+    def _write_cache(self, compiled: dict):
+        if not self.cache_path:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.cache_path) or '.', exist_ok=True)
+            tmp = self.cache_path + '.tmp'
+            with open(tmp, 'wb') as f:
+                pickle.dump(compiled, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, self.cache_path)
+        except OSError:
+            pass  # 缓存写不进去不影响使用
+
+    def _apply(self, compiled: dict):
+        self.hosts = compiled['hosts']
+        self.by_alias = compiled['by_alias']
+        self.by_group = compiled['by_group']
+        self.by_tag = compiled['by_tag']
+        self.group_limits = compiled['group_limits']
+
+    def _compile(self, data: dict) -> dict:
+        hosts: List[HostConfig] = []
+        by_alias: Dict[str, int] = {}
+        group_limits: Dict[str, dict] = {}
+
         for group in data.get('inventory', []):
             group_name = group.get('name')
             protocol = group.get('protocol', 'ssh')
             username = group.get('username')
             password = group.get('password')
             default_port = 22 if protocol == 'ssh' else 23
-            group_port = group.get('ports', default_port)
-            
+            group_ports = group.get('ports')
+            group_tags = as_tuple(group.get('tags'))
+            limits = {k: group[k] for k in LIMIT_KEYS if group.get(k) is not None}
+            if limits:
+                group_limits[group_name] = limits
+
             for entry in group.get('hosts', []):
-                alias = None
+                alias_tpl = None
+                extra_groups, tags = (), group_tags
                 if isinstance(entry, dict):
-                    ip = entry.get('ip')
-                    port = entry.get('port', group_port)
-                    alias = entry.get('alias')
+                    ip_spec, port_spec = split_host_port(entry.get('ip'))
+                    port_spec = entry.get('port', port_spec)
+                    alias_tpl = entry.get('alias')
+                    extra_groups = as_tuple(entry.get('groups'))
+                    tags = group_tags + tuple(t for t in as_tuple(entry.get('tags')) if t not in group_tags)
+                    user = entry.get('username', username)
+                    pwd = entry.get('password', password)
                 else:
-                    # 支持 127.0.0.1:2222 这种格式
-                    if ':' in str(entry):
-                        host_part, port_part = str(entry).split(':')
-                        ip = host_part
-                        port = int(port_part)
-                    else:
-                        ip = entry
-                        port = group_port
-                
-                if not alias:
-                    alias = f"{ip}:{port}"
-
-                self.hosts.append(HostConfig(
-                    hostname=ip,
-                    port=port,
-                    username=username,
-                    password=password,
-                    protocol=protocol,
-                    group_name=group_name,
-                    alias=alias
-                ))
-
-    def get_hosts(self, group_filter: Optional[str] = None) -> List[HostConfig]:
-        if not group_filter or group_filter == 'all':
+                    # 支持 127.0.0.1:2222 / 127.0.0.1:2201-2240 / 10.0.0.0/28 等写法
+                    ip_spec, port_spec = split_host_port(entry)
+                    user, pwd = username, password
+
+                # 主机上没写端口时用组级别的 ports (同样可以是区间)，都没写时按协议取默认端口
+                ports = expand_ports(port_spec if port_spec not in (None, '') else group_ports, default_port)
+                ips = expand_ips(ip_spec)
+                if len(ips) * len(ports) > 1 and alias_tpl and '{' not in alias_tpl:
+                    # 固定别名会让展开出的主机互相覆盖 (按同名合并)，只剩第一台
+                    port_desc = f"{ports[0]}-{ports[-1]}" if len(ports) > 1 else ports[0]
+                    raise ValueError(f"Alias '{alias_tpl}' would be shared by {len(ips) * len(ports)} hosts "
+                                     f"expanded from '{ip_spec}' (port {port_desc}); "
+                                     f"use a template such as '{alias_tpl}-{{i}}'")
+                index = 0
+                for ip in ips:
+                    for port in ports:
+                        index += 1
+                        if alias_tpl and '{' in alias_tpl:
+                            # 区间展开时别名可用模板: Node-{i:02d} / {ip} / {port}
+                            alias = alias_tpl.format(i=index, ip=ip, port=port)
+                        else:
+                            alias = alias_tpl or f"{ip}:{port}"
+                        groups = (group_name,) + tuple(g for g in extra_groups if g != group_name)
+
+                        if alias in by_alias:
+                            # 同一主机在多个组出现时合并组和标签
+                            existing = hosts[by_alias[alias]]
+                            existing.groups += tuple(g for g in groups if g not in existing.groups)
+                            existing.tags += tuple(t for t in tags if t not in existing.tags)
+                            continue
+
+                        by_alias[alias] = len(hosts)
+                        hosts.append(HostConfig(
+                            hostname=ip,
+                            port=port,
+                            username=user,
+                            password=pwd,
+                            protocol=protocol,
+                            group_name=group_name,
+                            alias=alias,
+                            groups=groups,
+                            tags=tags,
+                        ))
+
+        by_group: Dict[str, List[int]] = {}
+        by_tag: Dict[str, List[int]] = {}
+        for idx, h in enumerate(hosts):
+            for g in h.groups:
+                by_group.setdefault(g, []).append(idx)
+            for t in h.tags:
+                by_tag.setdefault(t, []).append(idx)
+
+        return {
+            'version': CACHE_VERSION,
+            'hosts': hosts,
+            'by_alias': by_alias,
+            'by_group': by_group,
+            'by_tag': by_tag,
+            'group_limits': group_limits,
+        }
+
+    def get_host(self, alias: str) -> Optional[HostConfig]:
+        idx = self.by_alias.get(alias)
+        return self.hosts[idx] if idx is not None else None
+
+    def get_hosts(self, group_filter: Optional[str] = None, tag_filter: Optional[str] = None) -> List[HostConfig]:
+        """
+        group_filter / tag_filter 均支持逗号分隔多个值：
+        同一选择器内取并集，组与标签之间取交集。结果保持清单中的原始顺序。
+        """
+        selected = None
+        if group_filter and group_filter != 'all':
+            selected = set()
+            for g in as_tuple(group_filter):
+                selected.update(self.by_group.get(g, ()))
+        if tag_filter:
+            tagged = set()
+            for t in as_tuple(tag_filter):
+                tagged.update(self.by_tag.get(t, ()))
+            selected = tagged if selected is None else selected & tagged
+        if selected is None:
             return self.hosts
-        return [h for h in self.hosts if h.group_name == group_filter]
+        return [self.hosts[i] for i in sorted(selected)]
@@ -0,0 +1,179 @@
+import contextvars
+import json
+import math
+import os
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+# 分阶段耗时的分桶边界 (秒)，同时用于 --profile 直方图和 Prometheus histogram
+PHASE_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0]
+
+# 阶段的展示顺序；未列出的阶段排在最后
+PHASE_ORDER = ['queue', 'throttle', 'retry', 'tcp', 'login', 'hedge', 'prompt', 'command', 'disconnect']
+
+class PhaseTimer:
+    """单台主机一次执行的分阶段耗时，同名阶段多次出现时累加"""
+    def __init__(self):
+        self.phases: Dict[str, float] = {}
+
+    def add(self, name: str, seconds: float):
+        self.phases[name] = round(self.phases.get(name, 0.0) + seconds, 4)
+
+    @contextmanager
+    def measure(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+# 当前正在计时的 PhaseTimer。用 contextvars 而不是 threading.local，
+# 线程池的每个任务和 asyncio 的每个协程任务都各自持有一份
+_current: contextvars.ContextVar = contextvars.ContextVar('phase_timer', default=None)
+
+@contextmanager
+def recording(timer: PhaseTimer):
+    """在此上下文内执行的代码 (会话池、连接建立等) 通过 phase() 把耗时记到 timer 上"""
+    token = _current.set(timer)
+    try:
+        yield timer
+    finally:
+        _current.reset(token)
+
+@contextmanager
+def phase(name: str):
+    timer = _current.get()
+    if timer is None:
+        yield
+        return
+    with timer.measure(name):
+        yield
+
+def add_phases(phases: Dict[str, float]):
+    """把另一个 PhaseTimer 记下的耗时并入当前主机 (对冲建连时只计入胜出的那次尝试)"""
+    timer = _current.get()
+    if timer is None:
+        return
+    for name, seconds in phases.items():
+        timer.add(name, seconds)
+
+def percentile(values: List[float], pct: float) -> float:
+    """最近秩法：第 ceil(pct% * n) 个值；不用 round，避免银行家舍入让相邻的 n 取到不同的秩"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, math.ceil(pct * len(ordered) / 100) - 1))
+    return ordered[idx]
+
+class BatchProfile:
+    """
+    汇总一批主机的分阶段耗时，每台主机只计一次 (多条命令的结果共享同一份阶段耗时)。
+    队列等待作为 queue 阶段一并统计。
+    """
+    def __init__(self):
+        self.values: Dict[str, List[float]] = {}
+        self.status: Dict[str, int] = {}
+        self.hosts = 0
+        self.started = time.time()
+
+    def add(self, r):
+        self.hosts += 1
+        self.status[r.status] = self.status.get(r.status, 0) + 1
+        phases = dict(r.phases)
+        phases['queue'] = r.queue_wait
+        for name, seconds in phases.items():
+            self.values.setdefault(name, []).append(seconds)
+
+    def phase_names(self) -> List[str]:
+        known = [p for p in PHASE_ORDER if p in self.values]
+        return known + sorted(p for p in self.values if p not in PHASE_ORDER)
+
+    def buckets(self, name: str) -> List[int]:
+        """各分桶的 (非累计) 计数，最后一个为 +Inf"""
+        counts = [0] * (len(PHASE_BUCKETS) + 1)
+        for v in self.values.get(name, ()):
+            for i, bound in enumerate(PHASE_BUCKETS):
+                if v <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[-1] += 1
+        return counts
+
+    def summary(self, name: str) -> dict:
+        vals = self.values.get(name, [])
+        return {
+            'count': len(vals),
+            'sum': round(sum(vals), 4),
+            'p50': percentile(vals, 50),
+            'p90': percentile(vals, 90),
+            'p99': percentile(vals, 99),
+            'max': max(vals) if vals else 0.0,
+        }
+
+def result_record(r) -> dict:
+    return {
+        'timestamp': r.start_time, 'alias': r.alias, 'host': r.host, 'port': r.port, 'group': r.group,
+        'command': r.command, 'status': r.status, 'error': r.error, 'duration': r.duration,
+        'queue_wait': r.queue_wait, 'phases': r.phases,
+    }
+
+def append_jsonl(path: str, results) -> int:
+    """每条结果一行 JSON 追加写入，返回写入行数"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    count = 0
+    with open(path, 'a', encoding='utf-8') as f:
+        for r in results:
+            f.write(json.dumps(result_record(r), ensure_ascii=False) + "\n")
+            count += 1
+    return count
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _labels(**labels) -> str:
+    """{k="v",...}；值为 None 的标签省略，全部省略时不带花括号"""
+    pairs = [f'{k}="{_escape(v)}"' for k, v in labels.items() if v is not None]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def write_prometheus(path: str, profile: BatchProfile, batch: Optional[str] = None, prefix: str = 'multitelnet'):
+    """
+    以 node_exporter textfile collector 格式写出最近一批的耗时，原子替换避免被抓到半个文件。
+    batch 作为标签区分不同类型的批次 (如 exec / health)，可写到同一个 textfile 目录下的不同文件。
+    """
+    lines = [
+        f"# HELP {prefix}_phase_seconds Per-host latency of each execution phase in the last batch.",
+        f"# TYPE {prefix}_phase_seconds histogram",
+    ]
+    for name in profile.phase_names():
+        cumulative = 0
+        counts = profile.buckets(name)
+        for bound, count in zip(PHASE_BUCKETS + [None], counts):
+            cumulative += count
+            le = "+Inf" if bound is None else f"{bound:g}"
+            lines.append(f"{prefix}_phase_seconds_bucket{_labels(batch=batch, phase=name, le=le)} {cumulative}")
+        s = profile.summary(name)
+        lines.append(f"{prefix}_phase_seconds_sum{_labels(batch=batch, phase=name)} {s['sum']}")
+        lines.append(f"{prefix}_phase_seconds_count{_labels(batch=batch, phase=name)} {s['count']}")
+
+    lines += [
+        f"# HELP {prefix}_batch_hosts Hosts in the last batch by status.",
+        f"# TYPE {prefix}_batch_hosts gauge",
+    ]
+    for status, count in sorted(profile.status.items()):
+        lines.append(f"{prefix}_batch_hosts{_labels(batch=batch, status=status)} {count}")
+    lines += [
+        f"# HELP {prefix}_batch_duration_seconds Wall time of the last batch.",
+        f"# TYPE {prefix}_batch_duration_seconds gauge",
+        f"{prefix}_batch_duration_seconds{_labels(batch=batch)} {round(time.time() - profile.started, 3)}",
+        f"# HELP {prefix}_batch_last_run_timestamp_seconds Unix time the last batch finished.",
+        f"# TYPE {prefix}_batch_last_run_timestamp_seconds gauge",
+        f"{prefix}_batch_last_run_timestamp_seconds{_labels(batch=batch)} {int(time.time())}",
+    ]
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        f.write("\n".join(lines) + "\n")
+    os.replace(tmp, path)
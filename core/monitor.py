@@ -0,0 +1,154 @@
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from core.analyzer import HealthParser
+from core.health import cpu_percent
+
+# 预警阈值，与一次性体检表的颜色规则保持一致
+THRESHOLDS = {
+    "load": (2.0, 5.0),
+    "mem": (70, 90),
+    "disk": (70, 90),
+    "cpu": (70, 90),
+}
+
+SPARK_CHARS = "▁▂▃▄▅▆▇█"
+
+@dataclass
+class Sample:
+    ts: float
+    online: bool
+    load: Optional[float]
+    mem: Optional[int]
+    disk: Optional[int]
+    cpu: Optional[int] = None  # 相对上一次采样的 CPU 使用率，首次采样为 None
+    errors: Dict[str, str] = field(default_factory=dict)
+
+def level(metric: str, value) -> int:
+    """0 正常 / 1 预警 / 2 严重"""
+    if not isinstance(value, (int, float)):
+        return 0
+    warn, crit = THRESHOLDS[metric]
+    if value > crit:
+        return 2
+    if value > warn:
+        return 1
+    return 0
+
+def sparkline(values: List) -> str:
+    nums = [v for v in values if isinstance(v, (int, float))]
+    if not nums:
+        return ""
+    lo, hi = min(nums), max(nums)
+    span = (hi - lo) or 1
+    return "".join(
+        SPARK_CHARS[int((v - lo) / span * (len(SPARK_CHARS) - 1))] if isinstance(v, (int, float)) else " "
+        for v in values
+    )
+
+class HostSeries:
+    """单台主机的有界时间序列"""
+    def __init__(self, maxlen: int):
+        self.samples = deque(maxlen=maxlen)
+
+    def copy(self) -> 'HostSeries':
+        clone = HostSeries(self.samples.maxlen)
+        clone.samples.extend(self.samples)
+        return clone
+
+    def append(self, sample: Sample):
+        self.samples.append(sample)
+
+    @property
+    def latest(self) -> Optional[Sample]:
+        return self.samples[-1] if self.samples else None
+
+    def values(self, metric: str) -> List:
+        return [getattr(s, metric) for s in self.samples]
+
+    def delta(self, metric: str):
+        vals = self.values(metric)[-2:]
+        if len(vals) < 2 or not all(isinstance(v, (int, float)) for v in vals):
+            return None
+        return round(vals[1] - vals[0], 2)
+
+    def crossing(self, metric: str) -> int:
+        """最近一次采样相对上一次的阈值跨越：>0 升级，<0 恢复，0 无变化"""
+        vals = self.values(metric)[-2:]
+        if len(vals) < 2:
+            return 0
+        return level(metric, vals[1]) - level(metric, vals[0])
+
+class HealthWatcher:
+    """
+    持续体检：后台线程按 interval 周期轮询，复用执行器会话池中的常驻会话。
+    主机被均匀分成若干批错峰下发，避免整网同一时刻被打满。
+    """
+    def __init__(self, executor, hosts, commands: List[str], interval: float = 60.0,
+                 history: int = 60, min_slot: float = 1.0):
+        self.executor = executor
+        self.hosts = list(hosts)
+        self.commands = commands
+        self.interval = interval
+        self.series: Dict[str, HostSeries] = {h.alias: HostSeries(history) for h in self.hosts}
+        self.rounds = 0
+        self._cpu_times = {}  # alias -> 上一次采样的 CpuTimes
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+        # 每批之间至少间隔 min_slot 秒，批数不超过主机数
+        slots = max(1, min(len(self.hosts), int(interval / min_slot)))
+        self.slot_interval = interval / slots
+        self.buckets = [self.hosts[i::slots] for i in range(slots)]
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="health-watch", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def snapshot(self) -> Dict[str, HostSeries]:
+        """复制一份当前序列，供界面线程无锁渲染"""
+        with self._lock:
+            return {alias: series.copy() for alias, series in self.series.items()}
+
+    def _run(self):
+        next_tick = time.monotonic()
+        while not self._stop.is_set():
+            for bucket in self.buckets:
+                if self._stop.is_set():
+                    return
+                if bucket:
+                    self._poll(bucket)
+                next_tick += self.slot_interval
+                # 某批超时导致落后时不补跑，直接对齐到下一个时间片
+                next_tick = max(next_tick, time.monotonic())
+                self._stop.wait(next_tick - time.monotonic())
+            with self._lock:
+                self.rounds += 1
+
+    def _poll(self, bucket):
+        per_host = self.executor.run_batch_multi(bucket, self.commands)
+        metrics = HealthParser.parse_metrics(per_host)
+        now = time.time()
+        with self._lock:
+            for alias, data in metrics.items():
+                cpu_times = data.get("cpu")
+                cpu = cpu_percent(self._cpu_times.get(alias), cpu_times)
+                self._cpu_times[alias] = cpu_times
+                self.series[alias].append(Sample(
+                    ts=now,
+                    online=data.online,
+                    load=data.get("load"),
+                    mem=data.get("mem"),
+                    disk=data.get("disk"),
+                    cpu=cpu,
+                    errors=data.errors,
+                ))
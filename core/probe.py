@@ -0,0 +1,176 @@
+import errno
+import json
+import os
+import selectors
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+
+RESOLVE_WORKERS = 32  # 解析主机名的并发数；IP 直接写在清单里的主机不占用
+
+class ReachabilityProbe:
+    """
+    执行前的 TCP 可达性预检。
+
+    用非阻塞 socket + selectors 并行探测所有目标端口，一个线程即可同时探测上千台主机。
+    结果写入带 TTL 的本地缓存：TTL 内已知不可达的主机直接判定失败，不再占用执行器名额；
+    recheck=True 时忽略缓存重新探测。
+    """
+    def __init__(self, timeout: float = 3.0, ttl: float = 300.0, cache_path: str = None,
+                 recheck: bool = False, max_parallel: int = 1000):
+        self.timeout = timeout
+        self.ttl = ttl
+        self.cache_path = cache_path
+        self.recheck = recheck
+        self.max_parallel = max_parallel
+        self.connect_times: Dict[str, float] = {}  # "host:port" -> 本次探测的 TCP 建连耗时
+        self._lock = threading.Lock()
+        self._cache = self._load_cache()
+
+    @staticmethod
+    def _key(host_cfg) -> str:
+        return f"{host_cfg.hostname}:{host_cfg.port}"
+
+    def _load_cache(self) -> dict:
+        if not self.cache_path or not os.path.isfile(self.cache_path):
+            return {}
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_cache(self):
+        if not self.cache_path:
+            return
+        now = time.time()
+        with self._lock:
+            data = {k: v for k, v in self._cache.items() if now - v['ts'] < self.ttl}
+        try:
+            os.makedirs(os.path.dirname(self.cache_path) or '.', exist_ok=True)
+            tmp = self.cache_path + '.tmp'
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(data, f)
+            os.replace(tmp, self.cache_path)
+        except OSError:
+            pass
+
+    def split(self, hosts) -> Tuple[list, list]:
+        """返回 (可达主机, 不可达主机)，均保持传入顺序"""
+        now = time.time()
+        to_probe = []
+        verdict = {}
+        with self._lock:
+            for h in hosts:
+                entry = self._cache.get(self._key(h))
+                if not self.recheck and entry and now - entry['ts'] < self.ttl:
+                    verdict[self._key(h)] = entry['ok']
+                else:
+                    to_probe.append(h)
+        # 本进程内只强制重测一次，后续批次 (如 watch 模式) 照常使用缓存
+        self.recheck = False
+
+        if to_probe:
+            results = self.probe(to_probe)
+            with self._lock:
+                for key, ok in results.items():
+                    self._cache[key] = {'ok': ok, 'ts': now}
+            verdict.update(results)
+            self._save_cache()
+
+        reachable = [h for h in hosts if verdict.get(self._key(h), True)]
+        unreachable = [h for h in hosts if not verdict.get(self._key(h), True)]
+        return reachable, unreachable
+
+    def probe(self, hosts) -> Dict[str, bool]:
+        """并行探测，返回 {"host:port": 是否可达}"""
+        results: Dict[str, bool] = {}
+        targets = list({self._key(h): h for h in hosts}.values())
+        for i in range(0, len(targets), self.max_parallel):
+            results.update(self._probe_chunk(targets[i:i + self.max_parallel]))
+        return results
+
+    @staticmethod
+    def _resolve_one(h, flags: int = 0) -> Optional[tuple]:
+        """(family, addr)；解析失败返回 None"""
+        try:
+            family, _, _, _, addr = socket.getaddrinfo(h.hostname, h.port, type=socket.SOCK_STREAM, flags=flags)[0]
+        except OSError:
+            return None
+        return family, addr
+
+    def _resolve(self, hosts) -> Dict[str, Optional[tuple]]:
+        """
+        在非阻塞建连之前解析好所有地址：IP 直接换算，主机名交给线程池并行解析，
+        一个慢 DNS 名字不会让整批探测串行等待
+        """
+        resolved, names = {}, []
+        for h in hosts:
+            addr = self._resolve_one(h, socket.AI_NUMERICHOST)
+            if addr is None:
+                names.append(h)
+            else:
+                resolved[self._key(h)] = addr
+        if names:
+            with ThreadPoolExecutor(max_workers=min(RESOLVE_WORKERS, len(names))) as pool:
+                resolved.update(zip(map(self._key, names), pool.map(self._resolve_one, names)))
+        return resolved
+
+    def _probe_chunk(self, hosts) -> Dict[str, bool]:
+        results = {}
+        addrs = self._resolve(hosts)
+        sel = selectors.DefaultSelector()
+        started = {}
+        try:
+            for h in hosts:
+                key = self._key(h)
+                if addrs[key] is None:
+                    results[key] = False
+                    continue
+                family, addr = addrs[key]
+                try:
+                    sock = socket.socket(family, socket.SOCK_STREAM)
+                except OSError:
+                    results[key] = False
+                    continue
+                try:
+                    sock.setblocking(False)
+                    rc = sock.connect_ex(addr)
+                except OSError:
+                    results[key] = False
+                    sock.close()
+                    continue
+                if rc == 0:
+                    results[key] = True
+                    self.connect_times[key] = 0.0
+                    sock.close()
+                elif rc in (errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EALREADY, getattr(errno, 'WSAEWOULDBLOCK', -1)):
+                    started[key] = time.monotonic()
+                    sel.register(sock, selectors.EVENT_WRITE, key)
+                else:
+                    results[key] = False
+                    sock.close()
+
+            deadline = time.monotonic() + self.timeout
+            while sel.get_map():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                for sk, _ in sel.select(remaining):
+                    sock, key = sk.fileobj, sk.data
+                    ok = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR) == 0
+                    results[key] = ok
+                    if ok:
+                        self.connect_times[key] = time.monotonic() - started[key]
+                    sel.unregister(sock)
+                    sock.close()
+        finally:
+            # 超时仍未建连的视为不可达
+            for sk in list(sel.get_map().values()):
+                results.setdefault(sk.data, False)
+                sel.unregister(sk.fileobj)
+                sk.fileobj.close()
+            sel.close()
+        return results
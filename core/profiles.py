@@ -0,0 +1,116 @@
+import json
+import math
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass, asdict
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+@dataclass
+class HostProfile:
+    prompt: str       # 实测的完整提示符，例如 "[root@ZS_S6_SITE_01 ~]#"
+    latency: float    # 一次提示符往返的耗时 (秒)
+    updated: str
+
+    @property
+    def prompt_regex(self) -> str:
+        return re.escape(self.prompt)
+
+    @property
+    def delay_factor(self) -> float:
+        # 局域网主机 (<0.25s) 用 1，越慢越接近原来的强力模式 3
+        return min(3.0, max(1.0, round(self.latency * 4, 1)))
+
+    @property
+    def conn_timeout(self) -> int:
+        return max(5, min(30, math.ceil(self.latency * 20)))
+
+LAST_PROMPT_RE = re.compile(r'([^\n]*[#\$>])\s*$')
+
+def measure_prompt(conn, timeout: float = 10.0) -> Tuple[str, float]:
+    """
+    发送一个回车并以短轮询等待提示符，返回 (提示符, 往返时延)。
+    不走 find_prompt，避免把 Netmiko 的固定 sleep 算进时延。
+    """
+    conn.clear_buffer(backoff=False)
+    start = time.time()
+    conn.write_channel(conn.RETURN)
+    buf = ""
+    while time.time() - start < timeout:
+        buf += conn.read_channel()
+        m = LAST_PROMPT_RE.search(buf.replace('\r', ''))
+        if m and m.group(1).strip():
+            return m.group(1).strip(), time.time() - start
+        time.sleep(0.01)
+    raise TimeoutError("Prompt not detected")
+
+def profile_key(host_cfg) -> str:
+    return f"{host_cfg.protocol}://{host_cfg.username}@{host_cfg.hostname}:{host_cfg.port}"
+
+class ProfileStore:
+    """
+    每台主机的提示符/时延画像，持久化到本地 JSON。
+    有画像的主机按实测时延连接并精确匹配提示符；画像缺失或命令失败时回退到保守默认值。
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._profiles: Dict[str, HostProfile] = {}
+        self._changed = set()  # 本进程新增/更新的画像
+        self._removed = set()  # 本进程作废的画像
+        self._profiles = self._read()
+
+    def _read(self) -> Dict[str, HostProfile]:
+        if not os.path.isfile(self.path):
+            return {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            return {k: HostProfile(**v) for k, v in data.items()}
+        except (ValueError, TypeError):
+            # 缓存损坏时当作没有画像，下次运行会重新测量
+            return {}
+
+    def get(self, host_cfg) -> Optional[HostProfile]:
+        with self._lock:
+            return self._profiles.get(profile_key(host_cfg))
+
+    def record(self, host_cfg, prompt: str, latency: float):
+        profile = HostProfile(
+            prompt=prompt,
+            latency=round(latency, 3),
+            updated=datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        )
+        key = profile_key(host_cfg)
+        with self._lock:
+            self._profiles[key] = profile
+            self._changed.add(key)
+            self._removed.discard(key)
+
+    def invalidate(self, host_cfg):
+        key = profile_key(host_cfg)
+        with self._lock:
+            if self._profiles.pop(key, None) is not None:
+                self._removed.add(key)
+                self._changed.discard(key)
+
+    def save(self):
+        """只把本进程的改动合并进磁盘上的最新内容，多个分片进程各自保存时不会互相覆盖"""
+        with self._lock:
+            if not self._changed and not self._removed:
+                return
+            merged = self._read()
+            for key in self._removed:
+                merged.pop(key, None)
+            for key in self._changed:
+                merged[key] = self._profiles[key]
+            data = {k: asdict(v) for k, v in merged.items()}
+            self._changed.clear()
+            self._removed.clear()
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.path)
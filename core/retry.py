@@ -0,0 +1,104 @@
+import random
+import socket
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from typing import List, Optional
+
+from core.metrics import percentile
+
+# 批次的尾部控制：
+#   - 截止时间 (--deadline)：到点后仍未完成的主机记为 TIMEOUT，批次带着部分结果返回
+#   - 瞬时故障重试：建连被重置/拒绝/超时时按带抖动的指数退避重试；命令已经发出后不重试 (命令不一定幂等)
+#   - 对冲建连：建连耗时超过本批已完成主机 p95 的主机，再并行发起一次建连，先成功的那个胜出
+TIMEOUT_STATUS = 'TIMEOUT'
+HEDGE_MIN_SAMPLES = 10   # 本批至少有这么多主机完成建连后才开始对冲，样本太少时 p95 没有意义
+HEDGE_PERCENTILE = 95
+HEDGE_MIN_DELAY = 0.2    # 对冲等待时间的下限，避免建连都很快时频繁重复建连
+
+@dataclass
+class RetryPolicy:
+    attempts: int = 2          # 首次失败后最多再试的次数
+    base_delay: float = 0.5
+    max_delay: float = 8.0
+
+    def backoff(self, attempt: int) -> float:
+        """第 attempt 次重试前的等待 (full jitter)：同时失败的一批主机不会同一时刻一起重连"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+# 按名称判断，避免为判断类型去导入 Netmiko/paramiko/asyncssh
+_PERMANENT = {'NetmikoAuthenticationException', 'AuthenticationException', 'PermissionDenied',
+              'BadAuthenticationType', 'HostKeyNotVerifiable', 'TelnetAuthenticationError'}
+_TRANSIENT = {'NetmikoTimeoutException', 'ReadTimeout', 'SSHException', 'ConnectionLost', 'ProtocolError'}
+
+def is_transient(exc: BaseException) -> bool:
+    """连接被重置/拒绝、建连超时、SSH 协商中断等可以重试；认证失败、主机密钥不符等重试也没用"""
+    names = {cls.__name__ for cls in type(exc).__mro__}
+    if names & _PERMANENT:
+        return False
+    if isinstance(exc, (ConnectionError, EOFError, TimeoutError, socket.timeout)):
+        return True
+    asyncio = sys.modules.get('asyncio')
+    if asyncio is not None and isinstance(exc, asyncio.TimeoutError):
+        return True
+    return bool(names & _TRANSIENT)
+
+class Deadline:
+    """一批执行的截止时间；seconds 为空表示不限。budget 为实际可用的时间 (分片收到的是扣除预检后剩余的)，默认同 seconds"""
+    MIN_TIMEOUT = 0.1
+
+    def __init__(self, seconds: Optional[float] = None, budget: Optional[float] = None):
+        self.seconds = seconds
+        if budget is None:
+            budget = seconds
+        self.at = time.monotonic() + budget if seconds else None
+
+    def remaining(self) -> Optional[float]:
+        return None if self.at is None else max(0.0, self.at - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.at is not None and time.monotonic() >= self.at
+
+    def clamp(self, timeout: float) -> float:
+        """把单次操作的超时收紧到截止时间之内，到点后还在跑的主机会自己超时退出"""
+        if self.at is None:
+            return timeout
+        return max(self.MIN_TIMEOUT, min(timeout, self.at - time.monotonic()))
+
+    @property
+    def message(self) -> str:
+        return f"Deadline exceeded ({self.seconds:g}s)"
+
+class ConnectStats:
+    """本批已成功建连的耗时 (TCP + 登录)，给出对冲等待时间"""
+    def __init__(self):
+        self._samples: List[float] = []
+        self._threshold: Optional[float] = None
+        self._computed_at = 0
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def hedge_after(self) -> Optional[float]:
+        """本批 p95 建连耗时；样本不足时返回 None (不对冲)。样本每增加一成才重新排序计算"""
+        with self._lock:
+            n = len(self._samples)
+            if n < HEDGE_MIN_SAMPLES:
+                return None
+            if self._threshold is None or n - self._computed_at >= max(1, self._computed_at // 10):
+                self._threshold = max(HEDGE_MIN_DELAY, percentile(self._samples, HEDGE_PERCENTILE))
+                self._computed_at = n
+            return self._threshold
+
+    def hedge_wait(self, elapsed: float) -> float:
+        """
+        已建连 elapsed 秒的主机还要再等多久才对冲，0 表示现在就该对冲。
+        样本不足时隔 HEDGE_MIN_DELAY 再看：批次一开始就卡住的主机，等样本攒够后同样会被对冲
+        """
+        threshold = self.hedge_after()
+        if threshold is None:
+            return HEDGE_MIN_DELAY
+        return max(0.0, threshold - elapsed)
@@ -0,0 +1,274 @@
+import multiprocessing
+import queue
+import time
+import traceback
+import zlib
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+
+from core.executor import ExecutionResult, RemoteExecutor, timeout_results, unreachable_results
+from core.retry import Deadline
+
+# 分片自己按截止时间产出 TIMEOUT 结果；父进程再多等这么久仍收不到的主机直接判超时
+DEADLINE_GRACE = 5.0
+
+# 子进程用 spawn 启动：父进程里已有 Rich 刷新线程等，fork 容易继承到持有中的锁；Windows 也只支持 spawn
+MP_CONTEXT = 'spawn'
+
+def _build_executor(engine: str, workers: int, profiles_path: Optional[str]):
+    from core.profiles import ProfileStore
+    from core.async_executor import AsyncRemoteExecutor
+    profiles = ProfileStore(profiles_path) if profiles_path else None
+    if engine == 'async':
+        return AsyncRemoteExecutor(max_workers=workers)
+    return RemoteExecutor(max_workers=workers, profiles=profiles)
+
+def _shard_main(shard: int, engine: str, workers: int, profiles_path: Optional[str], inbox, outbox, cancel):
+    """
+    分片进程主循环：常驻一个执行引擎 (会话池跨批次复用)，逐批执行父进程派发的主机，
+    每台主机完成后立即把结果列表发回父进程。
+    """
+    from core.executor import ConnectionScheduler
+    executor = _build_executor(engine, workers, profiles_path)
+    try:
+        while True:
+            task = inbox.get()
+            if task is None:
+                break
+            batch_id, hosts, commands, limits = task
+            try:
+                # 每批按本分片的主机占比重建调度器，使各分片的组并发/限速之和接近全局设定
+                executor.scheduler = ConnectionScheduler(
+                    group_limits=limits['group_limits'],
+                    per_ip_limit=limits['per_ip'],
+                    connect_rate=limits['connect_rate'],
+                    profiles=getattr(executor, 'profiles', None),
+                )
+                executor.capture = limits['capture']
+                executor.retry = limits['retry']
+                executor.hedge = limits['hedge']
+                executor.deadline = limits['deadline']
+                executor.deadline_budget = limits['deadline_budget']
+                stream = executor.iter_batch_multi(hosts, commands)
+                try:
+                    for host_results in stream:
+                        outbox.put((batch_id, shard, 'result', host_results))
+                        if cancel.is_set():
+                            break
+                finally:
+                    stream.close()
+                outbox.put((batch_id, shard, 'done', None))
+            except Exception:
+                outbox.put((batch_id, shard, 'error', traceback.format_exc()))
+    finally:
+        executor.close()
+
+class ShardedExecutor:
+    """
+    多进程分片执行：把主机分到 processes 个常驻子进程，每个子进程运行自己的 thread/async 引擎，
+    绕开单进程 GIL 对 Netmiko 正则匹配、读循环和 paramiko 加解密的限制。
+
+    - 同一台主机总是落到同一个分片，子进程内的会话池跨批次复用
+    - 配置了单 IP 并发上限时按 IP 分片，保证同一 IP 的限制在一个进程内精确生效
+    - 组并发上限与连接速率按各分片的主机占比拆分
+    - 可达性预检在父进程统一完成，结果按完成顺序流式返回，对外接口与 RemoteExecutor 一致
+    """
+    def __init__(self, processes: int, engine: str = 'thread', workers: int = 40,
+                 group_limits: Optional[Dict[str, dict]] = None, per_ip: Optional[int] = None,
+                 connect_rate: Optional[float] = None, profiles_path: Optional[str] = None, preflight=None,
+                 capture=None, retry=None, hedge: bool = False, deadline: Optional[float] = None):
+        self.processes = max(1, processes)
+        self.engine = engine
+        self.workers = workers
+        self.group_limits = group_limits or {}
+        self.per_ip = per_ip
+        self.connect_rate = connect_rate
+        self.profiles_path = profiles_path
+        self.preflight = preflight
+        self.capture = capture  # CaptureConfig，随每批下发；各分片直接写同一个落盘目录，结果里只带文件路径
+        self.retry = retry  # RetryPolicy，随每批下发
+        self.hedge = hedge
+        self.deadline = deadline  # 每批的截止时间 (秒)；分片实际可用的是扣除预检后剩余的时间
+        self._ctx = multiprocessing.get_context(MP_CONTEXT)
+        self._outbox = None
+        self._shards = []  # [(process, inbox, cancel)]
+        self._batch_id = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _spawn(self, i: int):
+        inbox = self._ctx.Queue()
+        cancel = self._ctx.Event()
+        proc = self._ctx.Process(
+            target=_shard_main,
+            args=(i, self.engine, self.workers, self.profiles_path, inbox, self._outbox, cancel),
+            name=f"multitelnet-shard-{i}",
+            daemon=True,
+        )
+        proc.start()
+        return proc, inbox, cancel
+
+    def _start(self):
+        """首批时启动全部分片；之后只重启意外退出的分片"""
+        if not self._shards:
+            self._outbox = self._ctx.Queue()
+            self._shards = [self._spawn(i) for i in range(self.processes)]
+            return
+        for i, (proc, _, _) in enumerate(self._shards):
+            if not proc.is_alive():
+                self._shards[i] = self._spawn(i)
+
+    def close(self):
+        for proc, inbox, _ in self._shards:
+            if proc.is_alive():
+                inbox.put(None)
+        for proc, _, _ in self._shards:
+            proc.join(timeout=30)
+            if proc.is_alive():
+                proc.terminate()
+        self._shards = []
+
+    def _ip_sharded(self) -> bool:
+        return bool(self.per_ip) or any(lim.get('max_per_ip') for lim in self.group_limits.values())
+
+    def shard_of(self, host_cfg) -> int:
+        """稳定的分片号；进程重启后同一主机仍落在同一分片"""
+        key = host_cfg.hostname if self._ip_sharded() else f"{host_cfg.hostname}:{host_cfg.port}"
+        return zlib.crc32(key.encode('utf-8')) % self.processes
+
+    def _shard_limits(self, shard_hosts: list, all_hosts: list, deadline: Deadline) -> dict:
+        totals = defaultdict(int)
+        for h in all_hosts:
+            for g in h.groups or (h.group_name,):
+                totals[g] += 1
+        mine = defaultdict(int)
+        for h in shard_hosts:
+            for g in h.groups or (h.group_name,):
+                mine[g] += 1
+
+        group_limits = {}
+        for g, lim in self.group_limits.items():
+            if not mine.get(g):
+                continue
+            share = mine[g] / totals[g]
+            scaled = dict(lim)
+            for k in ('max_concurrency', 'connect_burst'):
+                if lim.get(k):
+                    scaled[k] = max(1, round(lim[k] * share))
+            if lim.get('connect_rate'):
+                scaled['connect_rate'] = lim['connect_rate'] * share
+            group_limits[g] = scaled
+        share = len(shard_hosts) / len(all_hosts)
+        return {
+            'group_limits': group_limits,
+            'per_ip': self.per_ip,
+            'connect_rate': self.connect_rate * share if self.connect_rate else None,
+            'capture': self.capture,
+            'retry': self.retry,
+            'hedge': self.hedge,
+            'deadline': self.deadline,
+            'deadline_budget': deadline.remaining(),
+        }
+
+    def iter_batch_multi(self, hosts, commands: List[str]) -> Iterator[List[ExecutionResult]]:
+        """按完成顺序逐台产出该主机整组命令的结果列表 (来自任意分片)"""
+        hosts = list(hosts)
+        deadline = Deadline(self.deadline)
+        if self.preflight is not None:
+            hosts, dead = self.preflight.split(hosts)
+            for h in dead:
+                yield unreachable_results(h, commands)
+        if not hosts:
+            return
+
+        self._start()
+        self._batch_id += 1
+        batch_id = self._batch_id
+        assigned = defaultdict(list)
+        for h in hosts:
+            assigned[self.shard_of(h)].append(h)
+        pending = {}  # shard -> {alias: host_cfg} 尚未返回的主机
+        for shard, shard_hosts in assigned.items():
+            pending[shard] = {h.alias: h for h in shard_hosts}
+            _, inbox, cancel = self._shards[shard]
+            cancel.clear()
+            inbox.put((batch_id, shard_hosts, list(commands), self._shard_limits(shard_hosts, hosts, deadline)))
+
+        finished = False
+        try:
+            while pending:
+                try:
+                    msg_batch, shard, kind, payload = self._outbox.get(timeout=1.0)
+                except queue.Empty:
+                    # 分片进程意外退出时，其余未返回的主机直接判失败，避免父进程一直等下去
+                    for shard in list(pending):
+                        if not self._shards[shard][0].is_alive():
+                            yield from self._fail_shard(pending.pop(shard), commands, "Shard process exited")
+                    if deadline.at is not None and time.monotonic() > deadline.at + DEADLINE_GRACE:
+                        # 截止后分片迟迟不返回 (如卡在不可中断的建连里)：剩余主机判超时，通知分片停止但不再等它，
+                        # 分片随后发来的旧批次消息按批次号丢弃
+                        for shard in list(pending):
+                            self._shards[shard][2].set()
+                            for h in pending.pop(shard).values():
+                                yield timeout_results(h, commands, deadline, deadline.seconds)
+                    continue
+                if msg_batch != batch_id or shard not in pending:
+                    continue  # 上一批被取消后残留的消息
+                if kind == 'result':
+                    pending[shard].pop(payload[0].alias, None)
+                    yield payload
+                elif kind == 'error':
+                    last_line = payload.strip().splitlines()[-1]
+                    yield from self._fail_shard(pending.pop(shard), commands, f"Shard error: {last_line}")
+                else:
+                    # 分片已结束，尚未返回的主机 (理论上没有) 一并判失败
+                    yield from self._fail_shard(pending.pop(shard), commands, "Missing result")
+            finished = True
+        finally:
+            if not finished:
+                self._cancel(batch_id, pending)
+
+    def _cancel(self, batch_id: int, pending: dict):
+        """调用方提前停止迭代：通知各分片停止下发，并等它们收尾，保证下一批不会收到旧结果"""
+        for shard in pending:
+            self._shards[shard][2].set()
+        waiting = set(pending)
+        while waiting:
+            try:
+                msg_batch, shard, kind, _ = self._outbox.get(timeout=1.0)
+            except queue.Empty:
+                waiting = {s for s in waiting if self._shards[s][0].is_alive()}
+                continue
+            if msg_batch == batch_id and kind in ('done', 'error'):
+                waiting.discard(shard)
+
+    @staticmethod
+    def _fail_shard(remaining: dict, commands: List[str], error: str):
+        start_time_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        for h in remaining.values():
+            yield [RemoteExecutor._make_result(h, cmd, "FAILED", "", error, start_time_str, 0.0) for cmd in commands]
+
+    def iter_batch(self, hosts, command: str) -> Iterator[ExecutionResult]:
+        for host_results in self.iter_batch_multi(hosts, [command]):
+            yield host_results[0]
+
+    def run_batch(self, hosts, command: str, progress_callback=None) -> List[ExecutionResult]:
+        results = []
+        for res in self.iter_batch(hosts, command):
+            results.append(res)
+            if progress_callback:
+                progress_callback(res)
+        return results
+
+    def run_batch_multi(self, hosts, commands: List[str], progress_callback=None) -> Dict[str, List[ExecutionResult]]:
+        results = {}
+        for host_results in self.iter_batch_multi(hosts, commands):
+            results[host_results[0].alias] = host_results
+            if progress_callback:
+                progress_callback(host_results)
+        return results
@@ -0,0 +1,347 @@
+import asyncio
+import codecs
+import re
+import select
+import socket
+import time
+from typing import Dict, List, Optional, Tuple
+
+from core.metrics import phase
+
+# 内置 Telnet 客户端，取代 Netmiko 的 generic_telnet：
+#   - generic_telnet 是 Netmiko 的终端服务器驱动，本身不做登录，且每一步都是按 global_delay_factor 放大的固定 sleep
+#   - 它依赖的 telnetlib 已在 Python 3.13 中移除
+# 这里选项协商、登录、提示符识别都由收到的数据推进，没有固定等待；同步会话供线程引擎和会话池使用，
+# 提供线程引擎/文件分发用到的那部分 Netmiko 连接接口，asyncio 会话供 async 引擎使用
+
+# Telnet 协议常量 (RFC 854)
+IAC, DONT, DO, WONT, WILL, SB, SE = 255, 254, 253, 252, 251, 250, 240
+OPT_ECHO, OPT_SGA = 1, 3
+
+LOGIN_RE = re.compile(r'(login|username)\s*:\s*$', re.IGNORECASE)
+PASSWORD_RE = re.compile(r'password\s*:\s*$', re.IGNORECASE)
+PROMPT_RE = re.compile(r'[#\$>]\s*$')
+# 换行之后的提示符：等关闭回显的命令结束时用，命令回显里的 "2>" 不会被误认作提示符
+LINE_PROMPT_RE = re.compile(r'\n[^\n]*[#\$>]\s*$')
+LOGIN_FAILED_RE = re.compile(r'(login incorrect|login failed|authentication failed|access denied)', re.IGNORECASE)
+
+ECHO_OFF = "stty -echo 2>/dev/null"
+READ_SIZE = 65536
+
+class TelnetAuthenticationError(Exception):
+    pass
+
+class TelnetTimeoutError(TimeoutError):
+    """TCP 建连或登录超时"""
+
+class CommandTimeoutError(TimeoutError):
+    """命令已经发出，超时前没有等到结束 (区别于建连超时)"""
+
+class TelnetCodec:
+    """与 IO 无关的 IAC 处理：剥离协商序列并生成应答；拆包不完整的序列留到下一次"""
+    def __init__(self):
+        self._pending = b""
+
+    def feed(self, data: bytes) -> Tuple[bytes, bytes]:
+        """返回 (去掉协商序列的数据, 需要回给对端的应答)"""
+        data = self._pending + data
+        self._pending = b""
+        out, replies = bytearray(), bytearray()
+        i = 0
+        while i < len(data):
+            b = data[i]
+            if b != IAC:
+                out.append(b)
+                i += 1
+                continue
+            if i + 1 >= len(data):
+                self._pending = data[i:]
+                break
+            cmd = data[i + 1]
+            if cmd == IAC:
+                out.append(IAC)
+                i += 2
+            elif cmd in (DO, DONT, WILL, WONT):
+                if i + 2 >= len(data):
+                    self._pending = data[i:]
+                    break
+                opt = data[i + 2]
+                # 本端什么选项都不开；对端的回显与抑制继续 (SGA) 照单全收，其余一律拒绝
+                if cmd == DO:
+                    replies += bytes([IAC, WONT, opt])
+                elif cmd == WILL:
+                    replies += bytes([IAC, DO if opt in (OPT_ECHO, OPT_SGA) else DONT, opt])
+                i += 3
+            elif cmd == SB:
+                end = data.find(bytes([IAC, SE]), i)
+                if end < 0:
+                    self._pending = data[i:]
+                    break
+                i = end + 2
+            else:
+                i += 2
+        return bytes(out), bytes(replies)
+
+def _login_reply(idx: int, buf: str, username: Optional[str], password: Optional[str],
+                 sent_password: bool) -> Optional[str]:
+    """
+    登录对话的一步：idx 为 LOGIN_RE / PASSWORD_RE / PROMPT_RE 中命中的序号，返回要发送的行，None 表示已登录。
+    现场设备有的要求登录，有的只要密码，有的直接给 Shell，三种提示都要能接住
+    """
+    if sent_password and (idx == 0 or LOGIN_FAILED_RE.search(buf)):
+        raise TelnetAuthenticationError("Login failed")
+    if idx == 0:
+        return username or ""
+    if idx == 1:
+        return password or ""
+    return None
+
+class TelnetSession:
+    """
+    同步 Telnet 会话 (阻塞 socket + select)，可直接放进 SessionPool。
+    实现了执行器、提示符测量和文件分发用到的 Netmiko 接口：
+    send_command / write_channel / read_channel / clear_buffer / is_alive / disconnect
+    """
+    protocol = 'telnet'
+    RETURN = '\r\n'
+
+    def __init__(self, sock: socket.socket, host: str = ""):
+        self.remote_conn = sock
+        self.host = host
+        self._codec = TelnetCodec()
+        self._decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+
+    @classmethod
+    def open(cls, host_cfg, timeout: float = 30.0) -> 'TelnetSession':
+        with phase('tcp'):
+            try:
+                sock = socket.create_connection((host_cfg.hostname, host_cfg.port), timeout=timeout)
+            except socket.timeout:
+                raise TelnetTimeoutError(f"TCP connect to {host_cfg.hostname}:{host_cfg.port} timed out")
+        session = cls(sock, host_cfg.hostname)
+        try:
+            with phase('login'):
+                session._login(host_cfg.username, host_cfg.password, timeout)
+        except BaseException:
+            sock.close()
+            raise
+        return session
+
+    def _login(self, username, password, timeout: float):
+        deadline = time.monotonic() + timeout
+        sent_password = False
+        try:
+            while True:
+                idx, buf = self._read_until((LOGIN_RE, PASSWORD_RE, PROMPT_RE), deadline)
+                line = _login_reply(idx, buf, username, password, sent_password)
+                if line is None:
+                    break
+                sent_password = sent_password or idx == 1
+                self.write_channel(line + self.RETURN)
+            # 不关闭回显：与 Netmiko 会话一致，文件分发按回显换行后的哨兵行解析输出
+        except ConnectionError:
+            # 输错密码的 telnetd 往往提示一句就断开
+            if sent_password:
+                raise TelnetAuthenticationError("Login failed")
+            raise
+        except TimeoutError:
+            raise TelnetTimeoutError(f"Telnet login to {self.host} timed out")
+
+    def _recv(self, timeout: float) -> Optional[str]:
+        """等待至多 timeout 秒读一次；没有数据返回 None，连接关闭时抛 ConnectionError"""
+        readable, _, _ = select.select([self.remote_conn], [], [], max(0.0, timeout))
+        if not readable:
+            return None
+        data = self.remote_conn.recv(READ_SIZE)
+        if not data:
+            raise ConnectionError("Connection closed by remote host")
+        clean, replies = self._codec.feed(data)
+        if replies:
+            self.remote_conn.sendall(replies)
+        return self._decoder.decode(clean)
+
+    def _read_until(self, patterns, deadline: float) -> Tuple[int, str]:
+        """读取直到任一正则命中 (已去掉 \\r 的) 累计文本，返回 (命中序号, 累计文本)"""
+        buf = ""
+        while True:
+            for idx, pattern in enumerate(patterns):
+                if pattern.search(buf):
+                    return idx, buf
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError(f"Pattern not detected: {patterns[-1].pattern!r}")
+            data = self._recv(remaining)
+            if data:
+                buf += data.replace('\r', '')
+
+    def write_channel(self, out_data: str):
+        # 数据里的 0xff 按协议转义成 IAC IAC
+        self.remote_conn.sendall(out_data.encode('utf-8').replace(bytes([IAC]), bytes([IAC, IAC])))
+
+    def read_channel(self) -> str:
+        """读出当前已到达的全部数据，不等待"""
+        chunks = []
+        while True:
+            data = self._recv(0)
+            if data is None:
+                return "".join(chunks)
+            chunks.append(data)
+
+    def clear_buffer(self, backoff: bool = True, **_) -> str:
+        return self.read_channel()
+
+    def is_alive(self) -> bool:
+        """对端已关闭时 socket 可读且读到 0 字节；用 MSG_PEEK 探测，不消耗数据"""
+        try:
+            readable, _, _ = select.select([self.remote_conn], [], [], 0)
+            return not readable or self.remote_conn.recv(1, socket.MSG_PEEK) != b""
+        except (OSError, ValueError):
+            return False
+
+    def send_command(self, command_string: str, expect_string: Optional[str] = None, read_timeout: float = 10.0,
+                     cmd_verify: bool = True, strip_prompt: bool = True, strip_command: bool = True, **_) -> str:
+        """
+        发送一行命令，读到 expect_string (默认为提示符) 为止。语义与 Netmiko 相同：
+        cmd_verify 时终端若回显命令，只在回显之后的输出里匹配；返回的输出已去掉 \\r
+        """
+        pattern = re.compile(expect_string) if expect_string else PROMPT_RE
+        command = command_string.strip()
+        self.write_channel(command + self.RETURN)
+        deadline = time.monotonic() + read_timeout
+        output, start = "", None if cmd_verify else 0
+        while True:
+            if start is None:
+                start = self._echo_end(output, command)
+            if start is not None and pattern.search(output, start):
+                break
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError(f"Pattern not detected: {pattern.pattern!r} in output")
+            data = self._recv(remaining)
+            if data:
+                output += data.replace('\r', '')
+        if strip_command:
+            echo_end = self._echo_end(output, command)
+            output = output[echo_end or 0:]
+        if strip_prompt:
+            lines = output.split('\n')
+            if PROMPT_RE.search(lines[-1]):
+                output = '\n'.join(lines[:-1])
+        return output
+
+    @staticmethod
+    def _echo_end(output: str, command: str) -> Optional[int]:
+        """命令回显结束的位置：没有回显时为 0，回显还没收全时为 None"""
+        first, newline, _ = output.partition('\n')
+        line = first.strip()
+        if not newline:
+            # 第一行还没收全：是命令的前缀就可能是回显，否则是没有回显的输出或提示符
+            return None if command.startswith(line) else 0
+        # 有的设备回显前带着提示符
+        return len(first) + 1 if line and line.endswith(command) else 0
+
+    def disconnect(self):
+        try:
+            self.write_channel("exit" + self.RETURN)
+        except OSError:
+            pass
+        self.remote_conn.close()
+
+class AsyncTelnetSession:
+    """asyncio Telnet 会话：选项协商 + 登录 + 基于哨兵的命令执行"""
+    def __init__(self, reader, writer, timeout: float):
+        self.reader = reader
+        self.writer = writer
+        self.timeout = timeout
+        self._codec = TelnetCodec()
+
+    @classmethod
+    async def open(cls, host_cfg, timeout: float):
+        with phase('tcp'):
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(host_cfg.hostname, host_cfg.port), timeout)
+        session = cls(reader, writer, timeout)
+        try:
+            with phase('login'):
+                await session._login(host_cfg.username, host_cfg.password)
+        except BaseException:
+            writer.close()
+            raise
+        return session
+
+    def _filter(self, data: bytes) -> bytes:
+        clean, replies = self._codec.feed(data)
+        if replies:
+            self.writer.write(replies)
+        return clean
+
+    async def _read_until(self, *patterns, timeout: Optional[float] = None) -> Tuple[int, str]:
+        """读取直到任一正则命中缓冲区末尾，返回 (命中序号, 累计文本)；timeout 默认为建连超时"""
+        buf = ""
+        deadline = time.monotonic() + (self.timeout if timeout is None else timeout)
+        while True:
+            for idx, pattern in enumerate(patterns):
+                if pattern.search(buf):
+                    return idx, buf
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise asyncio.TimeoutError()
+            chunk = await asyncio.wait_for(self.reader.read(4096), remaining)
+            if not chunk:
+                raise ConnectionError("Connection closed by remote host")
+            buf += self._filter(chunk).decode('utf-8', errors='replace').replace('\r', '')
+
+    def _send(self, line: str):
+        self.writer.write(line.encode('utf-8').replace(bytes([IAC]), bytes([IAC, IAC])) + b"\r\n")
+
+    async def _login(self, username, password):
+        sent_password = False
+        try:
+            while True:
+                idx, buf = await self._read_until(LOGIN_RE, PASSWORD_RE, PROMPT_RE)
+                line = _login_reply(idx, buf, username, password, sent_password)
+                if line is None:
+                    break
+                sent_password = sent_password or idx == 1
+                self._send(line)
+        except ConnectionError:
+            if sent_password:
+                raise TelnetAuthenticationError("Login failed")
+            raise
+        # 关闭回显，省去从输出中剔除命令回显
+        self._send(ECHO_OFF)
+        await self._read_until(LINE_PROMPT_RE)
+
+    async def run(self, commands: List[str], timeout: float) -> Dict[int, str]:
+        """timeout 为整组命令的读超时"""
+        from core.executor import SENTINEL_ECHO, build_pipeline, split_pipeline
+        self._send(build_pipeline(commands))
+        # 哨兵行前有 printf 补的换行，切分时恰好去掉这一个
+        last = re.compile(r'\n__MT_END_%d__[ \t]*\n[\s\S]*[#\$>]\s*$' % (len(commands) - 1))
+        try:
+            _, raw = await self._read_until(last, timeout=timeout)
+        except asyncio.TimeoutError:
+            raise CommandTimeoutError(f"Command timed out after {timeout:g}s")
+        # 终端若仍回显了命令，丢掉哨兵出现之前的回显行
+        echo_end = raw.rfind(SENTINEL_ECHO)
+        if echo_end >= 0:
+            raw = raw[raw.find('\n', echo_end) + 1:]
+        return split_pipeline(raw, len(commands))
+
+    async def stream(self, commands: List[str], spools: list, timeout: float):
+        """捕获模式：按哨兵流式切分，输出直接写入各命令的 OutputSpool；超时按连续无数据计算"""
+        from core.executor import PipelineSplitter, build_pipeline
+        self._send(build_pipeline(commands))
+        splitter = PipelineSplitter(spools)
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        while not splitter.finished(PROMPT_RE):
+            try:
+                chunk = await asyncio.wait_for(self.reader.read(READ_SIZE), timeout)
+            except asyncio.TimeoutError:
+                raise CommandTimeoutError(f"No output for {timeout:g}s")
+            if not chunk:
+                raise ConnectionError("Connection closed by remote host")
+            splitter.feed(decoder.decode(self._filter(chunk)).replace('\r', ''))
+
+    def close(self):
+        self.writer.close()
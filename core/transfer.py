@@ -0,0 +1,422 @@
+import base64
+import hashlib
+import os
+import re
+import shlex
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+
+from core.executor import ExecutionResult, RemoteExecutor
+from core.metrics import PhaseTimer, phase, recording
+
+DEFAULT_BLOCK_SIZE = 256 * 1024
+
+# base64 回退通道每行的字符数：终端规范模式下单行输入上限 4095 字节
+B64_LINE = 3000
+# 每发送这么多行做一次同步，等远端消化完再继续，避免回显把双向缓冲区塞满
+B64_BATCH = 32
+
+PART_SUFFIX = '.mt-part'
+
+# 每条传输命令后打印的哨兵行，带上命令的退出码；回显里引号把它拆开，不会被误匹配
+XFER_RE = re.compile(r'^__MT_XFER_(\d+)__\s*$', re.MULTILINE)
+DIGEST_RE = re.compile(r'^([0-9a-f]{32})\s+-?\s*$', re.MULTILINE)
+SIZE_RE = re.compile(r'^size\s+(\d+)\s*$', re.MULTILINE)
+FULL_RE = re.compile(r'^full\s+([0-9a-f]{32})\s*$', re.MULTILINE)
+PID_RE = re.compile(r'^pid\s+(\d+)\s*$', re.MULTILINE)
+
+class TransferError(Exception):
+    pass
+
+@dataclass
+class LocalFile:
+    """本地文件的分块摘要；按需读取单块，大文件不整体载入内存"""
+    path: str
+    block_size: int
+    size: int
+    digests: List[str]
+    md5: str
+    mode: int
+
+    @classmethod
+    def scan(cls, path: str, block_size: int) -> 'LocalFile':
+        digests, full = [], hashlib.md5()
+        with open(path, 'rb') as f:
+            while True:
+                block = f.read(block_size)
+                if not block:
+                    break
+                digests.append(hashlib.md5(block).hexdigest())
+                full.update(block)
+        st = os.stat(path)
+        return cls(path, block_size, st.st_size, digests, full.hexdigest(), st.st_mode & 0o777)
+
+    def read_block(self, index: int) -> bytes:
+        with open(self.path, 'rb') as f:
+            f.seek(index * self.block_size)
+            return f.read(self.block_size)
+
+@dataclass
+class RemoteFile:
+    size: Optional[int]  # None 表示文件不存在
+    digests: List[str]
+    md5: Optional[str]
+
+def changed_blocks(src_digests: List[str], dst_digests: List[str]) -> List[int]:
+    """目标端需要更新的块序号：摘要不同或目标端没有的块"""
+    return [i for i, d in enumerate(src_digests) if i >= len(dst_digests) or dst_digests[i] != d]
+
+class RemoteShell:
+    """在已登录的 Netmiko 会话上执行 shell 命令；以哨兵行 (含退出码) 判断结束，不依赖提示符匹配"""
+    def __init__(self, conn, timeout: float = 300.0):
+        self.conn = conn
+        self.timeout = timeout
+
+    def run(self, cmd: str, check: bool = True, timeout: Optional[float] = None) -> str:
+        raw = self.conn.send_command(
+            f'{cmd}; echo "__MT_""XFER_$?__"',
+            expect_string=r'__MT_XFER_\d+__',
+            read_timeout=timeout or self.timeout,
+            cmd_verify=False, strip_prompt=False, strip_command=False,
+        )
+        matches = list(XFER_RE.finditer(raw))
+        if not matches:
+            raise TransferError("Missing Sentinel")
+        status = int(matches[-1].group(1))
+        output = raw[:matches[-1].start()]
+        # 去掉命令回显 (回显结尾是引号拆开的哨兵)
+        echo_end = output.rfind('"__MT_""XFER_$?__"')
+        if echo_end >= 0:
+            output = output[output.find('\n', echo_end) + 1:] if '\n' in output[echo_end:] else ""
+        if check and status != 0:
+            last = output.strip().splitlines()[-1:] or [""]
+            raise TransferError(f"`{cmd.split(';')[0][:40]}` exited {status} {last[0][:80]}".strip())
+        return output
+
+    def write_lines(self, lines: List[str]):
+        """连续写入多行命令，每 B64_BATCH 行同步一次"""
+        for i in range(0, len(lines), B64_BATCH):
+            self.conn.write_channel(self.conn.RETURN.join(lines[i:i + B64_BATCH]) + self.conn.RETURN)
+            self.run(":")
+
+    def stat(self, path: str, block_size: int) -> RemoteFile:
+        """远端文件的大小、整体 md5 与分块 md5 (dd + md5sum，busybox 也可用)"""
+        f = shlex.quote(path)
+        out = self.run(
+            f'f={f}; if [ -f "$f" ]; then s=$(wc -c < "$f"); echo "size $s"; '
+            f'echo "full $(md5sum < "$f" | cut -c1-32)"; i=0; n=$(( (s + {block_size} - 1) / {block_size} )); '
+            f'while [ $i -lt $n ]; do dd if="$f" bs={block_size} skip=$i count=1 2>/dev/null | md5sum; '
+            f'i=$((i+1)); done; else echo missing; fi'
+        )
+        size = SIZE_RE.search(out)
+        if size is None:
+            return RemoteFile(None, [], None)
+        full = FULL_RE.search(out)
+        return RemoteFile(int(size.group(1)), DIGEST_RE.findall(out), full.group(1) if full else None)
+
+    def sftp(self):
+        """SSH 会话上打开 SFTP 通道；Telnet 或服务端未启用 SFTP 子系统时返回 None"""
+        client = getattr(self.conn, 'remote_conn_pre', None)
+        if self.conn.protocol != 'ssh' or client is None:
+            return None
+        try:
+            return client.open_sftp()
+        except Exception:
+            return None
+
+@dataclass
+class _Job:
+    label: str
+    local: Optional[LocalFile] = None
+    remote_path: str = ''
+    dest_dir: str = ''
+
+class FileTransfer:
+    """
+    批量分发/收集文件，复用执行器的会话池、调度规则与可达性预检:
+
+    - 推送前比较远端分块 md5，只发送变化的块；完全一致的主机不传输
+    - SSH 主机走 SFTP，Telnet 主机 (或无 SFTP 子系统) 回退为分行 base64 流
+    - 先写到临时文件 (目标 + .mt-part)，整体 md5 校验通过后再改名替换，中断不会留下半个文件
+    - relay 模式下已是新版本的主机用 nc 转发给其余主机，上行链路只承担少数几份拷贝
+    """
+    def __init__(self, executor: RemoteExecutor, block_size: int = DEFAULT_BLOCK_SIZE, timeout: float = 300.0):
+        self.executor = executor
+        self.block_size = block_size
+        self.timeout = timeout
+        self.bytes_sent = 0      # 本机上行发出的文件数据字节数 (不含 relay 转发)
+        self.bytes_received = 0
+        self._lock = threading.Lock()
+
+    def _count(self, sent: int = 0, received: int = 0):
+        with self._lock:
+            self.bytes_sent += sent
+            self.bytes_received += received
+
+    # ---- 推送 ----
+
+    def push(self, hosts, local_path: str, remote_path: str, relay: bool = False,
+             relay_port: int = 47000, seeds: int = 1) -> Iterator[ExecutionResult]:
+        """按完成顺序逐台产出推送结果"""
+        job = _Job(f"push {os.path.basename(local_path)} -> {remote_path}",
+                   LocalFile.scan(local_path, self.block_size), remote_path)
+        if not relay:
+            yield from self.executor.iter_jobs(hosts, job.label, self._push_host, job)
+            return
+        yield from self._push_relay(hosts, job, relay_port, max(1, seeds))
+
+    def _push_host(self, host_cfg, job: _Job, remote: Optional[RemoteFile] = None) -> ExecutionResult:
+        def work(sh):
+            state = remote or sh.stat(job.remote_path, self.block_size)
+            return self._push_blocks(sh, job, state)
+        return self._run(host_cfg, job.label, work)
+
+    def _push_blocks(self, sh: RemoteShell, job: _Job, remote: RemoteFile) -> str:
+        local = job.local
+        if remote.size == local.size and remote.md5 == local.md5:
+            return "unchanged"
+        changed = changed_blocks(local.digests, remote.digests)
+        dest = shlex.quote(job.remote_path)
+        part = shlex.quote(job.remote_path + PART_SUFFIX)
+        parent = shlex.quote(os.path.dirname(job.remote_path) or '.')
+        # 以现有文件为底稿打补丁；不存在时从空文件开始
+        base = f"cp -p {dest} {part}" if remote.size is not None else f": > {part}"
+        sh.run(f"mkdir -p {parent} && {base}")
+
+        sent = 0
+        with phase('transfer'):
+            sftp = sh.sftp()
+            if sftp is not None:
+                method = "sftp"
+                try:
+                    with sftp.open(job.remote_path + PART_SUFFIX, 'r+b') as f:
+                        # 不逐包等待确认，写请求连续发出，关闭文件时统一检查
+                        f.set_pipelined(True)
+                        for i in changed:
+                            block = local.read_block(i)
+                            f.seek(i * self.block_size)
+                            f.write(block)
+                            sent += len(block)
+                finally:
+                    sftp.close()
+            else:
+                method = "base64"
+                tmp = shlex.quote(job.remote_path + PART_SUFFIX + '.b64')
+                for i in changed:
+                    block = local.read_block(i)
+                    encoded = base64.b64encode(block).decode('ascii')
+                    sh.run(f"rm -f {tmp}")
+                    sh.write_lines([f"echo {encoded[j:j + B64_LINE]} >> {tmp}"
+                                    for j in range(0, len(encoded), B64_LINE)])
+                    sh.run(f"base64 -d {tmp} | dd of={part} bs={self.block_size} seek={i} conv=notrunc 2>/dev/null")
+                    sent += len(block)
+                sh.run(f"rm -f {tmp}")
+        self._count(sent=sent)
+
+        self._finalize(sh, job, part, dest)
+        return f"{method}: {len(changed)}/{len(local.digests)} blocks, {sent / 1024:.1f} KB sent"
+
+    def _finalize(self, sh: RemoteShell, job: _Job, part: str, dest: str):
+        """截断到新长度、整体校验后原子替换"""
+        local = job.local
+        try:
+            sh.run(f"dd if=/dev/null of={part} bs=1 seek={local.size} 2>/dev/null; chmod {local.mode:o} {part} && "
+                   f'[ "$(md5sum < {part} | cut -c1-32)" = {local.md5} ] && mv -f {part} {dest}')
+        except TransferError:
+            sh.run(f"rm -f {part}", check=False)
+            raise TransferError("Checksum mismatch after transfer")
+
+    def _push_relay(self, hosts, job: _Job, relay_port: int, seeds: int) -> Iterator[ExecutionResult]:
+        """
+        分发树：先读取所有主机的分块摘要；已是新版本的主机直接作为源，
+        只差少量块的主机直接补丁 (上行开销小)，其余主机在每一轮里由已更新的主机各转发一台。
+        读取摘要这一步开始本批 (预检不可达的主机在这里产出失败结果)，之后的各步沿用本批的截止时间。
+        """
+        states: Dict[str, RemoteFile] = {}
+        state_errors: Dict[str, ExecutionResult] = {}
+
+        def inspect(host_cfg, _):
+            start = time.time()
+            try:
+                with self.executor.pool.session(host_cfg) as conn:
+                    states[host_cfg.alias] = RemoteShell(conn, self.timeout).stat(job.remote_path, self.block_size)
+            except Exception as e:
+                status, error = self.executor.failure(e)
+                return self._result(host_cfg, job.label, status, "", error, start)
+            return []
+        # 读取成功的主机不产出结果 (空列表)，其余为失败、不可达或超时结果
+        for r in self.executor.iter_jobs(hosts, job.label, inspect):
+            if r:
+                state_errors[r.alias] = r
+
+        sources, direct, targets = [], [], []
+        for h in hosts:
+            if h.alias in state_errors:
+                yield state_errors[h.alias]
+                continue
+            state = states[h.alias]
+            if state.size == job.local.size and state.md5 == job.local.md5:
+                sources.append(h)
+                yield self._result(h, job.label, "SUCCESS", "unchanged", "", time.time())
+            elif len(changed_blocks(job.local.digests, state.digests)) <= len(job.local.digests) // 2:
+                direct.append(h)
+            else:
+                targets.append(h)
+        # 没有现成的源时，先直接推送 seeds 台作为分发树的根
+        if not sources:
+            direct, targets = direct + targets[:seeds], targets[seeds:]
+
+        for r in self.executor.iter_jobs(direct, job.label, lambda h, j: self._push_host(h, j, states[h.alias]), job,
+                                         new_batch=False):
+            if r.status == 'SUCCESS':
+                sources.append(self._host_by_alias(direct, r.alias))
+            yield r
+
+        port_of = {h.alias: relay_port + i for i, h in enumerate(targets)}
+        with ThreadPoolExecutor(max_workers=self.executor.max_workers) as pool:
+            while targets:
+                if not sources:
+                    # 所有直接推送都失败了，剩余主机逐台直推
+                    yield from self.executor.iter_jobs(
+                        targets, job.label, lambda h, j: self._push_host(h, j, states[h.alias]), job, new_batch=False)
+                    return
+                pairs = list(zip(sources, targets))
+                targets = targets[len(pairs):]
+                futures = [pool.submit(self._relay_pair, src, dst, job, port_of[dst.alias], states[dst.alias])
+                           for src, dst in pairs]
+                for (src, dst), future in zip(pairs, futures):
+                    r = future.result()
+                    if r.status == 'SUCCESS':
+                        sources.append(dst)
+                    yield r
+
+    @staticmethod
+    def _host_by_alias(hosts, alias):
+        return next(h for h in hosts if h.alias == alias)
+
+    def _relay_pair(self, src, dst, job: _Job, port: int, dst_state: RemoteFile) -> ExecutionResult:
+        """dst 用 nc 监听写入临时文件，src 把自己的新版本发过去；失败时回退为直接推送"""
+        start = time.time()
+        dest = shlex.quote(job.remote_path)
+        part = shlex.quote(job.remote_path + PART_SUFFIX)
+        parent = shlex.quote(os.path.dirname(job.remote_path) or '.')
+        with recording(PhaseTimer()) as timer:
+            try:
+                with self.executor.pool.session(dst) as dst_conn, self.executor.pool.session(src) as src_conn:
+                    dst_sh, src_sh = RemoteShell(dst_conn, self.timeout), RemoteShell(src_conn, self.timeout)
+                    out = dst_sh.run(f"mkdir -p {parent} && rm -f {part} && "
+                                     f"{{ nc -l -p {port} 2>/dev/null || nc -l {port}; }} < /dev/null > {part} 2>/dev/null & "
+                                     f'echo "pid $!"')
+                    pid = PID_RE.search(out)
+                    try:
+                        with phase('transfer'):
+                            # 监听端可能还没就绪，发送端重试几次
+                            src_sh.run(f"i=0; while [ $i -lt 5 ]; do nc -w 2 {shlex.quote(dst.hostname)} {port} "
+                                       f"< {dest} && break; i=$((i+1)); sleep 1; done; [ $i -lt 5 ]")
+                            # 发送端退出后监听端可能还在落盘，等内容完整再校验
+                            dst_sh.run(f'i=0; while [ $i -lt 10 ]; do [ "$(wc -c < {part})" -ge {job.local.size} ] '
+                                       f'&& break; sleep 1; i=$((i+1)); done')
+                        self._finalize(dst_sh, job, part, dest)
+                    except TransferError:
+                        if pid:
+                            dst_sh.run(f"kill {pid.group(1)} 2>/dev/null", check=False)
+                        raise
+                return self._result(dst, job.label, "SUCCESS", f"relay from {src.alias}", "", start, timer.phases)
+            except Exception as e:
+                reason = self.executor.failure(e)[1]
+        fallback = self._push_host(dst, job, dst_state)
+        if fallback.status == 'SUCCESS':
+            fallback.output = f"{fallback.output} (relay from {src.alias} failed: {reason})"
+        return fallback
+
+    # ---- 收集 ----
+
+    def pull(self, hosts, remote_path: str, dest_dir: str) -> Iterator[ExecutionResult]:
+        """从每台主机取回文件到 dest_dir/<alias>/<文件名>；本地已有旧副本时只取回变化的块"""
+        job = _Job(f"pull {remote_path}", remote_path=remote_path, dest_dir=dest_dir)
+        yield from self.executor.iter_jobs(hosts, job.label, self._pull_host, job)
+
+    def _pull_host(self, host_cfg, job: _Job) -> ExecutionResult:
+        return self._run(host_cfg, job.label, lambda sh: self._pull_blocks(sh, host_cfg, job))
+
+    def _pull_blocks(self, sh: RemoteShell, host_cfg, job: _Job) -> str:
+        remote = sh.stat(job.remote_path, self.block_size)
+        if remote.size is None:
+            raise TransferError(f"No such file: {job.remote_path}")
+        local_dir = os.path.join(job.dest_dir, host_cfg.alias)
+        local_path = os.path.join(local_dir, os.path.basename(job.remote_path))
+        os.makedirs(local_dir, exist_ok=True)
+        existing = LocalFile.scan(local_path, self.block_size) if os.path.exists(local_path) else None
+        if existing is not None and existing.size == remote.size and existing.md5 == remote.md5:
+            return f"unchanged: {local_path}"
+
+        changed = changed_blocks(remote.digests, existing.digests if existing else [])
+        part = local_path + PART_SUFFIX
+        received = 0
+        with open(part, 'wb') as out:
+            if existing is not None:
+                with open(local_path, 'rb') as f:
+                    while True:
+                        chunk = f.read(1024 * 1024)
+                        if not chunk:
+                            break
+                        out.write(chunk)
+            with phase('transfer'):
+                sftp = sh.sftp()
+                if sftp is not None:
+                    method = "sftp"
+                    try:
+                        with sftp.open(job.remote_path, 'rb') as f:
+                            # readv 把所有变化块的读请求一次发出，不按 32KB 逐个往返
+                            blocks = f.readv([(i * self.block_size, self.block_size) for i in changed])
+                            for i, block in zip(changed, blocks):
+                                out.seek(i * self.block_size)
+                                out.write(block)
+                                received += len(block)
+                    finally:
+                        sftp.close()
+                else:
+                    method = "base64"
+                    for i in changed:
+                        encoded = sh.run(f"dd if={shlex.quote(job.remote_path)} bs={self.block_size} skip={i} "
+                                         f"count=1 2>/dev/null | base64")
+                        block = base64.b64decode("".join(encoded.split()))
+                        out.seek(i * self.block_size)
+                        out.write(block)
+                        received += len(block)
+            out.truncate(remote.size)
+        self._count(received=received)
+
+        with open(part, 'rb') as f:
+            digest = hashlib.md5()
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        if digest.hexdigest() != remote.md5:
+            os.remove(part)
+            raise TransferError("Checksum mismatch after transfer")
+        os.replace(part, local_path)
+        return f"{method}: {len(changed)}/{len(remote.digests)} blocks, {received / 1024:.1f} KB -> {local_path}"
+
+    # ---- 公共 ----
+
+    def _run(self, host_cfg, label: str, work) -> ExecutionResult:
+        start = time.time()
+        with recording(PhaseTimer()) as timer:
+            try:
+                with self.executor.pool.session(host_cfg) as conn:
+                    output = work(RemoteShell(conn, self.timeout))
+                status, error = "SUCCESS", ""
+            except Exception as e:
+                output = ""
+                status, error = self.executor.failure(e)
+        return self._result(host_cfg, label, status, output, error, start, timer.phases)
+
+    @staticmethod
+    def _result(host_cfg, label, status, output, error, start: float, phases=None) -> ExecutionResult:
+        start_time_str = datetime.fromtimestamp(start).strftime("%Y-%m-%d %H:%M:%S")
+        return RemoteExecutor._make_result(host_cfg, label, status, output, error, start_time_str,
+                                           round(time.time() - start, 2), phases)
@@ -1,40 +1,202 @@
 import click
 import os
-from datetime import datetime
-from rich.console import Console
-from rich.table import Table
-from rich.progress import Progress, SpinnerColumn, TextColumn, BarColumn, TaskProgressColumn
-from rich.panel import Panel
-from rich.live import Live
-from rich.columns import Columns
+import time
 
-from core.inventory import InventoryManager
-from core.executor import RemoteExecutor, ExecutionResult
-from core.analyzer import ResultAnalyzer, SimpleLogger, HealthParser
+# 启动开销：每次调用 CLI 都要付出的固定成本 (脚本一天调用上百次)。
+# 顶层只导入 click 与几个轻量模块 (选项默认值要用)；rich、执行引擎、Netmiko、SQLite 审计库等
+# 推迟到真正用到它们的子命令里再导入，--help 或被拦截的危险命令无需加载它们
+from core.compare import DEFAULT_NORMALIZERS, NORMALIZERS
+from core.capture import DEFAULT_HEAD_BYTES
+from core.cluster import DEFAULT_SIMILARITY
+from core.transfer import DEFAULT_BLOCK_SIZE
 
-console = Console()
+class LazyConsole:
+    """
+    rich.console 导入约 40ms，第一次真正输出时才创建。
+    转发给 rich 的全局 Console，Progress / Live 不传 console 参数时用的也是它
+    """
+    def __getattr__(self, name):
+        from rich import get_console
+        return getattr(get_console(), name)
+
+console = LazyConsole()
+
+# 常驻进程的 socket：用相对路径，避开 Unix socket 路径约 108 字节的长度上限；
+# 每个工作目录 (清单) 各有自己的常驻进程
+DAEMON_SOCKET = os.path.join('state', 'daemon.sock')
+
+def make_executor(engine: str, workers: int, mgr=None, connect_rate=None, per_ip=None, recheck=False, procs=1,
+                  capture=None, daemon=False, deadline=None, retries=0, hedge=False):
+    """
+    按 --engine 选择执行引擎：thread 为线程池，async 为单线程 asyncio；两者共用同一套连接调度规则。
+    --procs 大于 1 时把主机分片到多个子进程，每个子进程各跑一个该引擎，--workers 为每个进程的并发数。
+    capture 为 CaptureConfig 时输出流式落盘，内存中只保留首尾预览。
+    daemon=True 且本目录有常驻进程在运行时，返回把批次交给它执行的客户端 (复用它已登录的会话)。
+    deadline / retries / hedge 为每批的截止时间、建连瞬时失败的重试次数与是否对冲慢建连。
+    """
+    if daemon:
+        from dataclasses import asdict
+        from core.daemon import DaemonExecutor
+        client = DaemonExecutor.find(DAEMON_SOCKET, {
+            'engine': engine, 'workers': workers, 'procs': procs, 'connect_rate': connect_rate,
+            'per_ip': per_ip, 'recheck': recheck, 'capture': asdict(capture) if capture is not None else None,
+            'deadline': deadline, 'retries': retries, 'hedge': hedge,
+        })
+        if client is not None:
+            return client
+    from core.executor import ConnectionScheduler, RemoteExecutor
+    from core.probe import ReachabilityProbe
+    from core.profiles import ProfileStore
+    from core.retry import RetryPolicy
+    retry = RetryPolicy(attempts=retries) if retries else None
+    profiles_path = os.path.join(os.getcwd(), 'state', 'host_profiles.json')
+    # 预检：不可达主机直接判定失败；TTL 内已知不可达的主机不再重复探测，除非 --recheck
+    preflight = ReachabilityProbe(cache_path=os.path.join(os.getcwd(), 'state', 'reachability.json'), recheck=recheck)
+    if procs > 1:
+        from core.sharded import ShardedExecutor
+        return ShardedExecutor(
+            procs, engine=engine, workers=workers,
+            group_limits=mgr.group_limits if mgr is not None else None,
+            per_ip=per_ip, connect_rate=connect_rate, profiles_path=profiles_path, preflight=preflight,
+            capture=capture, retry=retry, hedge=hedge, deadline=deadline,
+        )
+    profiles = ProfileStore(profiles_path)
+    scheduler = ConnectionScheduler(
+        group_limits=mgr.group_limits if mgr is not None else None,
+        per_ip_limit=per_ip,
+        connect_rate=connect_rate,
+        profiles=profiles,
+    )
+    if engine == 'async':
+        from core.async_executor import AsyncRemoteExecutor
+        return AsyncRemoteExecutor(max_workers=workers, scheduler=scheduler, preflight=preflight, capture=capture,
+                                   retry=retry, hedge=hedge, deadline=deadline)
+    return RemoteExecutor(max_workers=workers, profiles=profiles, scheduler=scheduler, preflight=preflight,
+                          capture=capture, retry=retry, hedge=hedge, deadline=deadline)
+
+def inventory_paths():
+    """(hosts.yaml, 编译缓存) 的路径"""
+    return (os.path.join(os.getcwd(), 'inventory', 'hosts.yaml'),
+            os.path.join(os.getcwd(), 'state', 'inventory.cache'))
+
+def load_hosts(group: str, tag: str = None):
+    """加载 (编译缓存的) 主机清单并按组/标签筛选，返回 (清单, 主机列表)；找不到主机时打印提示"""
+    inventory_path, cache_path = inventory_paths()
+    if not os.path.exists(inventory_path):
+        console.print(f"[bold red]错误:[/bold red] 找不到配置文件 {inventory_path}")
+        return None, []
+
+    from core.inventory import InventoryManager
+    try:
+        mgr = InventoryManager(inventory_path, cache_path=cache_path)
+    except ValueError as e:
+        console.print(f"[bold red]错误:[/bold red] 配置文件 {inventory_path} 有误: {e}")
+        return None, []
+    hosts = mgr.get_hosts(group, tag)
+    if not hosts:
+        where = f"组 '{group}'" + (f" / 标签 '{tag}'" if tag else "")
+        console.print(f"[yellow]提示:[/yellow] 在{where} 中未找到任何主机。")
+    return mgr, hosts
 
 @click.group()
 def cli():
     """MultiTelnet - 40台远程主机批量管理工具"""
     pass
 
+def render_profile(profile) -> 'Table':
+    """--profile：各阶段耗时的分位数与分桶直方图"""
+    from rich.table import Table
+    from core.metrics import PHASE_BUCKETS
+    from core.monitor import sparkline
+    table = Table(title=f"分阶段耗时 ({profile.hosts} 台主机)", header_style="bold cyan", border_style="dim",
+                  caption=f"分布分桶: ≤{PHASE_BUCKETS[0]:g}s … ≤{PHASE_BUCKETS[-1]:g}s, >{PHASE_BUCKETS[-1]:g}s")
+    table.add_column("阶段", style="white")
+    table.add_column("主机数", justify="right")
+    table.add_column("p50", justify="right")
+    table.add_column("p90", justify="right")
+    table.add_column("p99", justify="right")
+    table.add_column("最大", justify="right")
+    table.add_column("合计", justify="right")
+    table.add_column("分布")
+    for name in profile.phase_names():
+        s = profile.summary(name)
+        table.add_row(
+            name, str(s['count']), f"{s['p50']:.3f}s", f"{s['p90']:.3f}s", f"{s['p99']:.3f}s",
+            f"{s['max']:.3f}s", f"{s['sum']:.1f}s", sparkline(profile.buckets(name)),
+        )
+    return table
+
+def report_metrics(profile, results, show_profile, metrics_jsonl, prom_textfile, batch: str):
+    """按命令行选项打印分阶段直方图，并导出 JSON Lines / Prometheus textfile"""
+    from core.metrics import append_jsonl, write_prometheus
+    if show_profile:
+        console.print(render_profile(profile))
+    if metrics_jsonl:
+        count = append_jsonl(metrics_jsonl, results)
+        console.print(f"[dim]已追加 {count} 条耗时记录到 {metrics_jsonl}[/dim]")
+    if prom_textfile:
+        write_prometheus(prom_textfile, profile, batch=batch)
+        console.print(f"[dim]已写出 Prometheus 指标 {prom_textfile}[/dim]")
+
+def metrics_options(fn):
+    """exec / health 共用的耗时剖析与导出选项"""
+    fn = click.option('--prom-textfile', help='把本批耗时直方图写成 Prometheus textfile (供 node_exporter 采集)')(fn)
+    fn = click.option('--metrics-jsonl', help='把每条结果的分阶段耗时追加写入 JSON Lines 文件')(fn)
+    fn = click.option('--profile', 'show_profile', is_flag=True, help='打印各阶段 (排队/TCP/登录/命令等) 耗时直方图')(fn)
+    return fn
+
+def tail_options(fn):
+    """exec / health 共用的截止时间、重试与对冲选项"""
+    fn = click.option('--no-hedge', is_flag=True, help='不对建连慢于本批 p95 的主机发起第二次并行建连')(fn)
+    fn = click.option('--retries', default=2, help='建连遇到瞬时故障 (重置/拒绝/超时) 时的重试次数，0 表示不重试')(fn)
+    fn = click.option('--deadline', type=float, help='整批的截止时间 (秒)：到点仍未完成的主机记为 TIMEOUT，带着部分结果返回')(fn)
+    return fn
+
+def daemon_option(fn):
+    """exec / health 共用：是否交给本目录的常驻进程执行"""
+    return click.option('--no-daemon', is_flag=True,
+                        help='即使有常驻进程 (manager.py daemon) 在运行，也在本进程内连接执行')(fn)
+
 @cli.command()
-@click.option('--group', default='all', help='指定要操作的主机组')
-@click.option('--cmd', required=True, help='要执行的命令')
+@click.option('--group', default='all', help='指定要操作的主机组 (逗号分隔多个组)')
+@click.option('--tag', help='按标签筛选主机 (逗号分隔，任一匹配即可)')
+@click.option('--cmd', 'cmds', required=True, multiple=True, help='要执行的命令 (可重复指定，同一会话内依次执行)')
 @click.option('--workers', default=40, help='并发线程数')
 @click.option('--show-ip', is_flag=True, help='显示原始 IP 和端口而非别名')
-def exec(group, cmd, workers, show_ip):
+@click.option('--engine', type=click.Choice(['thread', 'async']), default='thread', help='执行引擎 (async 适合上千台主机)')
+@click.option('--procs', default=1, help='分片进程数 (多核机器上 >1 可突破单进程 GIL 瓶颈)')
+@click.option('--connect-rate', type=float, help='每秒最多新建的连接数 (令牌桶限速)')
+@click.option('--per-ip', type=int, help='同一目标 IP 的最大并发数 (保护跳板机/Telnet 集中器)')
+@click.option('--recheck', is_flag=True, help='忽略可达性缓存，重新探测近期判定为不可达的主机')
+@click.option('--normalize', default=','.join(DEFAULT_NORMALIZERS),
+              help=f"对比前的归一化步骤，逗号分隔，可选: {','.join(NORMALIZERS)}；none 表示按原始输出对比")
+@click.option('--mask', multiple=True, help='对比前额外屏蔽的正则 (如现场主机名 ZS_S6_SITE_\\d+)，可重复指定')
+@click.option('--spool', is_flag=True,
+              help=f'大输出模式：输出流式写入 logs/spool/ 下的文件，内存中每台主机只保留首尾各 {DEFAULT_HEAD_BYTES // 1024} KB')
+@click.option('--max-output', default=256, help='--spool 模式下每台主机每条命令最多落盘的大小 (MB)')
+@click.option('--cluster', is_flag=True,
+              help='按输出相似度聚类 (MinHash/LSH)：几乎每台输出都不同时，列出相似的主机簇并标出离群主机')
+@click.option('--similarity', default=DEFAULT_SIMILARITY, type=click.FloatRange(0.0, 1.0),
+              help='--cluster 模式下归为同一簇的最低相似度 (行集合的 Jaccard 相似度)')
+@click.option('--digest', is_flag=True,
+              help='摘要优先比对：各主机只回传输出的 md5 与大小，按摘要分组后每组只取回一台的完整输出')
+@tail_options
+@metrics_options
+@daemon_option
+def exec(group, tag, cmds, workers, show_ip, engine, procs, connect_rate, per_ip, recheck, normalize, mask,
+         spool, max_output, cluster, similarity, digest, deadline, retries, no_hedge, show_profile, metrics_jsonl,
+         prom_textfile, no_daemon):
     """批量执行命令并展示结果对比"""
     
     # --- 增加敏感词防火墙逻辑 ---
     DANGEROUS_COMMANDS = ["rm ", "reboot", "shutdown", "init 0", "init 6", "mkfs", "dd if="]
-    is_dangerous = any(bad in cmd.lower() for bad in DANGEROUS_COMMANDS)
+    dangerous = [c for c in cmds if any(bad in c.lower() for bad in DANGEROUS_COMMANDS)]
     
-    if is_dangerous:
+    from rich.panel import Panel
+    if dangerous:
         console.print(Panel(
             f"[bold white on red] !!! 安全警告 !!! [/bold white on red]\n\n"
-            f"检测到敏感指令: [yellow]{cmd}[/yellow]\n"
+            f"检测到敏感指令: [yellow]{dangerous[0]}[/yellow]\n"
             f"该命令可能导致服务器宕机或数据丢失，已被防火墙拦截。\n"
             f"如果确需执行，请通过本地终端手动单独操作。",
             title="Security Shield",
@@ -42,148 +204,593 @@ def exec(group, cmd, workers, show_ip):
         ))
         return
     # ---------------------------
-    
-    # 1. 加载配置
-    inventory_path = os.path.join(os.getcwd(), 'inventory', 'hosts.yaml')
-    if not os.path.exists(inventory_path):
-        console.print(f"[bold red]错误:[/bold red] 找不到配置文件 {inventory_path}")
-        return
 
-    mgr = InventoryManager(inventory_path)
-    hosts = mgr.get_hosts(group)
+    from dataclasses import replace
+    from rich.console import Group
+    from rich.live import Live
+    from rich.markup import escape
+    from rich.progress import Progress, SpinnerColumn, TextColumn, BarColumn, TaskProgressColumn
+    from rich.table import Table
+    from core.analyzer import OutputGrouper, SimpleLogger
+    from core.capture import CaptureConfig, prepare_spool_dir
+    from core.compare import resolve_normalizers
+    from core.daemon import DaemonExecutor
+    from core.digest import DigestIndex, digest_command, digest_preview, plan_fetch
+    from core.metrics import BatchProfile
+
+    names = [] if normalize == 'none' else [n.strip() for n in normalize.split(',') if n.strip()]
+    try:
+        normalizers = resolve_normalizers(names, list(mask))
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint='--normalize')
     
+    # 1. 加载配置
+    mgr, hosts = load_hosts(group, tag)
     if not hosts:
-        console.print(f"[yellow]提示:[/yellow] 在组 '{group}' 中未找到任何主机。")
         return
 
-    console.print(Panel(f"正在对 [bold cyan]{len(hosts)}[/bold cyan] 台主机执行命令: [green]{cmd}[/green]"))
+    console.print(Panel(f"正在对 [bold cyan]{len(hosts)}[/bold cyan] 台主机执行命令: [green]{' ; '.join(cmds)}[/green]"))
 
-    # 2. 执行引擎
-    executor = RemoteExecutor(max_workers=workers)
-    results = []
+    # 2. 结果表格：随结果到达逐行填充
+    table = Table(title="执行结果汇总", show_header=True, header_style="bold magenta")
+    table.add_column("Host", style="dim")
+    if len(cmds) > 1:
+        table.add_column("Command", style="cyan")
+    table.add_column("Status")
+    table.add_column("Duration", justify="right")
+    table.add_column("Output Preview", ratio=1)
 
-    with Progress(
+    progress = Progress(
         SpinnerColumn(),
         TextColumn("[progress.description]{task.description}"),
         BarColumn(),
         TaskProgressColumn(),
-        console=console
-    ) as progress:
-        task = progress.add_task("[cyan]正在分发指令...", total=len(hosts))
-        
-        def update_progress(res):
-            progress.advance(task)
-        
-        results = executor.run_batch(hosts, cmd, progress_callback=update_progress)
+    )
+    task = progress.add_task("[cyan]正在分发指令...", total=len(hosts))
 
-    # 3. 日志记录
+    # 3. 执行引擎 + 流式日志 + 增量归类
     logger = SimpleLogger(os.path.join(os.getcwd(), 'logs'))
-    logger.log_results(results)
+    groupers = {cmd: OutputGrouper(normalizers) for cmd in cmds}
+    # 摘要模式先执行包装后的命令，各主机只回传摘要；original 把实际发出的命令映射回用户给的命令
+    run_cmds = [digest_command(c) for c in cmds] if digest else list(cmds)
+    original = dict(zip(run_cmds, cmds))
+    indexes = {cmd: DigestIndex() for cmd in cmds} if digest else {}
+    digest_rows = []
+    profile = BatchProfile()
+    all_results = []
+    capture = None
+    if spool:
+        spool_dir = prepare_spool_dir(os.path.join(os.getcwd(), 'logs', 'spool'))
+        capture = CaptureConfig(spool_dir, max_bytes=max_output * 1024 * 1024)
+    spooled = capped = timed_out = 0
 
-    # 4. 生成结果表格
-    table = Table(title="执行结果汇总", show_header=True, header_style="bold magenta")
-    table.add_column("Host", style="dim")
-    table.add_column("Status")
-    table.add_column("Duration", justify="right")
-    table.add_column("Output Preview", ratio=1)
+    with make_executor(engine, workers, mgr, connect_rate, per_ip, recheck, procs, capture, daemon=not no_daemon,
+                       deadline=deadline, retries=retries, hedge=not no_hedge) as executor, \
+            logger.stream() as log_write, \
+            Live(Group(table, progress), refresh_per_second=8, vertical_overflow="visible"):
+        if isinstance(executor, DaemonExecutor):
+            console.print("[dim]经常驻进程执行，复用已登录的会话[/dim]")
+        if len(cmds) == 1:
+            stream = ([r] for r in executor.iter_batch(hosts, run_cmds[0]))
+        else:
+            # 多条命令按主机流水线执行，一台慢主机不会拖住其它主机的后续命令
+            stream = executor.iter_batch_multi(hosts, run_cmds)
+
+        for host_results in stream:
+            # 结果里记用户给的命令，而不是摘要包装后的命令
+            host_results = [replace(r, command=original[r.command]) for r in host_results]
+            profile.add(host_results[0])
+            if metrics_jsonl:
+                all_results.extend(host_results)
+            for r in host_results:
+                cmd = r.command
+                if digest:
+                    indexes[cmd].add(r)
+                    digest_rows.append(r)
+                else:
+                    log_write(r)
+                    groupers[cmd].add(r)
+                spooled += r.spool is not None
+                capped += r.output_capped
+                timed_out += r.status == 'TIMEOUT'
 
-    for r in results:
-        status_str = f"[green]✔ SUCCESS[/green]" if r.status == 'SUCCESS' else f"[red]✘ {r.error}[/red]"
-        output_preview = r.output[:50] + "..." if len(r.output) > 50 else r.output
-        display_name = f"{r.host}:{r.port}" if show_ip else r.alias
-        table.add_row(display_name, status_str, f"{r.duration}s", output_preview)
+                status_str = render_status(r)
+                if digest and r.status == 'SUCCESS':
+                    output_preview = digest_preview(r.output)
+                else:
+                    output_preview = r.output[:50] + "..." if len(r.output) > 50 else r.output
+                display_name = f"{r.host}:{r.port}" if show_ip else r.alias
+                cells = [display_name, cmd] if len(cmds) > 1 else [display_name]
+                table.add_row(*cells, status_str, f"{r.duration}s", output_preview)
 
+            variants = max(len(x.groups) if digest else len(x) for x in (indexes or groupers).values())
+            progress.update(task, advance=1, description=f"[cyan]正在分发指令... 已归为 {variants} 类输出")
+
+        if digest:
+            # 每个摘要分组只从一台主机取回完整输出，摘要解析不出来的主机也取回
+            wanted = plan_fetch(list(indexes.values()))
+            # 每台主机每条命令只记一行审计：要取回完整输出的主机记取回的结果，其余主机记摘要结果
+            for r in digest_rows:
+                if r.alias not in wanted:
+                    log_write(r)
+            fetch_hosts = [h for h in hosts if h.alias in wanted]
+            fetched = {cmd: {} for cmd in cmds}
+            stream = []
+            if fetch_hosts:
+                fetch_task = progress.add_task("[cyan]正在取回各组代表的完整输出...", total=len(fetch_hosts))
+                if len(cmds) == 1:
+                    stream = ([r] for r in executor.iter_batch(fetch_hosts, cmds[0]))
+                else:
+                    stream = executor.iter_batch_multi(fetch_hosts, list(cmds))
+            for host_results in stream:
+                if metrics_jsonl:
+                    all_results.extend(host_results)
+                for r in host_results:
+                    log_write(r)
+                    fetched[r.command][r.alias] = r
+                    spooled += r.spool is not None
+                    capped += r.output_capped
+                progress.update(fetch_task, advance=1)
+            for cmd in cmds:
+                indexes[cmd].merge_into(groupers[cmd], fetched[cmd])
+
+    if digest:
+        total = sum(index.total_bytes for index in indexes.values())
+        saved = total - sum(index.fetched_bytes for index in indexes.values())
+        unparsed = sum(len(index.unparsed) for index in indexes.values())
+        note = f"；{unparsed} 条结果没有可用的摘要 (远端缺少 md5sum?)，已改为取回完整输出" if unparsed else ""
+        console.print(f"[dim]摘要模式：取回 {len(fetch_hosts)}/{len(hosts)} 台主机的完整输出，"
+                      f"比全量取回少传约 {saved / 1024:.1f} KB (全量 {total / 1024:.1f} KB){note}[/dim]")
+
+    # 4. 异构分析 (特色功能)，多条命令时逐条对比
+    for cmd in cmds:
+        title = f" ([cyan]{cmd}[/cyan])" if len(cmds) > 1 else ""
+        entries = groupers[cmd].entries()
+        if cluster and len(entries) > 1:
+            render_clusters(groupers[cmd], similarity, title)
+        elif len(entries) > 1:
+            console.print(Panel(f"[bold yellow]检测到输出不一致！[/bold yellow]{title} 结果已并归类如下：", border_style="yellow"))
+            diffs = groupers[cmd].diffs()
+            for g in entries:
+                hosts_str = ", ".join(g.aliases)
+                if g.failed:
+                    console.print(f"[bold red]{escape(' '.join(g.sample.split())[:80])}[/bold red] ({len(g.aliases)} 台)")
+                elif g.key not in diffs:
+                    first_line = g.sample.splitlines()[0] if g.sample else ""
+                    console.print(f"[bold white]基准输出[/bold white] ({len(g.aliases)} 台): {escape(first_line[:60])}")
+                else:
+                    console.print(f"[bold white]与基准的差异[/bold white] ({len(g.aliases)} 台):")
+                    for line in diffs[g.key] or ["(仅空白/顺序不同)"]:
+                        color = "green" if line.startswith('+') else "red" if line.startswith('-') else "dim"
+                        console.print(f"    [{color}]{escape(line)}[/{color}]")
+                console.print(f"  └─ 主机: {hosts_str}")
+        else:
+            console.print(f"[bold green]所有主机输出完全一致。[/bold green]{title}")
+
+    if capture is not None:
+        if spooled:
+            note = f"，其中 {capped} 份超出 {max_output} MB 上限只保存了前一部分" if capped else ""
+            console.print(f"[dim]{spooled} 份大输出的完整内容已写入 {capture.spool_dir}{note}[/dim]")
+        else:
+            os.rmdir(capture.spool_dir)
+
+    if timed_out:
+        console.print(f"[yellow]{timed_out} 条结果在截止时间 {deadline:g}s 内未完成，已记为 TIMEOUT[/yellow]")
+
+    report_metrics(profile, all_results, show_profile, metrics_jsonl, prom_textfile, batch='exec')
+
+def render_status(r) -> str:
+    from rich.markup import escape
+    if r.status == 'SUCCESS':
+        return "[green]✔ SUCCESS[/green]"
+    if r.status == 'TIMEOUT':
+        return "[yellow]⏱ TIMEOUT[/yellow]"
+    return f"[red]✘ {escape(r.error)}[/red]"
+
+def render_clusters(grouper, threshold: float, title: str):
+    """--cluster：相似输出归为一簇，列出各簇的规模与代表输出，离群簇给出与最相似大簇的差异"""
+    from rich.markup import escape
+    from rich.panel import Panel
+    from rich.table import Table
+    from core.cluster import OUTLIER_SIMILARITY
+    clusters = grouper.clusters(threshold)
+    failed = [g for g in grouper.entries() if g.failed]
+    distinct = sum(len(c.groups) for c in clusters)
+    console.print(Panel(f"[bold yellow]输出近似聚类[/bold yellow]{title} {distinct} 种不同输出归为 "
+                        f"{len(clusters)} 簇 (相似度 ≥ {threshold})", border_style="yellow"))
+
+    # 簇很多时只列最大的 20 簇，离群簇总是列出
+    shown = [(i, c) for i, c in enumerate(clusters, 1) if i <= 20 or c.outlier]
+    hidden = len(clusters) - len(shown)
+    table = Table(header_style="bold magenta",
+                  caption=f"另有 {hidden} 个小簇未列出" if hidden else None)
+    table.add_column("簇", justify="right")
+    table.add_column("主机数", justify="right")
+    table.add_column("不同输出", justify="right")
+    table.add_column("代表输出", ratio=1)
+    table.add_column("主机", ratio=1)
+    for i, c in shown:
+        sample = c.representative.sample
+        first_line = sample.splitlines()[0] if sample else "(空输出)"
+        aliases = c.aliases
+        hosts_str = ", ".join(aliases[:5]) + (f" 等 {len(aliases)} 台" if len(aliases) > 5 else "")
+        label = f"[bold red]{i}[/bold red]" if c.outlier else str(i)
+        table.add_row(label, str(c.size), str(len(c.groups)), escape(first_line[:60]), escape(hosts_str))
     console.print(table)
 
-    # 5. 异构分析 (特色功能)
-    analysis = ResultAnalyzer.group_by_output(results)
-    if len(analysis) > 1:
-        console.print(Panel("[bold yellow]检测到输出不一致！[/bold yellow] 结果已并归类如下：", border_style="yellow"))
-        for out, host_list in analysis.items():
-            hosts_str = ", ".join(host_list)
-            display_out = out if len(out) < 30 else out[:27] + "..."
-            console.print(f"[bold white]输出: '{display_out}'[/bold white]")
-            console.print(f"  └─ 主机: {hosts_str}")
-    else:
-        console.print("[bold green]所有主机输出完全一致。[/bold green]")
+    outliers = [c for c in clusters if c.outlier]
+    if outliers:
+        diffs = grouper.cluster_diffs(clusters)
+        console.print(f"[bold red]离群输出[/bold red] ({len(outliers)} 簇，与任何大簇的相似度都低于 {OUTLIER_SIMILARITY}):")
+        for c in outliers:
+            console.print(f"  簇 {clusters.index(c) + 1}: 与簇 {c.nearest + 1} 最接近 (相似度 {c.similarity:.2f})")
+            for line in diffs.get(c.representative.key) or ["(仅空白/顺序不同)"]:
+                color = "green" if line.startswith('+') else "red" if line.startswith('-') else "dim"
+                console.print(f"    [{color}]{escape(line)}[/{color}]")
+            console.print(f"  └─ 主机: {', '.join(c.aliases)}")
+    for g in failed:
+        console.print(f"[bold red]{escape(' '.join(g.sample.split())[:80])}[/bold red] ({len(g.aliases)} 台)")
+        console.print(f"  └─ 主机: {', '.join(g.aliases)}")
+
+# 负载颜色逻辑
+def color_load(load_val):
+    if not isinstance(load_val, float): return "-"
+    if load_val > 5.0: return f"[red]{load_val}[/red]"
+    if load_val > 2.0: return f"[yellow]{load_val}[/yellow]"
+    return f"[green]{load_val}[/green]"
+
+# 内存/磁盘颜色逻辑 (百分比)
+def color_pct(val):
+    if not isinstance(val, int): return "-"
+    if val > 90: return f"[bold red]{val}%[/bold red]"
+    if val > 70: return f"[yellow]{val}%[/yellow]"
+    return f"[green]{val}%[/green]"
 
 @cli.command()
-@click.option('--group', default='all', help='指定要检查的主机组')
+@click.option('--group', default='all', help='指定要检查的主机组 (逗号分隔多个组)')
+@click.option('--tag', help='按标签筛选主机 (逗号分隔，任一匹配即可)')
 @click.option('--workers', default=40, help='并发线程数')
-def health(group, workers):
-    """一键系统健康体检表 (Load, Mem, Disk)"""
-    
-    inventory_path = os.path.join(os.getcwd(), 'inventory', 'hosts.yaml')
-    mgr = InventoryManager(inventory_path)
-    hosts = mgr.get_hosts(group)
-    
+@click.option('--engine', type=click.Choice(['thread', 'async']), default='thread', help='执行引擎 (async 适合上千台主机)')
+@click.option('--procs', default=1, help='分片进程数 (多核机器上 >1 可突破单进程 GIL 瓶颈)')
+@click.option('--connect-rate', type=float, help='每秒最多新建的连接数 (令牌桶限速)')
+@click.option('--per-ip', type=int, help='同一目标 IP 的最大并发数 (保护跳板机/Telnet 集中器)')
+@click.option('--recheck', is_flag=True, help='忽略可达性缓存，重新探测近期判定为不可达的主机')
+@click.option('--watch', is_flag=True, help='持续监控模式：常驻会话周期轮询，实时刷新仪表盘')
+@click.option('--interval', default=60.0, help='监控模式的轮询周期 (秒)')
+@click.option('--history', 'history_len', default=60, help='监控模式每台主机保留的采样点数')
+@tail_options
+@metrics_options
+@daemon_option
+def health(group, tag, workers, engine, procs, connect_rate, per_ip, recheck, watch, interval, history_len,
+           deadline, retries, no_hedge, show_profile, metrics_jsonl, prom_textfile, no_daemon):
+    """一键系统健康体检表 (Load, Mem, Swap, Disk, Inode)"""
+    from rich.markup import escape
+    from rich.progress import Progress, SpinnerColumn, TextColumn, BarColumn, TaskProgressColumn
+    from rich.table import Table
+    from core.analyzer import HealthParser
+    from core.health import HEALTH_PROBE, table_metrics
+    from core.metrics import BatchProfile
+
+    mgr, hosts = load_hosts(group, tag)
     if not hosts:
-        console.print(f"[yellow]提示:[/yellow] 在组 '{group}' 中未找到任何主机。")
         return
 
-    # 定义体检指令集
-    health_cmds = {
-        "Load": "uptime",
-        "Memory": "free -m",
-        "Disk": "df -h /"
-    }
-    
-    all_results = {}
-    executor = RemoteExecutor(max_workers=workers)
+    if watch:
+        # 监控模式本身就常驻会话，不经常驻进程
+        with make_executor(engine, workers, mgr, connect_rate, per_ip, recheck, procs,
+                           deadline=deadline, retries=retries, hedge=not no_hedge) as executor:
+            watch_health(executor, hosts, interval, history_len)
+        return
 
-    with Progress(
+    # 每台主机一条复合探针命令、一次往返读完全部指标，主机之间互不等待
+    with make_executor(engine, workers, mgr, connect_rate, per_ip, recheck, procs, daemon=not no_daemon,
+                       deadline=deadline, retries=retries, hedge=not no_hedge) as executor, Progress(
         SpinnerColumn(),
         TextColumn("[progress.description]{task.description}"),
         BarColumn(),
         TaskProgressColumn(),
-        console=console
     ) as progress:
-        overall_task = progress.add_task("[cyan]正在进行系统体检...", total=len(health_cmds) * len(hosts))
+        overall_task = progress.add_task("[cyan]正在进行系统体检...", total=len(hosts))
         
-        for name, cmd in health_cmds.items():
-            def cb(res): progress.advance(overall_task)
-            all_results[name] = executor.run_batch(hosts, cmd, progress_callback=cb)
+        def cb(host_results): progress.advance(overall_task)
+        per_host = executor.run_batch_multi(hosts, [HEALTH_PROBE], progress_callback=cb)
 
     # 解析数据
-    metrics = HealthParser.parse_metrics(all_results)
+    metrics = HealthParser.parse_metrics(per_host)
     
-    # 渲染结果表格
+    # 渲染结果表格，列由已注册的指标解析器决定
+    specs = table_metrics()
     table = Table(title="服务器健康状态仪表盘", header_style="bold cyan", border_style="dim")
     table.add_column("主机别名", style="white")
     table.add_column("状态")
-    table.add_column("负载 (1min)", justify="center")
-    table.add_column("内存使用率", justify="center")
-    table.add_column("磁盘占用 (/)", justify="center")
+    for spec in specs:
+        table.add_column(spec.label, justify="center")
 
+    failures = []
     for alias, data in metrics.items():
-        status = "[green]ONLINE[/green]" if data["status"] == "ONLINE" else "[red]OFFLINE[/red]"
-        
-        # 负载颜色逻辑
-        load_val = data["load"]
-        load_display = str(load_val)
-        if isinstance(load_val, float):
-            if load_val > 5.0: load_display = f"[red]{load_val}[/red]"
-            elif load_val > 2.0: load_display = f"[yellow]{load_val}[/yellow]"
-            else: load_display = f"[green]{load_val}[/green]"
-            
-        # 内存/磁盘颜色逻辑 (百分比)
-        def color_pct(val):
-            if not isinstance(val, int): return "-"
-            if val > 90: return f"[bold red]{val}%[/bold red]"
-            if val > 70: return f"[yellow]{val}%[/yellow]"
-            return f"[green]{val}%[/green]"
+        status = "[green]ONLINE[/green]" if data.online else "[red]OFFLINE[/red]"
+        cells = []
+        for spec in specs:
+            if spec.name in data.errors:
+                cells.append("[bold red]ERR[/bold red]")
+                failures.append((alias, spec.name, data.errors[spec.name]))
+            else:
+                cells.append(color_pct(data.get(spec.name)) if spec.percent else color_load(data.get(spec.name)))
+        table.add_row(alias, status, *cells)
+
+    console.print(table)
+    console.print("\n[dim]注: 负载 > 2.0 或 资源占用 > 70% 将会被标记为预警状态。[/dim]")
+    if failures:
+        console.print(f"\n[bold red]指标解析失败 ({len(failures)} 项):[/bold red]")
+        for alias, name, error in failures:
+            console.print(f"  {alias} [cyan]{name}[/cyan]: {escape(error)}")
 
+    profile = BatchProfile()
+    for host_results in per_host.values():
+        profile.add(host_results[0])
+    report_metrics(profile, [r for rs in per_host.values() for r in rs],
+                   show_profile, metrics_jsonl, prom_textfile, batch='health')
+
+def render_watch(watcher) -> 'Table':
+    """监控仪表盘：当前值 + 变化量 + 趋势 + 阈值跨越提示"""
+    from rich.table import Table
+    from core.monitor import sparkline
+    table = Table(
+        title=f"服务器健康监控 (每 {watcher.interval:g}s 轮询，第 {watcher.rounds + 1} 轮)",
+        header_style="bold cyan", border_style="dim",
+    )
+    table.add_column("主机别名", style="white")
+    table.add_column("状态")
+    table.add_column("负载 (1min)", justify="right")
+    table.add_column("负载趋势")
+    table.add_column("CPU", justify="right")
+    table.add_column("内存", justify="right")
+    table.add_column("内存趋势")
+    table.add_column("磁盘 (/)", justify="right")
+    table.add_column("告警")
+
+    def with_delta(display, delta):
+        if not delta:
+            return display
+        color = "red" if delta > 0 else "green"
+        return f"{display} [{color}]{delta:+g}[/{color}]"
+
+    for alias, series in watcher.snapshot().items():
+        latest = series.latest
+        if latest is None:
+            table.add_row(alias, "[dim]等待采样[/dim]", "", "", "", "", "", "", "")
+            continue
+        status = "[green]ONLINE[/green]" if latest.online else "[red]OFFLINE[/red]"
+        alerts = []
+        for metric, name in (("load", "负载"), ("cpu", "CPU"), ("mem", "内存"), ("disk", "磁盘")):
+            crossing = series.crossing(metric)
+            if crossing > 0:
+                alerts.append(f"[red]↑{name}越线[/red]")
+            elif crossing < 0:
+                alerts.append(f"[green]↓{name}恢复[/green]")
+        if latest.errors:
+            alerts.append(f"[bold red]解析失败: {','.join(latest.errors)}[/bold red]")
         table.add_row(
-            alias, 
-            status, 
-            load_display, 
-            color_pct(data["mem"]), 
-            color_pct(data["disk"])
+            alias,
+            status,
+            with_delta(color_load(latest.load), series.delta("load")),
+            sparkline(series.values("load")),
+            with_delta(color_pct(latest.cpu), series.delta("cpu")),
+            with_delta(color_pct(latest.mem), series.delta("mem")),
+            sparkline(series.values("mem")),
+            with_delta(color_pct(latest.disk), series.delta("disk")),
+            " ".join(alerts),
         )
+    return table
+
+def watch_health(executor, hosts, interval, history_len):
+    """持续监控：常驻会话 + 错峰轮询 + 实时仪表盘，Ctrl+C 退出"""
+    from rich.live import Live
+    from core.health import HEALTH_PROBE
+    from core.monitor import HealthWatcher
+    watcher = HealthWatcher(executor, hosts, [HEALTH_PROBE], interval=interval, history=history_len)
+    watcher.start()
+    try:
+        with Live(render_watch(watcher), refresh_per_second=2) as live:
+            while True:
+                time.sleep(0.5)
+                live.update(render_watch(watcher))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.stop()
+    console.print("[dim]已退出监控模式。[/dim]")
+
+def run_transfer(title: str, hosts, stream_fn, transfer):
+    """push / pull 共用：逐台显示结果、写审计日志，最后汇总本机收发的数据量"""
+    from dataclasses import replace
+    from rich.console import Group
+    from rich.live import Live
+    from rich.markup import escape
+    from rich.progress import Progress, SpinnerColumn, TextColumn, BarColumn, TaskProgressColumn
+    from rich.table import Table
+    from core.analyzer import SimpleLogger
+    table = Table(title=title, show_header=True, header_style="bold magenta")
+    table.add_column("Host", style="dim")
+    table.add_column("Status")
+    table.add_column("Duration", justify="right")
+    table.add_column("Detail", ratio=1)
+    progress = Progress(SpinnerColumn(), TextColumn("[progress.description]{task.description}"),
+                        BarColumn(), TaskProgressColumn())
+    task = progress.add_task("[cyan]正在传输...", total=len(hosts))
+    logger = SimpleLogger(os.path.join(os.getcwd(), 'logs'))
+    failed = 0
+    with logger.stream() as log_write, Live(Group(table, progress), refresh_per_second=8,
+                                            vertical_overflow="visible"):
+        for r in stream_fn():
+            log_write(r)
+            failed += r.status != 'SUCCESS'
+            status_str = "[green]✔ SUCCESS[/green]" if r.status == 'SUCCESS' else f"[red]✘ {escape(r.error)}[/red]"
+            table.add_row(r.alias, status_str, f"{r.duration}s", escape(r.output))
+            progress.advance(task)
+    console.print(f"[dim]本机发出 {transfer.bytes_sent / 1024 / 1024:.2f} MB，收到 "
+                  f"{transfer.bytes_received / 1024 / 1024:.2f} MB；失败 {failed} 台[/dim]")
+
+def transfer_options(fn):
+    """push / pull 共用的选项"""
+    fn = click.option('--recheck', is_flag=True, help='忽略可达性缓存，重新探测近期判定为不可达的主机')(fn)
+    fn = click.option('--block-size', default=DEFAULT_BLOCK_SIZE // 1024, help='增量比较的分块大小 (KB)')(fn)
+    fn = click.option('--workers', default=40, help='并发线程数')(fn)
+    fn = click.option('--tag', help='按标签筛选主机 (逗号分隔，任一匹配即可)')(fn)
+    fn = click.option('--group', default='all', help='指定要操作的主机组 (逗号分隔多个组)')(fn)
+    return fn
+
+@cli.command()
+@click.argument('local', type=click.Path(exists=True, dir_okay=False))
+@click.argument('remote')
+@transfer_options
+@click.option('--relay', is_flag=True, help='分发树模式：已更新的主机用 nc 转发给其它主机，上行只传少数几份')
+@click.option('--relay-port', default=47000, help='relay 模式下目标主机监听的起始端口')
+@click.option('--relay-seeds', default=1, help='relay 模式下由本机直接推送的主机数')
+def push(local, remote, group, tag, workers, block_size, recheck, relay, relay_port, relay_seeds):
+    """把本地文件分发到多台主机 (只传变化的块，SSH 走 SFTP，Telnet 走 base64)"""
+    from rich.markup import escape
+    from rich.panel import Panel
+    from core.transfer import FileTransfer
+    mgr, hosts = load_hosts(group, tag)
+    if not hosts:
+        return
+    console.print(Panel(f"正在向 [bold cyan]{len(hosts)}[/bold cyan] 台主机分发: [green]{escape(local)}[/green] -> "
+                        f"[green]{escape(remote)}[/green]" + (" [yellow](relay)[/yellow]" if relay else "")))
+    with make_executor('thread', workers, mgr, recheck=recheck) as executor:
+        transfer = FileTransfer(executor, block_size=block_size * 1024)
+        run_transfer("文件分发结果", hosts,
+                     lambda: transfer.push(hosts, local, remote, relay=relay, relay_port=relay_port, seeds=relay_seeds),
+                     transfer)
+
+@cli.command()
+@click.argument('remote')
+@click.option('--dest', default='downloads', help='本地保存目录，文件存为 <dest>/<主机别名>/<文件名>')
+@transfer_options
+def pull(remote, dest, group, tag, workers, block_size, recheck):
+    """从多台主机收集同一个文件 (本地已有旧副本时只取回变化的块)"""
+    from rich.markup import escape
+    from rich.panel import Panel
+    from core.transfer import FileTransfer
+    mgr, hosts = load_hosts(group, tag)
+    if not hosts:
+        return
+    console.print(Panel(f"正在从 [bold cyan]{len(hosts)}[/bold cyan] 台主机收集: [green]{escape(remote)}[/green] -> "
+                        f"[green]{escape(dest)}/[/green]"))
+    with make_executor('thread', workers, mgr, recheck=recheck) as executor:
+        transfer = FileTransfer(executor, block_size=block_size * 1024)
+        run_transfer("文件收集结果", hosts, lambda: transfer.pull(hosts, remote, os.path.abspath(dest)), transfer)
+
+@cli.command()
+@click.option('--host', 'alias', help='主机别名 (支持 * 通配)')
+@click.option('--cmd', 'command', help='命令 (支持 * 通配)')
+@click.option('--since', help='起始时间，如 7d / 12h / 30m 或 2024-05-01')
+@click.option('--until', help='截止时间，格式同 --since')
+@click.option('--status', type=click.Choice(['SUCCESS', 'FAILED', 'TIMEOUT']), help='按执行状态过滤')
+@click.option('--limit', default=50, help='最多显示的记录数')
+@click.option('--full', is_flag=True, help='显示完整输出而非摘要')
+def history(alias, command, since, until, status, limit, full):
+    """查询审计历史 (如: 某台主机上周 uname -r 的返回)"""
+    from rich.markup import escape
+    from rich.table import Table
+    from core.audit import AuditStore, parse_since
+    db_path = os.path.join(os.getcwd(), 'logs', 'audit.db')
+    if not os.path.exists(db_path):
+        console.print(f"[yellow]提示:[/yellow] 尚无审计记录 {db_path}")
+        return
+
+    try:
+        since_ts = parse_since(since) if since else None
+        until_ts = parse_since(until) if until else None
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+
+    with AuditStore(db_path) as store:
+        rows = store.query(alias=alias, command=command, since=since_ts, until=until_ts, status=status, limit=limit)
+
+    if not rows:
+        console.print("[yellow]提示:[/yellow] 没有匹配的记录。")
+        return
+
+    table = Table(title=f"审计历史 (最近 {len(rows)} 条)", header_style="bold magenta")
+    table.add_column("Time", style="dim")
+    table.add_column("Host")
+    table.add_column("Command", style="cyan")
+    table.add_column("Status")
+    table.add_column("Duration", justify="right")
+    table.add_column("Output", ratio=1)
+
+    for row in rows:
+        if row['status'] == 'SUCCESS':
+            status_str = "[green]SUCCESS[/green]"
+        elif row['status'] == 'TIMEOUT':
+            status_str = "[yellow]TIMEOUT[/yellow]"
+        else:
+            status_str = f"[red]{escape(row['error'] or row['status'])}[/red]"
+        output = row['output'] if full else row['output'][:50].replace('\n', ' ')
+        table.add_row(row['timestamp'], row['alias'], escape(row['command']), status_str, f"{row['duration']}s", escape(output))
 
     console.print(table)
-    console.print("\n[dim]注: 负载 > 2.0 或 资源占用 > 70% 将会被标记为预警状态。[/dim]")
+
+@cli.command()
+@click.option('--detach', is_flag=True, help='在后台启动后立即返回 (输出写入 logs/daemon.log)')
+@click.option('--status', is_flag=True, help='查看本目录常驻进程的状态')
+@click.option('--stop', is_flag=True, help='停止本目录的常驻进程 (断开其全部会话)')
+def daemon(detach, status, stop):
+    """常驻进程：保持清单与已登录的会话，本目录下的 exec / health 自动交给它执行"""
+    from core.daemon import DaemonServer, request, socket_supported
+    if not socket_supported():
+        console.print("[bold red]错误:[/bold red] 当前平台的 Python 不支持 Unix socket，无法使用常驻进程")
+        return
+
+    if status or stop:
+        reply = request(DAEMON_SOCKET, {'op': 'stop' if stop else 'ping'})
+        if reply is None:
+            console.print("[dim]常驻进程未运行[/dim]")
+        elif stop:
+            console.print("[green]常驻进程已停止[/green]")
+        else:
+            engines = ", ".join(reply['engines']) or "-"
+            console.print(f"常驻进程 pid [cyan]{reply['pid']}[/cyan]，已运行 {reply['uptime']:.0f}s，"
+                          f"处理 {reply['batches']} 批；常驻引擎 (engine/workers/procs): {engines}")
+        return
+
+    inventory_path, cache_path = inventory_paths()
+    if not os.path.exists(inventory_path):
+        console.print(f"[bold red]错误:[/bold red] 找不到配置文件 {inventory_path}")
+        return
+
+    if detach:
+        import subprocess
+        import sys
+        # 打包成 exe 后 sys.executable 就是程序本身
+        argv = [sys.executable] if getattr(sys, 'frozen', False) else [sys.executable, os.path.abspath(__file__)]
+        os.makedirs('logs', exist_ok=True)
+        with open(os.path.join('logs', 'daemon.log'), 'ab') as log:
+            subprocess.Popen(argv + ['daemon'], stdin=subprocess.DEVNULL, stdout=log, stderr=log,
+                             start_new_session=True)
+        for _ in range(100):
+            reply = request(DAEMON_SOCKET, {'op': 'ping'})
+            if reply is not None:
+                console.print(f"[green]常驻进程已在后台启动[/green] (pid {reply['pid']})")
+                return
+            time.sleep(0.1)
+        console.print("[bold red]错误:[/bold red] 常驻进程未能启动，详见 logs/daemon.log")
+        return
+
+    server = DaemonServer(DAEMON_SOCKET, inventory_path, cache_path,
+                          lambda engine, workers, procs: make_executor(engine, workers, procs=procs))
+    console.print(f"常驻进程已启动 (pid {os.getpid()})，监听 {DAEMON_SOCKET}，Ctrl+C 或 daemon --stop 退出")
+    try:
+        server.serve_forever()
+    except RuntimeError as e:
+        console.print(f"[bold red]错误:[/bold red] {e}")
+    except KeyboardInterrupt:
+        pass
 
 if __name__ == "__main__":
+    import multiprocessing
+    # 打包成 exe 后 --procs 的子进程需要
+    multiprocessing.freeze_support()
     cli()
 #hello
\ No newline at end of file